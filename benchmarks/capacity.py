@@ -0,0 +1,266 @@
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from pathlib import Path
+from urllib.parse import urlparse
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+# Pro Operation: Sender (async oder Threads), Journal-Schritt der Thread-Sender und die Einstellung,
+# die der gemessene Parallelitätsgrad im Modul entspricht
+OPERATIONS = {
+    "create": ("async", None, "CreateUsers.MAX_PARALLEL_REQUESTS"),
+    "password": ("thread", "modify_passwords", "ModifyPassword.MAX_WORKERS"),
+    "modify": ("async", None, "ModifyUsers.MAX_PARALLEL_REQUESTS"),
+    "delete": ("thread", "delete_users", "DeleteUsers.delete_users_concurrently(max_workers)"),
+    "program_policy": ("thread", "create_programpolicies", "CreateProgramPolicy.MAX_WORKERS"),
+}
+# Ein Parallelitätsgrad gilt als Sättigungspunkt, sobald er diesen Anteil des besten Durchsatzes erreicht
+KNEE_SHARE = 0.9
+# Startport der Mock-Server, pro Latenz einer
+MOCK_PORT = 40300
+
+def make_users(count, mandants):
+    """
+    Erzeugt User wie ModifyUsers.load_and_prepare_users mit je mandants Einträgen pro Sub-Datei.
+    """
+    from utils.Modification.ModifyUsers import CLASS_COLUMNS, SUPERVISOR_COLUMNS, build_user_record
+    from utils.Runtime.CompactRecords import pack_flags
+    users = []
+    for pos in range(count):
+        user_id = f"bench-{uuid.uuid4()}"
+        rights = [{user_id: [pack_flags(number, [number % 3 == 0 for _ in columns]) for number in range(1, mandants + 1)]}
+                  for columns in (CLASS_COLUMNS, SUPERVISOR_COLUMNS)]
+        user = {"userId": user_id, "name": f"bench{pos}", "fullName": f"Benutzer {pos}",
+                "defaultUserCategory": "", "userCategories": []}
+        users.append(build_user_record(user, *rights))
+    return users
+
+def make_policies(count, range_length):
+    """
+    Erzeugt Programm-Policies wie build_programm_policies mit range_length Nummern pro Anwendung.
+    """
+    from utils.Creation.PolicyRanges import canonical_range
+    return [{
+        "name": {"data": {"de": f"bench-{uuid.uuid4()}", "de_DE": "", "en": "", "fr": "", "it": ""}},
+        "negative": False, "force": False, "inactive": False, "userCategories": [], "users": [],
+        "programAccess": [{"application": app, "range": canonical_range(range(1, range_length + 1))}
+                          for app in ("fibu", "debi", "kred")],
+    } for _ in range(count)]
+
+def percentile(values, share):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(share * len(ordered)))] if ordered else None
+
+def seed_users(users, headers):
+    """
+    Legt die User für password, modify und delete ohne Messung an.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+    from utils.auth.Authentification import api_url
+    from utils.Creation.CreateUsers import API_PATH
+    from utils.Runtime.Transport import request
+    with ThreadPoolExecutor(max_workers=20) as executor:
+        list(executor.map(lambda user: request("POST", api_url(API_PATH), "users", headers=headers,
+                                               json={"userId": user["userId"], "name": user["name"]}), users))
+
+def measure_async(operation, users, concurrency, headers):
+    """
+    Misst create_user bzw. modify_user mit concurrency gleichzeitigen Requests über eine Session.
+    Liefert (Latenzen in ms, Anzahl Fehler, Dauer in s).
+    """
+    import asyncio
+    import aiohttp
+    if operation == "create":
+        from utils.Creation import CreateUsers as module
+        send = module.create_user
+        payloads = [{"userId": user["userId"], "name": user["name"], "fullName": user["fullName"]} for user in users]
+    else:
+        from utils.Modification import ModifyUsers as module
+        send = module.modify_user
+        payloads = users
+
+    async def run():
+        # Die Semaphore des Moduls bestimmt im Betrieb die Parallelität; hier pro Messpunkt ersetzt
+        module.semaphore = asyncio.Semaphore(concurrency)
+        latencies, failed = [], 0
+        pending = iter(payloads)
+
+        async def worker(session):
+            nonlocal failed
+            for payload in pending:
+                started = time.perf_counter()
+                result = await send(session, payload, headers)
+                latencies.append((time.perf_counter() - started) * 1000)
+                failed += result["Status"] != "Erfolgreich"
+
+        async with aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=concurrency)) as session:
+            started = time.perf_counter()
+            await asyncio.gather(*(worker(session) for _ in range(concurrency)))
+            return latencies, failed, time.perf_counter() - started
+
+    return asyncio.run(run())
+
+def measure_threads(operation, items, concurrency, headers):
+    """
+    Misst update_password, delete_user bzw. create_programm_policy mit concurrency Threads.
+    Fehler werden aus dem Journal des Schritts gezählt.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+    from utils.Runtime.Journal import read_journal
+    if operation == "password":
+        from utils.Modification.ModifyPassword import update_password
+        headers = dict(headers, **{"Content-Type": "text/plain"})
+        calls = [lambda user=user: update_password(user["userId"], "Bench-Passwort1!", headers) for user in items]
+    elif operation == "delete":
+        from utils.Delete.DeleteUsers import delete_user
+        calls = [lambda user=user: delete_user(user["userId"], headers) for user in items]
+    else:
+        from utils.Creation.CreateProgramPolicy import create_programm_policy
+        calls = [lambda policy=policy: create_programm_policy(policy, headers) for policy in items]
+    step = OPERATIONS[operation][1]
+    failed_before = sum(entry["status"] != "Erfolgreich" for entry in read_journal(step=step))
+
+    def timed(call):
+        started = time.perf_counter()
+        call()
+        return (time.perf_counter() - started) * 1000
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        started = time.perf_counter()
+        latencies = list(executor.map(timed, calls))
+        duration = time.perf_counter() - started
+    failed = sum(entry["status"] != "Erfolgreich" for entry in read_journal(step=step)) - failed_before
+    return latencies, failed, duration
+
+def run_series(series):
+    """
+    Läuft im Kindprozess: misst eine Operation mit einer Payload-Grösse über alle Parallelitätsgrade.
+    """
+    from utils.auth.Authentification import get_auth_headers
+    operation, payload, requests = series["operation"], series["payload"], series["requests"]
+    headers = get_auth_headers()
+    points = []
+    for concurrency in series["concurrency"]:
+        if operation == "program_policy":
+            items = make_policies(requests, payload)
+        else:
+            items = make_users(requests, payload if operation == "modify" else 0)
+            if operation != "create":
+                seed_users(items, headers)
+        measure = measure_async if OPERATIONS[operation][0] == "async" else measure_threads
+        latencies, failed, duration = measure(operation, items, concurrency, headers)
+        points.append({"concurrency": concurrency, "throughput": len(latencies) / duration,
+                       "p50_ms": percentile(latencies, 0.5), "p99_ms": percentile(latencies, 0.99),
+                       "failed": failed})
+    print(json.dumps(points))
+
+def start_mock(port, latency_ms):
+    """
+    Startet utils/Mock/MockServer.py mit künstlicher Antwortzeit und wartet, bis der Port offen ist.
+    """
+    process = subprocess.Popen([sys.executable, "-m", "utils.Mock.MockServer", "--port", str(port),
+                                "--latency", str(latency_ms)], cwd=ROOT,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.5).close()
+            return process
+        except OSError:
+            time.sleep(0.2)
+    process.kill()
+    raise RuntimeError(f"Mock-Server auf Port {port} nicht erreichbar.")
+
+def measure_series(base_url, series, workdir):
+    """
+    Führt eine Messreihe in einem eigenen Prozess aus, damit Semaphoren, Circuit Breaker und
+    Rate Limiter der Module frisch sind. Journale und Zustandsdatenbank landen in workdir.
+    """
+    env = dict(os.environ, MIGRATION_BASE_URL=base_url, MIGRATION_RUN_ID="capacity",
+               MIGRATION_CLIENT_ID=os.environ.get("MIGRATION_CLIENT_ID", "bench"),
+               MIGRATION_CLIENT_SECRET=os.environ.get("MIGRATION_CLIENT_SECRET", "bench"),
+               MIGRATION_RATE_LIMIT="0")
+    env.pop("MIGRATION_ACCESS_TOKEN", None)
+    result = subprocess.run([sys.executable, str(Path(__file__).resolve()), "--series", json.dumps(series)],
+                            cwd=workdir, env=env, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"Messreihe {series['operation']} fehlgeschlagen:\n{result.stderr[-2000:]}")
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+def saturation_knee(points):
+    """
+    Kleinster Parallelitätsgrad, der KNEE_SHARE des besten Durchsatzes der Reihe erreicht.
+    """
+    best = max(point["throughput"] for point in points)
+    return next(point["concurrency"] for point in points if point["throughput"] >= KNEE_SHARE * best)
+
+def main():
+    """
+    Aus dem Projektverzeichnis starten, z.B.:
+    python benchmarks/capacity.py --latency 0 50 --concurrency 1 5 10 20 --mandants 0 200 --range-lengths 10 1000
+    """
+    parser = argparse.ArgumentParser(description="Durchsatz und Latenz der Sender je Parallelität, Payload und Latenz")
+    parser.add_argument("--base-url", help="Laufender lokaler Server; ohne Angabe wird pro Latenz ein Mock gestartet")
+    parser.add_argument("--latency", type=float, nargs="+", default=[0, 50],
+                        help="Künstliche Antwortzeit des Mocks in ms (nur ohne --base-url)")
+    parser.add_argument("--operations", nargs="+", choices=list(OPERATIONS), default=list(OPERATIONS))
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 2, 5, 10, 20, 40])
+    parser.add_argument("--mandants", type=int, nargs="+", default=[0, 50, 500],
+                        help="Mandanteneinträge pro Sub-Datei und User (modify)")
+    parser.add_argument("--range-lengths", type=int, nargs="+", default=[10, 1000],
+                        help="Nummern pro Anwendung im range-Feld (program_policy)")
+    parser.add_argument("--requests", type=int, default=200, help="Requests pro Messpunkt")
+    parser.add_argument("--json", help="Ergebnisse zusätzlich als JSON speichern")
+    parser.add_argument("--series", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.series:
+        run_series(json.loads(args.series))
+        return
+    if args.base_url and urlparse(args.base_url).hostname not in ("localhost", "127.0.0.1", "::1"):
+        parser.error("--base-url muss auf einen lokalen Server zeigen; der Benchmark legt Testdaten an und löscht sie.")
+
+    payloads = {"modify": args.mandants, "program_policy": args.range_lengths}
+    latencies = [None] if args.base_url else args.latency
+    results = []
+    print(f"{'Operation':<15} {'Latenz':>7} {'Payload':>8} {'Parallel':>8} {'Req/s':>8} "
+          f"{'p50 (ms)':>9} {'p99 (ms)':>9} {'Fehler':>7}")
+    with tempfile.TemporaryDirectory() as workdir:
+        for pos, latency in enumerate(latencies):
+            mock = None if args.base_url else start_mock(MOCK_PORT + pos, latency)
+            base_url = args.base_url or f"http://127.0.0.1:{MOCK_PORT + pos}"
+            try:
+                for operation in args.operations:
+                    for payload in payloads.get(operation, [0]):
+                        series = {"operation": operation, "payload": payload, "requests": args.requests,
+                                  "concurrency": args.concurrency}
+                        points = measure_series(base_url, series, workdir)
+                        knee = saturation_knee(points)
+                        results.append({"operation": operation, "latency_ms": latency, "payload": payload,
+                                        "setting": OPERATIONS[operation][2], "knee": knee, "points": points})
+                        for point in points:
+                            print(f"{operation:<15} {'-' if latency is None else latency:>7} {payload:>8} "
+                                  f"{point['concurrency']:>8}{'*' if point['concurrency'] == knee else ' '}"
+                                  f"{point['throughput']:>8.1f} {point['p50_ms']:>9.1f} {point['p99_ms']:>9.1f} "
+                                  f"{point['failed']:>7}")
+            finally:
+                if mock:
+                    mock.terminate()
+                    mock.wait()
+    print(f"\n* Sättigungspunkt: kleinster Parallelitätsgrad mit mindestens {KNEE_SHARE:.0%} des besten Durchsatzes")
+    for result in results:
+        print(f"{result['operation']:<15} Latenz {result['latency_ms']}, Payload {result['payload']}: "
+              f"{result['setting']} = {result['knee']}")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as file:
+            json.dump(results, file, indent=2)
+
+if __name__ == "__main__":
+    main()
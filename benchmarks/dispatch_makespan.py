@@ -0,0 +1,92 @@
+import argparse
+import heapq
+import json
+import random
+import sys
+import uuid
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from utils.Modification.ModifyUsers import (  # noqa: E402
+    CLASS_COLUMNS, SUPERVISOR_COLUMNS, MAX_PARALLEL_REQUESTS, build_user_record, payload_cost, remove_empty_values)
+from utils.Runtime.CompactRecords import pack_flags  # noqa: E402
+from utils.Runtime.Dispatch import DISPATCH_ORDERS  # noqa: E402
+
+# Anteil der User und Bereich der Mandanten pro Sub-Datei: die meisten haben wenige, einige sehr viele
+MANDANT_PROFILES = [(0.95, 0, 5), (0.04, 20, 80), (0.01, 200, 600)]
+# Modell der Antwortzeit eines PUT: feste Latenz plus Verarbeitung proportional zur Payload
+LATENCY_MS = 20
+BYTES_PER_MS = 200
+
+def generate_users(count, seed=1):
+    """
+    Erzeugt User wie ModifyUsers.load_and_prepare_users mit stark schwankender Anzahl Mandanten.
+    """
+    rng = random.Random(seed)
+    users = []
+    for pos in range(count):
+        user_id = str(uuid.UUID(int=rng.getrandbits(128)))
+        roll, share = rng.random(), 0.0
+        for fraction, low, high in MANDANT_PROFILES:
+            share += fraction
+            if roll < share:
+                break
+        rights = [{user_id: [pack_flags(rng.randint(1, 9999), [rng.random() < 0.4 for _ in columns])
+                             for _ in range(rng.randint(low, high))]}
+                  for columns in (CLASS_COLUMNS, SUPERVISOR_COLUMNS)]
+        user = {"userId": user_id, "name": f"user{pos}", "fullName": f"Benutzer {pos}",
+                "applicationAccess": {app: rng.random() < 0.3 for app in SUPERVISOR_COLUMNS}}
+        users.append(build_user_record(user, *rights))
+    return users
+
+def makespan(durations, workers):
+    """
+    Simuliert den Versand in der gegebenen Reihenfolge mit einer festen Anzahl paralleler Requests:
+    jeder frei werdende Platz übernimmt den nächsten Auftrag. Liefert die Gesamtdauer in ms.
+    """
+    slots = [0.0] * workers
+    for duration in durations:
+        heapq.heappush(slots, heapq.heappop(slots) + duration)
+    return max(slots)
+
+def main():
+    """
+    Aus dem Projektverzeichnis starten: python benchmarks/dispatch_makespan.py [--users 20000] [--workers 10 20]
+    """
+    parser = argparse.ArgumentParser(description="Gesamtdauer des ModifyUsers-Versands je Versandreihenfolge")
+    parser.add_argument("--users", type=int, default=20_000)
+    parser.add_argument("--workers", type=int, nargs="+", default=[10, 20])
+    parser.add_argument("--json", help="Ergebnisse zusätzlich als JSON speichern")
+    args = parser.parse_args()
+    # Die ausgelieferte Parallelität wird immer mitgemessen und mit * markiert
+    workers_list = sorted(set(args.workers) | {MAX_PARALLEL_REQUESTS})
+    users = generate_users(args.users)
+    # Tatsächliche Payload-Grösse als Grundlage der simulierten Antwortzeit
+    duration = {user["userId"]: LATENCY_MS + len(json.dumps(remove_empty_values(user))) / BYTES_PER_MS
+                for user in users}
+    total = sum(duration.values())
+    results = []
+    print(f"{args.users} User, Antwortzeit = {LATENCY_MS} ms + Payload / {BYTES_PER_MS} Bytes pro ms, "
+          f"längster Request {max(duration.values()) / 1000:.1f} s")
+    print(f"{'Parallel':>9} {'Untergrenze (s)':>16} " + " ".join(f"{order + ' (s)':>14}" for order in DISPATCH_ORDERS)
+          + f" {'Gewinn':>8}")
+    for workers in workers_list:
+        row = {"workers": workers, "shipped": workers == MAX_PARALLEL_REQUESTS,
+               "lower_bound": max(total / workers, max(duration.values()))}
+        for order, strategy in DISPATCH_ORDERS.items():
+            ordered = strategy(users, payload_cost)
+            row[order] = makespan([duration[user["userId"]] for user in ordered], workers)
+        # Verkürzung gegenüber dem Versand in Export-Reihenfolge
+        row["gain"] = 1 - row["longest"] / row["input"]
+        results.append(row)
+        label = f"{workers}{'*' if row['shipped'] else ''}"
+        print(f"{label:>9} {row['lower_bound'] / 1000:>16.1f} "
+              + " ".join(f"{row[order] / 1000:>14.1f}" for order in DISPATCH_ORDERS) + f" {row['gain']:>8.1%}")
+    print(f"* = MAX_PARALLEL_REQUESTS in ModifyUsers ({MAX_PARALLEL_REQUESTS})")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as file:
+            json.dump(results, file, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+import argparse
+import json
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+# Misst im Kindprozess Zeit bis zum ersten Block, Gesamtdauer und maximalen Speicher (RSS in MB)
+MEASURE_SNIPPET = """
+import resource, sys, time
+sys.path.insert(0, {root!r})
+started = time.perf_counter()
+first = None
+rows = 0
+if {method!r} == "read_excel":
+    import pandas as pd
+    df = pd.read_excel({path!r})
+    first = time.perf_counter() - started
+    rows = sum(1 for _ in df.itertuples(index=False))
+else:
+    from utils.Runtime.ExcelStream import stream_chunks
+    for chunk in stream_chunks({path!r}, ["UserId", "Password"], {chunk_rows}):
+        if first is None:
+            first = time.perf_counter() - started
+        rows += len(chunk)
+print(first, time.perf_counter() - started, rows, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024)
+"""
+
+def write_workbook(path, rows):
+    """
+    Schreibt eine Passwortliste wie OBT_Export_Modify_Passwords_Users.xlsx mit der angegebenen Anzahl Zeilen.
+    """
+    from openpyxl import Workbook
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet()
+    sheet.append(["UserId", "Password"])
+    for pos in range(rows):
+        sheet.append([f"{{{pos:08d}-0000-0000-0000-000000000000}}", f"Passwort-{pos}"])
+    workbook.save(path)
+
+def measure(method, path, chunk_rows):
+    root = str(Path(__file__).resolve().parent.parent)
+    snippet = MEASURE_SNIPPET.format(root=root, method=method, path=str(path), chunk_rows=chunk_rows)
+    result = subprocess.run([sys.executable, "-c", snippet], capture_output=True, text=True, check=True)
+    first, total, rows, peak = result.stdout.split()
+    return {"method": method, "first_chunk": float(first), "total": float(total), "rows": int(rows),
+            "peak_mb": float(peak)}
+
+def main():
+    """
+    Aus dem Projektverzeichnis starten: python benchmarks/excel_stream.py [--rows 200000] [--chunk-rows 5000]
+    """
+    parser = argparse.ArgumentParser(description="pd.read_excel und blockweises Lesen einer grossen Passwortliste vergleichen")
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--chunk-rows", type=int, default=5000)
+    parser.add_argument("--json", help="Ergebnisse zusätzlich als JSON speichern")
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as directory:
+        path = Path(directory) / "passwords.xlsx"
+        write_workbook(path, args.rows)
+        results = [measure(method, path, args.chunk_rows) for method in ("read_excel", "stream_chunks")]
+    print(f"{args.rows} Zeilen, Blöcke zu {args.chunk_rows} Zeilen")
+    print(f"{'Verfahren':<14} {'Erster Block (s)':>17} {'Gesamt (s)':>11} {'Max. RSS (MB)':>14}")
+    for result in results:
+        print(f"{result['method']:<14} {result['first_chunk']:>17.2f} {result['total']:>11.2f} {result['peak_mb']:>14.0f}")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as file:
+            json.dump(results, file, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+import argparse
+import gc
+import json
+import random
+import sys
+import time
+import tracemalloc
+import uuid
+from collections import defaultdict
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from utils.Modification.ModifyUsers import (  # noqa: E402
+    CLASS_COLUMNS, SUPERVISOR_COLUMNS, build_user_record, remove_empty_values)
+from utils.Runtime.CompactRecords import pack_flags  # noqa: E402
+
+# Felder eines Benutzers im Modify-Export, die meist leer sind
+OPTIONAL_FIELDS = ["email", "phone", "mobile", "department", "function", "costCentre", "validFrom",
+                   "validTo", "comment", "externalId", "personnelNumber", "location"]
+APPLICATIONS = SUPERVISOR_COLUMNS
+CATEGORY_COUNT = 50
+
+def generate_export(users, mandants, seed=1):
+    """
+    Erzeugt Benutzer wie im Modify-Export (über json.loads, damit jeder String ein eigenes Objekt ist)
+    und Berechtigungszeilen wie aus den beiden Sub-Excel-Dateien.
+    """
+    rng = random.Random(seed)
+    categories = [str(uuid.UUID(int=rng.getrandbits(128))) for _ in range(CATEGORY_COUNT)]
+    records, rights = [], []
+    for pos in range(users):
+        user_id = str(uuid.UUID(int=rng.getrandbits(128)))
+        record = {
+            "userId": user_id,
+            "name": f"user{pos}",
+            "fullName": f"Benutzer {pos}",
+            "language": "de",
+            "defaultUserCategory": rng.choice(categories),
+            "userCategories": [", ".join(rng.sample(categories, 3))],
+            "applicationAccess": {app: rng.random() < 0.3 for app in APPLICATIONS},
+        }
+        for field in OPTIONAL_FIELDS:
+            record[field] = f"{field}-{pos}" if rng.random() < 0.2 else rng.choice([None, ""])
+        records.append(record)
+        for columns in (CLASS_COLUMNS, SUPERVISOR_COLUMNS):
+            rights.append((user_id, [(rng.randint(1, 999), [rng.random() < 0.4 for _ in columns])
+                                     for _ in range(mandants)]))
+    return json.loads(json.dumps(records)), rights
+
+def legacy_users(records, rights):
+    """
+    Bisherige Darstellung: ein dict pro Benutzer mit allen Spalten und ein dict pro Mandant.
+    """
+    user_classes, user_sup = defaultdict(list), defaultdict(list)
+    for pos, (uid, entries) in enumerate(rights):
+        target, columns = (user_classes, CLASS_COLUMNS) if pos % 2 == 0 else (user_sup, SUPERVISOR_COLUMNS)
+        for mandant, flags in entries:
+            entry = {"mandantNumber": mandant}
+            entry.update(zip(columns, flags))
+            if any(flags):
+                target[uid].append(entry)
+    users = [dict(record) for record in records]
+    for user in users:
+        uid = user["userId"]
+        user["userClassMandants"] = [m for m in user_classes[uid] if m.get("mandantNumber") is not None]
+        user["userAppSupervisorMandants"] = [m for m in user_sup[uid] if m.get("mandantNumber") is not None]
+    return users
+
+def compact_users(records, rights):
+    """
+    Neue Darstellung über ModifyUsers.build_user_record.
+    """
+    user_classes, user_sup = defaultdict(list), defaultdict(list)
+    for pos, (uid, entries) in enumerate(rights):
+        target = user_classes if pos % 2 == 0 else user_sup
+        for mandant, flags in entries:
+            if any(flags):
+                target[uid].append(pack_flags(mandant, flags))
+    return [build_user_record(dict(record), user_classes, user_sup) for record in records]
+
+def measure(build, records, rights):
+    """
+    Baut die Benutzerliste und misst den danach belegten Speicher, die Spitze und die Zeit
+    für das Erzeugen aller Payloads (remove_empty_values wie beim Senden). Die Zeiten
+    stammen aus einem Durchlauf ohne tracemalloc.
+    """
+    started = time.perf_counter()
+    users = build(records, rights)
+    build_seconds = time.perf_counter() - started
+    del users
+    gc.collect()
+    tracemalloc.start()
+    users = build(records, rights)
+    gc.collect()
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    started = time.perf_counter()
+    for user in users:
+        remove_empty_values(user)
+    payload_seconds = time.perf_counter() - started
+    return {"retained_mb": retained / 1024 ** 2, "peak_mb": peak / 1024 ** 2,
+            "build_s": build_seconds, "payload_s": payload_seconds}
+
+def main():
+    """
+    Aus dem Projektverzeichnis starten: python benchmarks/record_memory.py [--users 100000] [--mandants 5]
+    """
+    parser = argparse.ArgumentParser(description="Speicherbedarf der Benutzer-Datensätze messen")
+    parser.add_argument("--users", type=int, default=100_000)
+    parser.add_argument("--mandants", type=int, default=5, help="Mandanten pro Benutzer und Sub-Datei")
+    parser.add_argument("--json", help="Ergebnisse zusätzlich als JSON speichern")
+    args = parser.parse_args()
+    records, rights = generate_export(args.users, args.mandants)
+    results = {
+        "dicts": measure(legacy_users, records, rights),
+        "compact": measure(compact_users, records, rights),
+    }
+    print(f"{args.users} Benutzer, {args.mandants} Mandanten pro Sub-Datei")
+    print(f"{'Darstellung':<12} {'Belegt (MB)':>12} {'Spitze (MB)':>12} {'Aufbau (s)':>11} {'Payloads (s)':>13}")
+    for name, result in results.items():
+        print(f"{name:<12} {result['retained_mb']:>12.1f} {result['peak_mb']:>12.1f} "
+              f"{result['build_s']:>11.2f} {result['payload_s']:>13.2f}")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as file:
+            json.dump(results, file, indent=2)
+
+if __name__ == "__main__":
+    main()
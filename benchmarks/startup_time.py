@@ -0,0 +1,69 @@
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import time
+
+# Einstiegspunkte, deren Startzeit gemessen wird
+ENTRY_POINTS = [
+    "creation",
+    "deletion",
+    "utils.Creation.CreateCategory",
+    "utils.Creation.CreateServiceUsers",
+    "utils.Creation.CreateUsers",
+    "utils.Creation.ProvisionUsers",
+    "utils.Creation.CreateProgramPolicy",
+    "utils.Creation.CreateClientPolicy",
+    "utils.Modification.ModifyPassword",
+    "utils.Modification.ModifyUsers",
+    "utils.Delete.DeleteUsers",
+    "utils.Delete.DeleteProgrammPolicies",
+    "utils.Delete.DeleteClientPolicies",
+    "utils.Delete.DeleteCategories",
+    "utils.Validation.VerifyMigration",
+]
+
+# Misst im Kindprozess nur den Import des Moduls
+IMPORT_SNIPPET = "import time; t = time.perf_counter(); import {module}; print(time.perf_counter() - t)"
+
+def measure(module, runs):
+    """
+    Startet pro Lauf einen frischen Interpreter und misst Prozessdauer und Importzeit in Sekunden.
+    """
+    process_times, import_times = [], []
+    for _ in range(runs):
+        started = time.perf_counter()
+        result = subprocess.run([sys.executable, "-c", IMPORT_SNIPPET.format(module=module)],
+                                capture_output=True, text=True)
+        process_times.append(time.perf_counter() - started)
+        if result.returncode != 0:
+            raise RuntimeError(f"{module}: {result.stderr.strip().splitlines()[-1]}")
+        import_times.append(float(result.stdout.strip().splitlines()[-1]))
+    return {
+        "module": module,
+        "process_median": statistics.median(process_times),
+        "import_median": statistics.median(import_times),
+        "import_min": min(import_times),
+    }
+
+def main():
+    """
+    Aus dem Projektverzeichnis starten: python benchmarks/startup_time.py [--runs 5] [--json datei]
+    """
+    parser = argparse.ArgumentParser(description="Startzeit aller Einstiegspunkte messen")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--json", help="Ergebnisse zusätzlich als JSON speichern")
+    parser.add_argument("modules", nargs="*", default=ENTRY_POINTS)
+    args = parser.parse_args()
+    results = [measure(module, args.runs) for module in args.modules]
+    print(f"{'Einstiegspunkt':<40} {'Prozess (ms)':>13} {'Import (ms)':>12} {'Import min':>11}")
+    for result in results:
+        print(f"{result['module']:<40} {result['process_median'] * 1000:>13.0f} "
+              f"{result['import_median'] * 1000:>12.0f} {result['import_min'] * 1000:>11.0f}")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as file:
+            json.dump(results, file, indent=2)
+
+if __name__ == "__main__":
+    main()
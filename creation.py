@@ -1,31 +1,165 @@
-import subprocess
-import sys
+import argparse
+import os
+import threading
+from datetime import datetime
+from utils.Runtime.Sharding import (
+    parse_shard, clear_marker, mark_result, shard_markers, wait_for_any, wait_for_shards
+)
+from utils.Runtime.Journal import run_dir
+from utils.Runtime.InputCache import preload_steps
+from utils.Runtime.Scheduler import MAX_PARALLEL_STEPS, run_module, run_graph, report_schedule, share_rate_budget
 
-def run_module(module_path):
+# Liste der Modulpfade in der Reihenfolge, in der sie bei --max-parallel 1 laufen
+CREATION_MODULES = [
+    "utils.Creation.CreateCategory",
+    "utils.Creation.CreateServiceUsers",
+    "utils.Creation.CreateUsers",
+    "utils.Modification.ModifyPassword",
+    "utils.Modification.ModifyUsers",
+    "utils.Creation.CreateProgramPolicy",
+    "utils.Creation.CreateClientPolicy",
+]
+# Die drei Benutzer-Module, die mit --fused durch die kombinierte Pipeline ersetzt werden
+USER_MODULES = ["utils.Creation.CreateUsers", "utils.Modification.ModifyPassword", "utils.Modification.ModifyUsers"]
+FUSED_MODULE = "utils.Creation.ProvisionUsers"
+# Wie lange ein Shard höchstens auf die Kategorien von Shard 1 bzw. die Benutzer aller Shards wartet (Sekunden)
+SHARD_WAIT_TIMEOUT = 2 * 60 * 60
+
+# Schritte, deren Objekte ein Schritt voraussetzt (Kategorien vor Benutzern, Benutzer vor Policies);
+# alle anderen Schritte laufen parallel, sobald ihre Abhängigkeiten fertig sind
+STEP_DEPENDENCIES = {
+    "utils.Creation.CreateCategory": [],
+    "utils.Creation.CreateServiceUsers": ["utils.Creation.CreateCategory"],
+    "utils.Creation.CreateUsers": ["utils.Creation.CreateCategory"],
+    "utils.Modification.ModifyPassword": ["utils.Creation.CreateUsers"],
+    "utils.Modification.ModifyUsers": ["utils.Creation.CreateUsers"],
+    "utils.Creation.ProvisionUsers": ["utils.Creation.CreateCategory"],
+    "utils.Creation.CreateProgramPolicy": ["utils.Creation.CreateCategory", "utils.Creation.CreateUsers",
+                                           "utils.Creation.CreateServiceUsers", "utils.Creation.ProvisionUsers"],
+    "utils.Creation.CreateClientPolicy": ["utils.Creation.CreateCategory", "utils.Creation.CreateUsers",
+                                          "utils.Creation.CreateServiceUsers", "utils.Creation.ProvisionUsers"],
+}
+# Policies sind nach Inhalt geshardet und verweisen auf Benutzer aller Shards: mit --shard starten
+# sie erst, wenn alle Shards ihre Benutzer-Schritte abgeschlossen haben
+POLICY_MODULES = ["utils.Creation.CreateProgramPolicy", "utils.Creation.CreateClientPolicy"]
+
+def select_modules(fused=False):
     """
-    Führt ein angegebenes Python-Modul als Subprozess aus, gibt die Standardausgabe und
-    eventuelle Fehlerausgabe aus.
+    Liefert die auszuführenden Module in ihrer Reihenfolge.
     """
-    print(f"\n--- Running: {module_path} ---")
-    # Starte das Modul als separaten Prozess und sammle dessen Ausgabe
-    result = subprocess.run([sys.executable, "-m", module_path], capture_output=True, text=True)
-    # Gib die Standardausgabe des Moduls aus
-    print(result.stdout)
-    # Gib die Fehlerausgabe aus, falls vorhanden
-    if result.stderr:
-        print(result.stderr)
+    modules = list(CREATION_MODULES)
+    if fused:
+        position = modules.index(USER_MODULES[0])
+        modules = [mod for mod in modules if mod not in USER_MODULES]
+        modules.insert(position, FUSED_MODULE)
+    return modules
 
 if __name__ == "__main__":
-    # Liste der Modulpfade, die nacheinander ausgeführt werden sollen
-    modules = [
-        "utils.Creation.CreateCategory",
-        "utils.Creation.CreateServiceUsers",
-        "utils.Creation.CreateUsers",
-        "utils.Modification.ModifyPassword",
-        "utils.Modification.ModifyUsers",
-        "utils.Creation.CreateProgramPolicy",
-        "utils.Creation.CreateClientPolicy",
-    ]
-    # Durchlaufe die Liste und führe jedes Modul aus
-    for mod in modules:
-        run_module(mod)
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Erstellungs- und Änderungs-Workflow")
+    parser.add_argument("--fused", action="store_true",
+                        help="Benutzer in einem Durchlauf erstellen, Passwort setzen und ändern")
+    parser.add_argument("--shard", help="Nur den Teil i von N verarbeiten, z.B. 2/4")
+    parser.add_argument("--run-id", help="Gemeinsame Kennung aller Shards eines Laufs")
+    parser.add_argument("--max-parallel", type=int, default=MAX_PARALLEL_STEPS,
+                        help="Höchstens so viele unabhängige Schritte gleichzeitig ausführen (1 = nacheinander)")
+    parser.add_argument("--plan", action="store_true",
+                        help="Nur Payloads bauen und die Laufzeit schätzen, nichts senden")
+    parser.add_argument("--measured-run", help="Mit --plan: Durchsatz je Schritt aus diesem früheren Lauf verwenden")
+    args = parser.parse_args()
+    shard = parse_shard(args.shard) if args.shard else None
+    if shard and not args.run_id:
+        parser.error("--shard erfordert eine gemeinsame --run-id für alle Shards.")
+    # Shard und Lauf-Kennung an alle Module weiterreichen
+    os.environ["MIGRATION_RUN_ID"] = args.run_id or datetime.now().strftime("%Y%m%d-%H%M%S")
+    if shard:
+        os.environ["MIGRATION_SHARD"] = args.shard
+    directory = run_dir(os.environ["MIGRATION_RUN_ID"])
+    categories_done, categories_failed = directory / "categories.done", directory / "categories.failed"
+    users_markers = shard_markers(directory, "users", shard[1]) if shard else []
+    if shard:
+        # Markierungen dieses Shards aus einem früheren Versuch mit derselben Lauf-Kennung entfernen
+        for marker in users_markers[shard[0] - 1]:
+            clear_marker(marker)
+        if shard[0] == 1:
+            clear_marker(categories_done)
+            clear_marker(categories_failed)
+    # Mit --fused werden die drei Benutzer-Module durch die kombinierte Pipeline ersetzt
+    modules = select_modules(args.fused)
+    if args.plan:
+        from utils.Validation.PlanMigration import plan_steps
+        plan_steps(modules, STEP_DEPENDENCIES, args.max_parallel, args.measured_run)
+        raise SystemExit(0)
+    # Eingaben aller Schritte parallel vorladen, während die ersten Schritte bereits senden
+    preloader = preload_steps(modules)
+    share_rate_budget(args.max_parallel)
+
+    # Ohne Kategorien bricht ein Shard ab, statt Benutzer und Policies ohne sie anzulegen
+    aborted = []
+    returncodes = {}
+    users_barrier = {}
+    users_lock = threading.Lock()
+
+    def wait_for_users():
+        """
+        Meldet den Stand der eigenen Benutzer-Schritte und wartet auf alle Shards; nur einmal pro Lauf,
+        auch wenn beide Policy-Schritte gleichzeitig starten. Liefert True, wenn alle Shards fertig sind.
+        """
+        with users_lock:
+            if "ok" not in users_barrier:
+                own = [dep for mod in POLICY_MODULES for dep in STEP_DEPENDENCIES[mod] if dep in returncodes]
+                mark_result(*users_markers[shard[0] - 1], ok=all(returncodes[dep] == 0 for dep in own))
+                print(f"\n--- Warte auf die Benutzer aller {shard[1]} Shards ---", flush=True)
+                problems = wait_for_shards(users_markers, timeout=SHARD_WAIT_TIMEOUT)
+                if problems:
+                    print(f"\n--- Benutzer von Shard {', '.join(map(str, problems))} fehlgeschlagen oder nach "
+                          f"{SHARD_WAIT_TIMEOUT} s nicht fertig, Policies werden übersprungen ---", flush=True)
+                users_barrier["ok"] = not problems
+            return users_barrier["ok"]
+
+    def abort_shard(mod):
+        # Die anderen Shards sollen nicht bis zum Timeout auf die Benutzer dieses Shards warten
+        aborted.append(mod)
+        mark_result(*users_markers[shard[0] - 1], ok=False)
+
+    def run_category_step(mod, prefix):
+        # Kategorien sind global: Shard 1 erstellt sie, alle anderen warten darauf
+        if shard[0] == 1:
+            returncode = run_module(mod, prefix)
+            mark_result(categories_done, categories_failed, ok=returncode == 0)
+            if returncode != 0:
+                abort_shard(mod)
+            return returncode
+        print(f"\n--- Warte auf Kategorien von Shard 1 ({categories_done}) ---", flush=True)
+        marker = wait_for_any([categories_done, categories_failed], timeout=SHARD_WAIT_TIMEOUT)
+        if marker == categories_done:
+            return 0
+        if marker is None:
+            print(f"\n--- Keine Kategorien von Shard 1 nach {SHARD_WAIT_TIMEOUT} s, Shard bricht ab ---", flush=True)
+        else:
+            print(f"\n--- Kategorien auf Shard 1 fehlgeschlagen ({marker}), Shard bricht ab ---", flush=True)
+        abort_shard(mod)
+        return 1
+
+    def run_step(mod):
+        prefix = f"[{mod.rsplit('.', 1)[-1]}] " if args.max_parallel > 1 else ""
+        if aborted:
+            print(f"\n--- {mod} übersprungen: Kategorien bzw. Benutzer fehlen ---", flush=True)
+            returncode = 1
+        elif mod == "utils.Creation.CreateCategory" and shard:
+            returncode = run_category_step(mod, prefix)
+        elif mod in POLICY_MODULES and shard and not wait_for_users():
+            aborted.append(mod)
+            returncode = 1
+        else:
+            returncode = run_module(mod, prefix)
+        returncodes[mod] = returncode
+        return returncode
+
+    # Jeder Schritt startet, sobald seine Abhängigkeiten beendet sind
+    timings = run_graph(modules, STEP_DEPENDENCIES, run_step, args.max_parallel)
+    report_schedule(timings, STEP_DEPENDENCIES)
+    if preloader:
+        # Offene Vorlade-Aufträge verwerfen, laufende abwarten (sonst OSError beim Beenden des Interpreters)
+        preloader.shutdown(cancel_futures=True)
+    if aborted:
+        raise SystemExit(1)
@@ -1,27 +1,79 @@
-import subprocess
-import sys
+import argparse
+import os
+from datetime import datetime
+from utils.Runtime.Sharding import parse_shard, clear_marker, mark_result, shard_markers, wait_for_shards
+from utils.Runtime.Journal import run_dir
+from utils.Runtime.InputCache import preload_steps
+from utils.Runtime.Scheduler import MAX_PARALLEL_STEPS, run_module, run_graph, report_schedule, share_rate_budget
 
-def run_module(module_path):
-    """
-    Führt das angegebene Python-Modul als Subprozess aus und gibt die Ausgaben (stdout und stderr) aus.
-    """
-    print(f"\n--- Running: {module_path} ---")
-    # Starte das Modul als Subprozess und sammle dessen Ausgaben
-    result = subprocess.run([sys.executable, "-m", module_path], capture_output=True, text=True)
-    # Zeige die Standardausgabe des Subprozesses
-    print(result.stdout)
-    # Zeige die Fehlerausgabe (falls vorhanden)
-    if result.stderr:
-        print(result.stderr)
+# Liste der Delete-Module in der Reihenfolge, in der sie bei --max-parallel 1 laufen
+DELETION_MODULES = [
+    "utils.Delete.DeleteUsers",
+    "utils.Delete.DeleteProgrammPolicies",
+    "utils.Delete.DeleteClientPolicies",
+    "utils.Delete.DeleteCategories",
+]
+
+# Die beiden Policy-Löschungen sind voneinander unabhängig; Kategorien zuletzt
+STEP_DEPENDENCIES = {
+    "utils.Delete.DeleteUsers": [],
+    "utils.Delete.DeleteProgrammPolicies": ["utils.Delete.DeleteUsers"],
+    "utils.Delete.DeleteClientPolicies": ["utils.Delete.DeleteUsers"],
+    "utils.Delete.DeleteCategories": ["utils.Delete.DeleteUsers", "utils.Delete.DeleteProgrammPolicies",
+                                      "utils.Delete.DeleteClientPolicies"],
+}
+# Wie lange Shard 1 höchstens auf die übrigen Shards wartet, bevor er die Kategorien löscht (Sekunden)
+SHARD_WAIT_TIMEOUT = 2 * 60 * 60
 
 if __name__ == "__main__":
-    # Liste der zu startenden Delete-Module
-    modules = [
-        "utils.Delete.DeleteUsers",
-        "utils.Delete.DeleteProgrammPolicies",
-        "utils.Delete.DeleteClientPolicies",
-        "utils.Delete.DeleteCategories",
-    ]
-    # Starte alle Module nacheinander und zeige deren Ausgaben an
-    for mod in modules:
-        run_module(mod)
+    parser = argparse.ArgumentParser(description="Lösch-Workflow")
+    parser.add_argument("--shard", help="Nur den Teil i von N verarbeiten, z.B. 2/4")
+    parser.add_argument("--run-id", help="Gemeinsame Kennung aller Shards eines Laufs")
+    parser.add_argument("--max-parallel", type=int, default=MAX_PARALLEL_STEPS,
+                        help="Höchstens so viele unabhängige Schritte gleichzeitig ausführen (1 = nacheinander)")
+    args = parser.parse_args()
+    shard = parse_shard(args.shard) if args.shard else None
+    if shard and not args.run_id:
+        parser.error("--shard erfordert eine gemeinsame --run-id für alle Shards.")
+    os.environ["MIGRATION_RUN_ID"] = args.run_id or datetime.now().strftime("%Y%m%d-%H%M%S")
+    if shard:
+        os.environ["MIGRATION_SHARD"] = args.shard
+    modules = DELETION_MODULES
+    # Eingaben aller Schritte parallel vorladen, während die ersten Schritte bereits senden
+    preloader = preload_steps(modules)
+    share_rate_budget(args.max_parallel)
+
+    markers = shard_markers(run_dir(os.environ["MIGRATION_RUN_ID"]), "deletion", shard[1]) if shard else []
+    if shard:
+        # Markierungen dieses Shards aus einem früheren Versuch mit derselben Lauf-Kennung entfernen
+        for marker in markers[shard[0] - 1]:
+            clear_marker(marker)
+    returncodes = {}
+    skipped = []
+
+    def run_step(mod):
+        prefix = f"[{mod.rsplit('.', 1)[-1]}] " if args.max_parallel > 1 else ""
+        if mod == "utils.Delete.DeleteCategories" and shard:
+            # Kategorien sind global: erst löschen, wenn alle Shards ihre Benutzer und Policies entfernt haben
+            ok = all(returncodes.get(dep, 0) == 0 for dep in STEP_DEPENDENCIES[mod])
+            mark_result(*markers[shard[0] - 1], ok=ok)
+            if shard[0] != 1:
+                return 0
+            print("\n--- Warte auf alle Shards vor dem Löschen der Kategorien ---", flush=True)
+            problems = wait_for_shards(markers, timeout=SHARD_WAIT_TIMEOUT)
+            if problems:
+                print(f"\n--- Shard {', '.join(map(str, problems))} fehlgeschlagen oder nach {SHARD_WAIT_TIMEOUT} s "
+                      "nicht fertig, Kategorien werden nicht gelöscht ---", flush=True)
+                skipped.append(mod)
+                return 1
+        returncodes[mod] = run_module(mod, prefix)
+        return returncodes[mod]
+
+    # Jeder Schritt startet, sobald seine Abhängigkeiten beendet sind
+    timings = run_graph(modules, STEP_DEPENDENCIES, run_step, args.max_parallel)
+    report_schedule(timings, STEP_DEPENDENCIES)
+    if preloader:
+        # Offene Vorlade-Aufträge verwerfen, laufende abwarten (sonst OSError beim Beenden des Interpreters)
+        preloader.shutdown(cancel_futures=True)
+    if skipped:
+        raise SystemExit(1)
@@ -0,0 +1,282 @@
+import argparse
+import asyncio
+import json
+import logging
+import os
+import time
+from collections import defaultdict, deque
+from datetime import datetime
+import aiohttp
+from aiohttp import web
+from utils.auth.Authentification import TokenKeeper, api_url
+from utils.Creation.CreateUsers import EXCLUDE_ID, prepare_user
+from utils.Creation.ProvisionUsers import API_PATH, STAGE_ENTITIES, STAGE_INPUTS, build_stage_request, stage_payload
+from utils.Runtime.CircuitBreaker import CircuitOpenError, PAUSED_STATUS
+from utils.Runtime.Journal import get_journal, run_dir
+from utils.Runtime.LogQueue import setup_logging
+from utils.Runtime.Progress import SUCCESS_STATUS
+from utils.Runtime.Replay import normalize_id
+from utils.Runtime.StateStore import get_state_store, payload_hash
+from utils.Runtime.Transport import request_async
+
+# Nur lokal erreichbar: der Dienst selbst prüft keine Berechtigungen
+INTAKE_HOST = "127.0.0.1"
+INTAKE_PORT = int(os.environ.get("MIGRATION_INTAKE_PORT", 40200))
+
+# Aufträge, die innerhalb dieses Zeitfensters (Sekunden) eintreffen, werden gemeinsam versendet
+BATCH_WINDOW = 0.05
+# Höchstens so viele Aufträge pro Batch
+MAX_BATCH = 200
+# Gleichzeitige Requests an Abacus über die gemeinsame Session
+MAX_PARALLEL_REQUESTS = 10
+# Anzahl der letzten Latenzen pro Auftragsart für /stats
+LATENCY_WINDOW = 1000
+
+# Auftragsarten und zugehörige Stufe in ProvisionUsers; Löschen hat keine Stufe
+KINDS = {"create": "Erstellen", "password": "Passwort", "modify": "Ändern", "delete": None}
+# Objektarten, die beim Löschen eines Benutzers in der Zustandsdatenbank als gelöscht gelten (wie DeleteUsers)
+DELETED_ENTITIES = ["user", "user_password", "user_modify", "serviceuser"]
+
+setup_logging()
+
+def build_request(item, token):
+    """
+    Baut den Abacus-Request eines Auftrags mit denselben Payload-Buildern wie ProvisionUsers.
+    Liefert (Methode, URL, Endpunkt-Klasse, Header, Request-Argumente, Erfolgscodes).
+    """
+    headers = {"Authorization": f"Bearer {token}"}
+    if item["kind"] == "delete":
+        return "DELETE", f"{api_url(API_PATH)}/{item['userId']}", "users", headers, {}, [200, 204]
+    stage = KINDS[item["kind"]]
+    return build_stage_request(stage, item["job"], headers)
+
+async def send(session, item, tokens):
+    """
+    Sendet einen Auftrag; bei 401 wird der Token einmal erneuert und der Request wiederholt.
+    Liefert (Status, Status-Code, Antworttext).
+    """
+    for attempt in range(2):
+        method, url, endpoint, headers, kwargs, ok_codes = build_request(item, tokens.token)
+        try:
+            status_code, text = await request_async(session, method, url, endpoint, headers=headers, **kwargs)
+        except CircuitOpenError as e:
+            return PAUSED_STATUS, PAUSED_STATUS, str(e)
+        except Exception as e:
+            return "Fehlgeschlagen", "Netzwerkfehler", str(e)
+        if status_code == 401 and attempt == 0:
+            tokens.invalidate()
+            if await asyncio.to_thread(tokens.refresh):
+                continue
+        break
+    return (SUCCESS_STATUS if status_code in ok_codes else "Fehlgeschlagen"), status_code, text
+
+def record(item, status, status_code, text):
+    """
+    Schreibt das Ergebnis ins Journal und in die Zustandsdatenbank, damit ein späterer
+    Bulk-Lauf den Stand kennt und rollback.py angelegte Benutzer findet.
+    """
+    user_id, kind = item["userId"], item["kind"]
+    created = kind == "create" and status == SUCCESS_STATUS
+    get_journal(f"intake_{kind}", "user").write(user_id, status, status_code, "" if status == SUCCESS_STATUS else f"{kind}: {text}",
+                                        server_id=user_id if created else "")
+    store = get_state_store()
+    if kind == "delete":
+        if status == SUCCESS_STATUS:
+            store.mark_deleted(DELETED_ENTITIES, user_id)
+        return
+    stage = KINDS[kind]
+    store.record(STAGE_ENTITIES[stage], user_id, payload_hash(stage_payload(stage, item["job"])), status,
+                 user_id if created else "")
+
+def percentile(values, share):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(share * len(ordered)))] if ordered else None
+
+class IntakeStats:
+    """
+    Zählt Ergebnisse und Latenzen (Eingang bis Antwort von Abacus) pro Auftragsart.
+    """
+
+    def __init__(self):
+        self.latencies = defaultdict(lambda: deque(maxlen=LATENCY_WINDOW))
+        self.counts = defaultdict(lambda: {"succeeded": 0, "failed": 0})
+        self.batches = 0
+
+    def add(self, kind, status, latency_ms):
+        self.latencies[kind].append(latency_ms)
+        self.counts[kind]["succeeded" if status == SUCCESS_STATUS else "failed"] += 1
+
+    def snapshot(self):
+        return {
+            "batches": self.batches,
+            "kinds": {kind: dict(self.counts[kind],
+                                 p50_ms=round(percentile(values, 0.5), 1), p95_ms=round(percentile(values, 0.95), 1),
+                                 max_ms=round(max(values), 1))
+                      for kind, values in self.latencies.items()},
+        }
+
+async def dispatch_batch(batch, session, tokens, stats):
+    """
+    Versendet einen Batch: Aufträge desselben Benutzers nacheinander in Eingangsreihenfolge
+    (z.B. Erstellen vor Passwort), verschiedene Benutzer parallel über die gemeinsame Session.
+    """
+    dispatched = time.monotonic()
+    if not await asyncio.to_thread(tokens.refresh):
+        for item in batch:
+            item["future"].set_result({"status": "Fehlgeschlagen", "statusCode": "Token",
+                                       "message": "Kein gültiger Token erhalten."})
+        return
+    chains = defaultdict(list)
+    for item in batch:
+        chains[item["userId"]].append(item)
+
+    async def run_chain(items):
+        for item in items:
+            status, status_code, text = await send(session, item, tokens)
+            acked = time.monotonic()
+            record(item, status, status_code, text)
+            latency_ms = item["latency_ms"] = (acked - item["received"]) * 1000
+            stats.add(item["kind"], status, latency_ms)
+            if not item["future"].done():
+                item["future"].set_result({
+                    "status": status, "statusCode": status_code, "message": "" if status == SUCCESS_STATUS else text,
+                    "latencyMs": round(latency_ms, 1), "queuedMs": round((dispatched - item["received"]) * 1000, 1),
+                })
+
+    await asyncio.gather(*(run_chain(items) for items in chains.values()))
+    get_state_store().flush()
+    stats.batches += 1
+    latencies = [item["latency_ms"] for item in batch]
+    kinds = defaultdict(int)
+    for item in batch:
+        kinds[item["kind"]] += 1
+    path = run_dir() / "metrics.jsonl"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "a", encoding="utf-8") as file:
+        file.write(json.dumps({"time": datetime.now().isoformat(), "module": "intake", "metric": "batch",
+                               "values": {"size": len(batch), "users": len(chains), "kinds": kinds,
+                                          "latency_ms": {"p50": round(percentile(latencies, 0.5), 1),
+                                                         "max": round(max(latencies), 1)}}},
+                              ensure_ascii=False) + "\n")
+
+async def dispatcher(queue, session, tokens, stats, window):
+    """
+    Sammelt eingehende Aufträge während window Sekunden (höchstens MAX_BATCH) und versendet sie als Batch.
+    """
+    loop = asyncio.get_running_loop()
+    while True:
+        batch = [await queue.get()]
+        deadline = loop.time() + window
+        while len(batch) < MAX_BATCH:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        try:
+            await dispatch_batch(batch, session, tokens, stats)
+        except Exception as e:
+            logging.error("Fehler beim Versand eines Batches: %s", e)
+            for item in batch:
+                if not item["future"].done():
+                    item["future"].set_result({"status": "Fehlgeschlagen", "statusCode": "Intern", "message": str(e)})
+
+def create_app(window=BATCH_WINDOW, tokens=None):
+    """
+    Baut den Intake-Dienst mit Endpunkten für Erstellen, Passwort, Ändern und Löschen von Benutzern.
+    Jede Antwort kommt erst, wenn Abacus den Auftrag bestätigt oder abgelehnt hat.
+    """
+    tokens = tokens or TokenKeeper()
+    stats = IntakeStats()
+    queue = asyncio.Queue()
+    state = {}
+
+    async def start(app):
+        connector = aiohttp.TCPConnector(limit=MAX_PARALLEL_REQUESTS)
+        state["session"] = aiohttp.ClientSession(connector=connector)
+        # Token schon beim Start holen, damit der erste Auftrag nicht darauf wartet
+        if not await asyncio.to_thread(tokens.refresh):
+            logging.warning("Kein Token beim Start erhalten; nächster Versuch beim ersten Auftrag.")
+        state["dispatcher"] = asyncio.create_task(dispatcher(queue, state["session"], tokens, stats, window))
+
+    async def stop(app):
+        state["dispatcher"].cancel()
+        await state["session"].close()
+        get_state_store().flush()
+
+    async def enqueue(kind, user_id, job=None):
+        item = {"kind": kind, "userId": user_id, "job": job, "received": time.monotonic(),
+                "future": asyncio.get_running_loop().create_future()}
+        await queue.put(item)
+        result = await item["future"]
+        return web.json_response(dict(result, kind=kind, userId=user_id),
+                                 status=200 if result["status"] == SUCCESS_STATUS else 502)
+
+    async def read_body(request):
+        try:
+            body = await request.json()
+        except (ValueError, UnicodeDecodeError):
+            raise web.HTTPBadRequest(text="Ungültiges JSON.")
+        if not isinstance(body, dict):
+            raise web.HTTPBadRequest(text="Erwartet wird ein JSON-Objekt.")
+        return body
+
+    def user_job(stage, user_id, value):
+        job = {"userId": user_id, "create": None, "password": None, "modify": None}
+        job[STAGE_INPUTS[stage]] = value
+        return job
+
+    async def create_user(request):
+        user = prepare_user(await read_body(request))
+        user_id = user.get("userId")
+        if not user_id or user_id == EXCLUDE_ID:
+            raise web.HTTPBadRequest(text="userId fehlt oder ist ungültig.")
+        return await enqueue("create", user_id, user_job("Erstellen", user_id, user))
+
+    async def change_password(request):
+        user_id = normalize_id(request.match_info["id"])
+        password = str((await read_body(request)).get("password") or "").strip()
+        if not password:
+            raise web.HTTPBadRequest(text="password fehlt.")
+        return await enqueue("password", user_id, user_job("Passwort", user_id, password))
+
+    async def modify_user(request):
+        user_id = normalize_id(request.match_info["id"])
+        user = prepare_user(dict(await read_body(request), userId=user_id))
+        return await enqueue("modify", user_id, user_job("Ändern", user_id, user))
+
+    async def delete_user(request):
+        return await enqueue("delete", normalize_id(request.match_info["id"]))
+
+    async def get_stats(request):
+        return web.json_response(dict(stats.snapshot(), queued=queue.qsize()))
+
+    app = web.Application()
+    app.on_startup.append(start)
+    app.on_cleanup.append(stop)
+    id_route = "{id:[^/]+}"
+    app.router.add_post("/users", create_user)
+    app.router.add_put(f"/users/{id_route}/password", change_password)
+    app.router.add_put(f"/users/{id_route}", modify_user)
+    app.router.add_delete(f"/users/{id_route}", delete_user)
+    app.router.add_get("/stats", get_stats)
+    return app
+
+def main():
+    """
+    Startet den Intake-Dienst, z.B. python intake.py --port 40200.
+    """
+    parser = argparse.ArgumentParser(description="Lokaler Dienst für einzelne Benutzeraufträge mit gebündeltem Versand")
+    parser.add_argument("--port", type=int, default=INTAKE_PORT)
+    parser.add_argument("--batch-window", type=float, default=BATCH_WINDOW * 1000,
+                        help="Zeitfenster in Millisekunden, in dem Aufträge gesammelt werden")
+    args = parser.parse_args()
+    # Eigenes Journal pro Dienststart; rollback.py findet darüber die angelegten Benutzer
+    os.environ.setdefault("MIGRATION_RUN_ID", datetime.now().strftime("intake-%Y%m%d-%H%M%S"))
+    logging.info("Intake-Dienst läuft auf http://%s:%d (Journal: %s)", INTAKE_HOST, args.port, run_dir())
+    web.run_app(create_app(args.batch_window / 1000), host=INTAKE_HOST, port=args.port, print=None, access_log=None)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+import argparse
+import importlib
+import json
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+from utils.Runtime.Journal import read_journal, run_dir
+from utils.Runtime.LogQueue import setup_logging
+from utils.Runtime.Progress import SUCCESS_STATUS
+from utils.Runtime.Replay import normalize_id
+
+# Erstellungsschritte im Journal und Art der dabei angelegten Objekte
+CREATED_KINDS = {
+    "create_categories": "categories",
+    "create_users": "users",
+    "create_serviceusers": "users",
+    "provision_users": "users",
+    "intake_create": "users",
+    "create_programpolicies": "program_policies",
+    "create_clientpolicies": "mandant_policies",
+}
+# Schritte, deren Journal keine Server-ID enthält: die Quell-ID ist zugleich die ID auf dem Server
+SOURCE_ID_STEPS = {"create_users", "create_serviceusers"}
+# Schritte mit mehreren Stufen pro Objekt: die Server-ID steht im Eintrag, sobald die Erstellung
+# erfolgreich war, auch wenn eine spätere Stufe (Passwort, Ändern) fehlschlug
+STAGED_STEPS = {"provision_users"}
+
+# Pro Art: Delete-Modul, Lösch-Funktion, Journal-Schritt und Objektart in der Zustandsdatenbank
+DELETERS = {
+    "users": ("utils.Delete.DeleteUsers", "delete_user", "delete_users", "user"),
+    "program_policies": ("utils.Delete.DeleteProgrammPolicies", "delete_ProgrammPolicy",
+                         "delete_programpolicies", "program_policy"),
+    "mandant_policies": ("utils.Delete.DeleteClientPolicies", "delete_ClientPolicy",
+                         "delete_clientpolicies", "mandant_policy"),
+    "categories": ("utils.Delete.DeleteCategories", "delete_category", "delete_categories", "category"),
+}
+# Umgekehrte Abhängigkeitsreihenfolge wie in deletion.py; die Arten einer Phase laufen gemeinsam
+ROLLBACK_PHASES = [["users"], ["program_policies", "mandant_policies"], ["categories"]]
+
+# Parallele DELETE-Requests pro Phase
+MAX_WORKERS = 20
+
+setup_logging()
+
+def collect_created(run_id):
+    """
+    Liest das Journal eines Laufs (aller Shards) und liefert {Art: [Server-ID, ...]} der Objekte,
+    die der Lauf angelegt hat, sowie die Anzahl erfolgreicher Einträge ohne Server-ID.
+    Massgebend ist pro Objekt der letzte Eintrag, z.B. nach einem Replay; fehlgeschlagene oder
+    pausierte Einträge werden nicht gelöscht, auch wenn sie eine Server-ID tragen. Ausgenommen
+    sind die STAGED_STEPS: dort zählt jeder Eintrag mit Server-ID, da die Erstellung gelang.
+    """
+    last, staged = {}, {}
+    for entry in read_journal(run_id):
+        step = entry.get("step")
+        if step not in CREATED_KINDS:
+            continue
+        last[(step, entry["source_id"])] = entry
+        if step in STAGED_STEPS and entry.get("server_id"):
+            # Auch ein späteres Replay, das die Erstellung überspringt, ändert daran nichts
+            staged[(step, entry["source_id"])] = entry["server_id"]
+    created = {kind: {} for kind in DELETERS}
+    without_id = 0
+    for (step, source_id), entry in last.items():
+        uid = staged.get((step, source_id), "")
+        if not uid:
+            if entry["status"] != SUCCESS_STATUS:
+                continue
+            uid = entry.get("server_id") or ""
+            if not uid and step in SOURCE_ID_STEPS:
+                uid = str(source_id)
+        if uid:
+            created[CREATED_KINDS[step]][uid.strip()] = None
+        else:
+            without_id += 1
+    return {kind: list(uids) for kind, uids in created.items()}, without_id
+
+def skip_deleted(created):
+    """
+    Entfernt Objekte, die laut Zustandsdatenbank bereits gelöscht sind, z.B. bei einem
+    zweiten Rollback nach Fehlern. Liefert die Anzahl übersprungener Objekte.
+    """
+    from utils.Runtime.StateStore import get_state_store
+    skipped = 0
+    for kind, uids in created.items():
+        deleted = {normalize_id(uid) for uid in get_state_store().deleted_ids(DELETERS[kind][3])}
+        created[kind] = [uid for uid in uids if normalize_id(uid) not in deleted]
+        skipped += len(uids) - len(created[kind])
+    return skipped
+
+def run_phase(kinds, created, headers, max_workers):
+    """
+    Löscht die Objekte aller Arten einer Phase gemeinsam mit max_workers Threads.
+    Liefert (Journal-Schritt, Server-ID) der Objekte, bei denen die Lösch-Funktion mit einer
+    Ausnahme abbrach; diese werden geloggt und als nicht gelöscht gezählt.
+    """
+    jobs = []
+    for kind in kinds:
+        module_name, function, step, _ = DELETERS[kind]
+        delete = getattr(importlib.import_module(module_name), function)
+        jobs.extend((delete, step, uid) for uid in created[kind])
+        if created[kind]:
+            from utils.Runtime.Progress import get_progress
+            get_progress(step).start(len(created[kind]))
+    errors = set()
+    if not jobs:
+        return errors
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(delete, uid, headers): (step, uid) for delete, step, uid in jobs}
+        for future in as_completed(futures):
+            if future.exception():
+                logging.error("Fehler beim Löschen von '%s': %s", futures[future][1], future.exception())
+                errors.add(futures[future])
+    return errors
+
+def main():
+    """
+    Macht einen Lauf rückgängig: löscht genau die Objekte, die er laut Journal angelegt hat.
+    """
+    parser = argparse.ArgumentParser(description="Objekte eines Laufs anhand seines Journals löschen")
+    parser.add_argument("run", help="Kennung des rückgängig zu machenden Laufs (Verzeichnis in _data/results/journal)")
+    parser.add_argument("--max-workers", type=int, default=MAX_WORKERS,
+                        help="Parallele DELETE-Requests pro Phase")
+    parser.add_argument("--dry-run", action="store_true", help="Nur anzeigen und den Plan speichern, nichts löschen")
+    args = parser.parse_args()
+    if not run_dir(args.run).is_dir():
+        parser.error(f"Kein Journal für den Lauf '{args.run}' in '{run_dir(args.run)}' gefunden.")
+    # Der Rollback schreibt eigene Journale, das Journal des ursprünglichen Laufs bleibt unverändert
+    rollback_id = f"rollback-{args.run}-{datetime.now().strftime('%Y%m%d-%H%M%S')}"
+    os.environ["MIGRATION_RUN_ID"] = rollback_id
+
+    created, without_id = collect_created(args.run)
+    skipped = skip_deleted(created)
+    for kind, uids in created.items():
+        logging.info("Rollback %s: %d %s zu löschen.", args.run, len(uids), kind)
+    if skipped:
+        logging.info("%d Objekte sind bereits gelöscht und werden übersprungen.", skipped)
+    if without_id:
+        logging.warning("%d erfolgreich angelegte Objekte haben im Journal keine Server-ID und müssen "
+                        "von Hand gelöscht werden.", without_id)
+    plan = {"run_id": args.run, "rollback_id": rollback_id, "created": created,
+            "skipped": skipped, "without_id": without_id, "dry_run": args.dry_run}
+    run_dir(rollback_id).mkdir(parents=True, exist_ok=True)
+    (run_dir(rollback_id) / "rollback_plan.json").write_text(json.dumps(plan, indent=2), encoding="utf-8")
+    if args.dry_run or not any(created.values()):
+        return
+
+    from utils.auth.Authentification import get_auth_headers
+    headers = get_auth_headers()
+    if not headers:
+        logging.error("Abbruch: Kein gültiger Token erhalten.")
+        return
+    started = time.monotonic()
+    errors = set()
+    for kinds in ROLLBACK_PHASES:
+        phase_started = time.monotonic()
+        errors |= run_phase(kinds, created, headers, args.max_workers)
+        logging.info("Phase %s abgeschlossen in %.1f s.", "/".join(kinds), time.monotonic() - phase_started)
+    from utils.Runtime.StateStore import get_state_store
+    get_state_store().flush()
+    delete_steps = {step for _, _, step, _ in DELETERS.values()}
+    failed = {(entry["step"], entry["source_id"]) for entry in read_journal(rollback_id)
+              if entry.get("step") in delete_steps and entry["status"] != SUCCESS_STATUS} | errors
+    logging.info("Rollback %s abgeschlossen in %.1f s: %d von %d Objekten nicht gelöscht, Journal in '%s'.",
+                 args.run, time.monotonic() - started, len(failed), sum(map(len, created.values())),
+                 run_dir(rollback_id))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+import argparse
+import json
+import logging
+import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from creation import select_modules
+from deletion import DELETION_MODULES
+from utils.Runtime.Journal import run_dir
+from utils.Runtime.Progress import read_status
+from utils.Runtime.InputCache import STEP_INPUTS, preload
+from utils.Runtime.LogQueue import setup_logging
+from utils.Runtime.Scheduler import MAX_PARALLEL_STEPS, run_module
+
+# Liste der Zielsysteme; enthält nur Verweise auf die Zugangsdaten, gehört aber trotzdem nicht ins Repository
+TARGETS_FILE = Path("utils/auth/targets.json")
+
+# Umgebungsvariablen mit Zugangsdaten, die nicht von diesem Prozess an die Ziele vererbt werden dürfen
+CREDENTIAL_VARIABLES = {"MIGRATION_ACCESS_TOKEN", "MIGRATION_CLIENT_ID", "MIGRATION_CLIENT_SECRET", "MIGRATION_BASE_URL"}
+
+setup_logging()
+
+def load_targets(path=TARGETS_FILE):
+    """
+    Liest die Zielsysteme, z.B.
+    [{"name": "test", "secret_file": "utils/auth/ClientSecret_test.txt", "rate_limit": 50, "max_parallel": 3}].
+    secret_file hat das Format von ClientSecret.txt; rate_limit (Requests/s) und max_parallel sind optional.
+    """
+    with open(path, "r", encoding="utf-8") as file:
+        targets = json.load(file)
+    names = set()
+    for target in targets:
+        name = target.get("name", "")
+        if not re.fullmatch(r"[A-Za-z0-9_-]+", name):
+            raise ValueError(f"Ungültiger Zielname '{name}': erlaubt sind Buchstaben, Ziffern, '-' und '_'.")
+        if name in names:
+            raise ValueError(f"Zielname '{name}' ist mehrfach vorhanden.")
+        names.add(name)
+        if not Path(target.get("secret_file", "")).is_file():
+            raise ValueError(f"Ziel '{name}': secret_file '{target.get('secret_file')}' wurde nicht gefunden.")
+    return targets
+
+def target_env(target, run_id):
+    """
+    Umgebung der Prozesse eines Ziels: eigene Zugangsdaten (und damit eigener Token), eigenes
+    Request-Budget, eigene Lauf-Kennung; Ergebnisse und Zustandsdatenbank liegen pro Ziel getrennt.
+    """
+    env = {key: value for key, value in os.environ.items() if key not in CREDENTIAL_VARIABLES}
+    env["MIGRATION_TARGET"] = target["name"]
+    env["MIGRATION_CLIENT_SECRET_FILE"] = str(target["secret_file"])
+    env["MIGRATION_RUN_ID"] = f"{run_id}-{target['name']}"
+    if target.get("rate_limit"):
+        env["MIGRATION_RATE_LIMIT"] = str(target["rate_limit"])
+    return env
+
+def run_target(target, workflow, run_id, args):
+    """
+    Führt den Workflow für ein Ziel aus und liefert dessen Zusammenfassung.
+    """
+    env = target_env(target, run_id)
+    workflow_args = ["--run-id", env["MIGRATION_RUN_ID"],
+                     "--max-parallel", str(target.get("max_parallel", args.max_parallel))]
+    if args.fused:
+        workflow_args.append("--fused")
+    started = time.monotonic()
+    returncode = run_module(workflow, f"[{target['name']}] ", workflow_args, env)
+    statuses = read_status(env["MIGRATION_RUN_ID"])
+    return {
+        "target": target["name"],
+        "run_id": env["MIGRATION_RUN_ID"],
+        "returncode": returncode,
+        "duration": round(time.monotonic() - started, 3),
+        "succeeded": sum(status.get("succeeded") or 0 for status in statuses),
+        "failed": sum(status.get("failed") or 0 for status in statuses),
+    }
+
+def main():
+    """
+    Führt denselben Workflow gleichzeitig gegen alle Zielsysteme aus der Zielliste aus.
+    """
+    parser = argparse.ArgumentParser(description="Dieselben Exporte gleichzeitig auf mehrere Abacus-Instanzen migrieren")
+    parser.add_argument("--targets", default=str(TARGETS_FILE), help="JSON-Datei mit den Zielsystemen")
+    parser.add_argument("--only", action="append", help="Nur dieses Ziel (mehrfach möglich)")
+    parser.add_argument("--workflow", choices=["creation", "deletion"], default="creation")
+    parser.add_argument("--fused", action="store_true",
+                        help="Benutzer in einem Durchlauf erstellen, Passwort setzen und ändern (nur creation)")
+    parser.add_argument("--run-id", help="Gemeinsame Kennung; jedes Ziel erhält <run-id>-<Ziel>")
+    parser.add_argument("--max-parallel", type=int, default=MAX_PARALLEL_STEPS,
+                        help="Parallele Schritte pro Ziel, falls in der Zielliste nicht angegeben")
+    args = parser.parse_args()
+    if args.fused and args.workflow != "creation":
+        parser.error("--fused gibt es nur für --workflow creation.")
+    try:
+        targets = load_targets(args.targets)
+    except (OSError, ValueError) as e:
+        parser.error(f"Zielliste '{args.targets}' nicht verwendbar: {e}")
+    if args.only:
+        unknown = set(args.only) - {target["name"] for target in targets}
+        if unknown:
+            parser.error(f"Unbekannte Ziele: {', '.join(sorted(unknown))}")
+        targets = [target for target in targets if target["name"] in args.only]
+    run_id = args.run_id or datetime.now().strftime("%Y%m%d-%H%M%S")
+
+    # Eingaben einmal parsen; alle Ziele lesen danach dieselben aufbereiteten Daten aus dem Cache
+    modules = select_modules(args.fused) if args.workflow == "creation" else DELETION_MODULES
+    preload([spec for module in modules for spec in STEP_INPUTS.get(module, [])], block=True)
+    logging.info("Lauf %s: %s auf %d Ziele(n): %s", run_id, args.workflow, len(targets),
+                 ", ".join(target["name"] for target in targets))
+    with ThreadPoolExecutor(max_workers=len(targets) or 1) as executor:
+        summaries = list(executor.map(lambda target: run_target(target, args.workflow, run_id, args), targets))
+
+    print(f"\n--- Zielsysteme ---\n{'Ziel':<20} {'Exit':>5} {'Dauer (s)':>10} {'Erfolgreich':>12} {'Fehlgeschlagen':>15}")
+    for summary in summaries:
+        print(f"{summary['target']:<20} {summary['returncode']:>5} {summary['duration']:>10.1f} "
+              f"{summary['succeeded']:>12} {summary['failed']:>15}")
+    directory = run_dir(run_id)
+    directory.mkdir(parents=True, exist_ok=True)
+    (directory / "targets.json").write_text(json.dumps(summaries, indent=2, ensure_ascii=False), encoding="utf-8")
+    with open(directory / "metrics.jsonl", "a", encoding="utf-8") as file:
+        file.write(json.dumps({"time": datetime.now().isoformat(), "module": "targets", "metric": "targets",
+                               "values": summaries}, ensure_ascii=False) + "\n")
+
+if __name__ == "__main__":
+    main()
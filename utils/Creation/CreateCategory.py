@@ -1,18 +1,26 @@
-import requests
 import json
-import pandas as pd
 import logging
 from pathlib import Path
-from utils.auth.Authentification import get_bearer_token, get_auth_headers, get_base_url
+from utils.auth.Authentification import get_bearer_token, get_auth_headers, api_url
+from utils.Runtime.Journal import get_journal
+from utils.Runtime.Sharding import get_shard
+from utils.Runtime.StateStore import get_state_store, payload_hash
+from utils.Runtime.Transport import request, TransportError
+from utils.Runtime.CircuitBreaker import CircuitOpenError, PAUSED_STATUS
+from utils.Runtime.Replay import select_failed_from_journal
+from utils.Runtime.Arguments import get_module_args
+from utils.Runtime.LogQueue import setup_logging
+from utils.Runtime.Progress import get_progress
+from utils.Runtime.InputCache import read_json_frame
 
 # Setzt die Pfade zu Daten und API-Endpunkt
 DATA_DIR = Path("_data")
 JSON_FILE = DATA_DIR / "OBT_Export_Create_Categories.json"
 EXCLUDE_ID = "{00000000-0000-0000-0000-000000000000}"
-API_URL = f"{get_base_url()}/api/provisioning-users/v1/categories"
+API_PATH = "/api/provisioning-users/v1/categories"
 
 # Logging-Format festlegen (Konsole)
-logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+setup_logging()
 
 def load_and_filter_categories():
     """
@@ -20,7 +28,7 @@ def load_and_filter_categories():
     und gibt eine Liste von Dictionaries zurück.
     """
     try:
-        df = pd.read_json(JSON_FILE)
+        df = read_json_frame(JSON_FILE)
         # Entferne Kategorien mit EXCLUDE_ID als eigene oder Parent-ID
         df = df[
             (df["userCategoryId"] != EXCLUDE_ID) &
@@ -38,32 +46,57 @@ def create_user_category(category_data, headers):
     Sendet eine POST-Anfrage zum Erstellen einer Benutzerkategorie.
     Loggt das Ergebnis (Erfolg oder Fehler).
     """
+    # Hole den deutschsprachigen Kategorienamen für Logging
+    name_de = category_data.get("name", {}).get("data", {}).get("de", "Unbekannt")
+    journal = get_journal("create_categories", "category")
+    category_id = category_data.get("userCategoryId", "")
+    status, message = "Fehlgeschlagen", ""
     try:
-        response = requests.post(API_URL, headers=headers, json=category_data)
-        # Hole den deutschsprachigen Kategorienamen für Logging
-        name_de = category_data.get("name", {}).get("data", {}).get("de", "Unbekannt")
+        response = request("POST", api_url(API_PATH), "categories", headers=headers, json=category_data)
+        status_code = response.status_code
         if response.status_code in [200, 201]:
-            logging.info("Benutzerkategorie '%s' erfolgreich erstellt.", name_de)
+            logging.debug("Benutzerkategorie '%s' erfolgreich erstellt.", name_de)
+            status = "Erfolgreich"
         else:
             logging.error("Fehler bei '%s': %s - %s", name_de, response.status_code, response.text)
-    except requests.RequestException as e:
+            message = response.text
+    except CircuitOpenError as e:
+        logging.error("Kategorie '%s' nicht gesendet: %s", name_de, e)
+        status, status_code, message = PAUSED_STATUS, PAUSED_STATUS, str(e)
+    except TransportError as e:
         logging.error("Netzwerkfehler bei Kategorie '%s': %s", name_de, e)
+        status_code, message = "Netzwerkfehler", str(e)
+    # Server-ID nur bei Erfolg: rollback.py löscht genau die Objekte mit Server-ID
+    server_id = category_id if status == "Erfolgreich" else ""
+    journal.write(category_id, status, status_code, message, server_id=server_id)
+    get_state_store().record("category", category_id, payload_hash(category_data), status, server_id)
 
 def main():
     """
     Holt Auth-Header, lädt und filtert Kategorien,
     und sendet diese einzeln an die API.
     """
+    # Kategorien sind global und werden nur vom ersten Shard erstellt
+    shard = get_shard()
+    if shard and shard[0] != 1:
+        logging.info("Shard %d/%d: Kategorien werden von Shard 1 erstellt, nichts zu tun.", *shard)
+        return
+
     headers = get_auth_headers()
     if not headers:
         logging.error("Abbruch  Kein gültiger Token erhalten.")
         return
 
     categories = load_and_filter_categories()
+    # Seit der letzten erfolgreichen Synchronisation unveränderte Kategorien überspringen
+    categories, _ = get_state_store().filter_changed("category", categories, lambda c: c["userCategoryId"])
+    if get_module_args().replay:
+        categories = select_failed_from_journal(categories, "create_categories", lambda c: c["userCategoryId"])
     if not categories:
         logging.warning("Keine gültigen Benutzerkategorien gefunden.")
         return
 
+    get_progress("create_categories").start(len(categories))
     for category in categories:
         # Zeigt die verarbeitete Kategorie im Debug-Modus an
         logging.debug("Verarbeite Kategorie: %s", json.dumps(category, indent=2, ensure_ascii=False))
@@ -1,27 +1,51 @@
 import pandas as pd
 from datetime import datetime
-import requests
 import logging
 import json
 from pathlib import Path
-from utils.auth.Authentification import get_auth_headers, get_base_url
+from utils.auth.Authentification import get_auth_headers, api_url
+from utils.Creation.PolicyRanges import canonical_range
+from utils.Creation.PolicyDedup import deduplicate_policies
+from utils.Validation.ReferenceIndex import find_invalid_references, write_rejects, policy_label, policy_key, POLICY_REFERENCES
+from utils.Runtime.Journal import get_journal, server_id_from_response
+from utils.Runtime.StateStore import get_state_store, payload_hash
+from utils.Runtime.Transport import request, TransportError
+from utils.Runtime.CircuitBreaker import CircuitOpenError, PAUSED_STATUS
+from utils.Runtime.Replay import select_failed_from_journal
+from utils.Runtime.Arguments import get_module_args
+from utils.Runtime.Sharding import filter_shard, shard_path
+from utils.Runtime.LogQueue import setup_logging
+from utils.Runtime.Progress import get_progress
+from utils.Runtime.InputCache import read_excel
 
 # Setzt die Pfade für Arbeitsverzeichnis, Quelldatei und API-Endpunkt
 DATA_DIR = Path("_data")
 EXCEL_FILE = DATA_DIR / "OBT_Export_Create_ClientPolicies.xlsx"
-API_URL = f"{get_base_url()}/api/provisioning-users/v1/policies/mandants"
+REJECTS_FILE = DATA_DIR / "results/rejects_create_clientpolicies.xlsx"
+DEDUP_FILE = DATA_DIR / "results/dedup_create_clientpolicies.xlsx"
+API_PATH = "/api/provisioning-users/v1/policies/mandants"
+
+# Mapping: Excel-Spaltennamen auf Felder im JSON
+COLUMN_MAPPING = {
+    'name_data_de': 'name_data_de',
+    'negative': 'negative',
+    'force': 'force',
+    'inactive': 'inactive',
+    'userCategories': 'userCategories',
+    'users': 'users',
+    'mandantAccess_range': 'mandantAccess_range',
+    'mandantAccess_Application': 'mandantAccess_applications',
+}
 
 # Konfiguriert das Logging für konsistente Ausgaben
-logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+setup_logging()
 
-def load_mandant_policies(excel_file, column_mapping, headers):
+def build_mandant_policies(df, column_mapping):
     """
-    Lädt Mandanten-Policies aus einer Excel-Datei,
-    wandelt jede Zeile in ein Policy-Objekt um und sendet sie einzeln an die API.
+    Wandelt jede Excel-Zeile in ein Mandanten-Policy-Objekt um.
     """
-    df = pd.read_excel(excel_file)
     all_policies = []
-    for idx, row in df.iterrows():
+    for _, row in df.iterrows():
         # Erzeuge das Policy-Objekt auf Basis der Spaltenzuordnung und Werte der Zeile
         obj = {
             "name": {
@@ -55,27 +79,62 @@ def load_mandant_policies(excel_file, column_mapping, headers):
             obj["mandantAccess"]["applications"] = [a.strip() for a in str(row[column_mapping['mandantAccess_Application']]).split(",") if a.strip()]
         # Befülle das range-Feld (als kommaseparierte String-Liste, ohne Duplikate), falls vorhanden
         if pd.notna(row[column_mapping['mandantAccess_range']]):
-            range_items = [item.strip() for item in str(row[column_mapping['mandantAccess_range']]).split(",") if item.strip()]
-            unique_range = list(dict.fromkeys(range_items))
-            obj["mandantAccess"]["range"] = ",".join(unique_range)
+            range_items = [item.strip() for item in str(row[column_mapping['mandantAccess_range']]).split(",")]
+            obj["mandantAccess"]["range"] = canonical_range(dict.fromkeys(range_items))
         all_policies.append(obj)
+    return all_policies
+
+def load_mandant_policies(excel_file, column_mapping, headers):
+    """
+    Lädt Mandanten-Policies aus einer Excel-Datei, wandelt jede Zeile in ein Policy-Objekt um,
+    fasst inhaltsgleiche Zeilen zusammen, verwirft Policies mit ungültigen Referenzen
+    und sendet die übrigen einzeln an die API.
+    """
+    df = read_excel(excel_file)
+    all_policies = build_mandant_policies(df, column_mapping)
+    unique_rows = deduplicate_policies(all_policies, shard_path(DEDUP_FILE), policy_label)
+    policies = [all_policies[idx] for idx in unique_rows]
+    invalid = find_invalid_references(policies, POLICY_REFERENCES)
+    rejected = write_rejects(policies, invalid, REJECTS_FILE, policy_label)
+    # Zeilennummern bleiben für das Logging erhalten
+    rows = [(idx, obj) for pos, (idx, obj) in enumerate(zip(unique_rows, policies)) if pos not in rejected]
+    rows = filter_shard(rows, lambda row: policy_key(row[1]))
+    rows, _ = get_state_store().filter_changed("mandant_policy", rows, lambda row: policy_key(row[1]),
+                                               payload=lambda row: row[1])
+    if get_module_args().replay:
+        rows = select_failed_from_journal(rows, "create_clientpolicies", lambda row: policy_key(row[1]))
+    get_progress("create_clientpolicies").start(len(rows))
+    for idx, obj in rows:
         # Sende das Policy-Objekt an die API
         create_mandant_policy(obj, headers)
-        logging.info("API-Call für Zeile %d ausgeführt.", idx + 1)
+        logging.debug("API-Call für Zeile %d ausgeführt.", idx + 1)
 
 def create_mandant_policy(json_data, headers):
     """
     Sendet eine POST-Anfrage zur Erstellung einer Mandanten-Policy an die API
     und loggt das Ergebnis.
     """
+    journal = get_journal("create_clientpolicies", "mandant_policy")
+    name = policy_label(json_data)
+    status, message, server_id = "Fehlgeschlagen", "", ""
     try:
-        response = requests.post(API_URL, headers=headers, json=json_data)
+        response = request("POST", api_url(API_PATH), "mandant_policies", headers=headers, json=json_data)
+        status_code = response.status_code
         if response.status_code in [200, 201]:
-            logging.info("Mandant-Policy erfolgreich erstellt.")
+            logging.debug("Mandant-Policy erfolgreich erstellt.")
+            status, server_id = "Erfolgreich", server_id_from_response(response.text)
         else:
             logging.error("Fehler: %s - %s", response.status_code, response.text)
-    except requests.RequestException as e:
+            message = response.text
+    except CircuitOpenError as e:
+        logging.error("Policy '%s' nicht gesendet: %s", name, e)
+        status, status_code, message = PAUSED_STATUS, PAUSED_STATUS, str(e)
+    except TransportError as e:
         logging.error("Netzwerkfehler: %s", e)
+        status_code, message = "Netzwerkfehler", str(e)
+    key = policy_key(json_data)
+    journal.write(key, status, status_code, message, server_id)
+    get_state_store().record("mandant_policy", key, payload_hash(json_data), status, server_id)
 
 def main():
     """
@@ -87,19 +146,7 @@ def main():
         logging.error("Abbruch: Kein gültiger Token erhalten.")
         return
 
-    # Mapping: Excel-Spaltennamen auf Felder im JSON
-    column_mapping = {
-        'name_data_de': 'name_data_de',
-        'negative': 'negative',
-        'force': 'force',
-        'inactive': 'inactive',
-        'userCategories': 'userCategories',
-        'users': 'users',
-        'mandantAccess_range': 'mandantAccess_range',
-        'mandantAccess_Application': 'mandantAccess_applications',
-    }
-
-    load_mandant_policies(EXCEL_FILE, column_mapping, headers)
+    load_mandant_policies(EXCEL_FILE, COLUMN_MAPPING, headers)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -1,25 +1,50 @@
 import pandas as pd
 from datetime import datetime
-import requests
 import logging
 from pathlib import Path
-from concurrent.futures import ThreadPoolExecutor
-from utils.auth.Authentification import get_auth_headers, get_base_url
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from utils.auth.Authentification import get_auth_headers, api_url
+from utils.Creation.PolicyRanges import canonical_range
+from utils.Creation.PolicyDedup import deduplicate_policies
+from utils.Validation.ReferenceIndex import reject_invalid_references, policy_label, policy_key, POLICY_REFERENCES
+from utils.Runtime.Journal import get_journal, server_id_from_response
+from utils.Runtime.StateStore import get_state_store, payload_hash
+from utils.Runtime.Transport import request, TransportError
+from utils.Runtime.CircuitBreaker import CircuitOpenError, PAUSED_STATUS
+from utils.Runtime.Replay import select_failed_from_journal
+from utils.Runtime.Arguments import get_module_args
+from utils.Runtime.Sharding import filter_shard, shard_path
+from utils.Runtime.LogQueue import setup_logging
+from utils.Runtime.Progress import get_progress
+from utils.Runtime.InputCache import read_excel
 
 # Definiert Arbeits- und API-Pfade
 DATA_DIR = Path("_data")
 EXCEL_FILE = DATA_DIR / "OBT_Export_Create_ProgrammPolicies.xlsx"
-API_URL = f"{get_base_url()}/api/provisioning-users/v1/policies/programs"
+REJECTS_FILE = DATA_DIR / "results/rejects_create_programpolicies.xlsx"
+DEDUP_FILE = DATA_DIR / "results/dedup_create_programpolicies.xlsx"
+API_PATH = "/api/provisioning-users/v1/policies/programs"
+
+# Mapping: Excel-Spaltennamen auf Felder im JSON
+COLUMN_MAPPING = {
+    'name_data_de': 'name_data_de',
+    'negative': 'negative',
+    'force': 'force',
+    'inactive': 'inactive',
+    'userCategories': 'userCategories',
+    'users': 'users'
+}
+
+# Anzahl Threads für den parallelen Versand
+MAX_WORKERS = 10
 
 # Setzt Logging-Format für Konsolenausgaben
-logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+setup_logging()
 
-def load_programm_policies(excel_file, column_mapping, headers):
+def build_programm_policies(df, column_mapping):
     """
-    Liest Programm-Policies aus Excel, baut pro Zeile das passende JSON-Objekt
-    und sendet alle Policies parallelisiert an die API.
+    Baut pro Excel-Zeile das passende JSON-Objekt einer Programm-Policy.
     """
-    df = pd.read_excel(excel_file)
     json_objects = []
     for _, row in df.iterrows():
         # Grundstruktur für eine Policy (leere Listen, leere Felder nach Vorgabe)
@@ -61,30 +86,68 @@ def load_programm_policies(excel_file, column_mapping, headers):
                 if app_name != 'df' and ranges:
                     extra = [str(i) for i in list(range(70, 80)) + list(range(700, 800)) + list(range(7000, 8000))]
                     ranges.extend(extra)
-                # Falls noch Bereiche vorhanden, füge sie zum programAccess-Array hinzu
-                if ranges:  
+                # Falls noch Bereiche vorhanden, füge sie sortiert und ohne Duplikate zum programAccess-Array hinzu
+                if ranges:
                     obj["programAccess"].append({
                         "application": app_name,
-                        "range": ",".join(ranges)
+                        "range": canonical_range(ranges)
                     })
         json_objects.append(obj)
+    return json_objects
+
+def load_programm_policies(excel_file, column_mapping, headers):
+    """
+    Liest Programm-Policies aus Excel, baut pro Zeile das passende JSON-Objekt, fasst
+    inhaltsgleiche Zeilen zusammen, verwirft Policies mit ungültigen Referenzen und sendet
+    die übrigen parallelisiert an die API.
+    """
+    df = read_excel(excel_file)
+    json_objects = build_programm_policies(df, column_mapping)
+    json_objects = [json_objects[idx] for idx in deduplicate_policies(json_objects, shard_path(DEDUP_FILE), policy_label)]
+    json_objects = filter_shard(json_objects, policy_key)
+    json_objects = reject_invalid_references(json_objects, POLICY_REFERENCES, REJECTS_FILE, policy_label)
+    json_objects, _ = get_state_store().filter_changed("program_policy", json_objects, policy_key)
+    if get_module_args().replay:
+        json_objects = select_failed_from_journal(json_objects, "create_programpolicies", policy_key)
     # Sende alle Policies parallelisiert an die API
-    with ThreadPoolExecutor() as executor:
-        futures = [executor.submit(create_programm_policy, obj, headers) for obj in json_objects]
     logging.info("%d Program-Policies werden parallel gesendet.", len(json_objects))
+    get_progress("create_programpolicies").start(len(json_objects))
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        futures = {executor.submit(create_programm_policy, obj, headers): obj for obj in json_objects}
+        # Fehler in den Threads nicht verschlucken; Fehler beim Request sind bereits im Journal
+        for future in as_completed(futures):
+            if future.exception():
+                logging.error("Fehler bei Policy '%s': %s", policy_label(futures[future]), future.exception())
 
 def create_programm_policy(json_data, headers):
     """
     Sendet eine einzelne Programm-Policy per POST-Request an die API und loggt das Ergebnis.
     """
+    journal = get_journal("create_programpolicies", "program_policy")
+    name = policy_label(json_data)
+    status, message, server_id = "Fehlgeschlagen", "", ""
     try:
-        response = requests.post(API_URL, headers=headers, json=json_data)
+        response = request("POST", api_url(API_PATH), "program_policies", headers=headers, json=json_data)
+        status_code = response.status_code
         if response.status_code in [200, 201]:
-            logging.info("Program-Policy erfolgreich erstellt.")
+            logging.debug("Program-Policy erfolgreich erstellt.")
+            status, server_id = "Erfolgreich", server_id_from_response(response.text)
         else:
             logging.error("Fehler: %s - %s", response.status_code, response.text)
-    except requests.RequestException as e:
+            message = response.text
+    except CircuitOpenError as e:
+        logging.error("Policy '%s' nicht gesendet: %s", name, e)
+        status, status_code, message = PAUSED_STATUS, PAUSED_STATUS, str(e)
+    except TransportError as e:
         logging.error("Netzwerkfehler: %s", e)
+        status_code, message = "Netzwerkfehler", str(e)
+    except Exception as e:
+        # z.B. eine nicht serialisierbare Payload: als fehlgeschlagen verbuchen statt im Thread verlieren
+        logging.error("Fehler bei Policy '%s': %s", name, e)
+        status_code, message = "Interner Fehler", str(e)
+    key = policy_key(json_data)
+    journal.write(key, status, status_code, message, server_id)
+    get_state_store().record("program_policy", key, payload_hash(json_data), status, server_id)
 
 def main():
     """
@@ -95,16 +158,7 @@ def main():
         logging.error("Abbruch  Kein gültiger Token erhalten.")
         return
 
-    column_mapping = {
-        'name_data_de': 'name_data_de',
-        'negative': 'negative',
-        'force': 'force',
-        'inactive': 'inactive',
-        'userCategories': 'userCategories',
-        'users': 'users'
-    }
-
-    load_programm_policies(EXCEL_FILE, column_mapping, headers)
+    load_programm_policies(EXCEL_FILE, COLUMN_MAPPING, headers)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
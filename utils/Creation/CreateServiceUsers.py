@@ -1,11 +1,20 @@
 import asyncio
 import aiohttp
 import pandas as pd
-import json
 import logging
 from pathlib import Path
 from collections import defaultdict
-from utils.auth.Authentification import get_auth_headers, get_base_url
+from utils.auth.Authentification import get_auth_headers, api_url
+from utils.Validation.ReferenceIndex import reject_invalid_references, USER_REFERENCES
+from utils.Runtime.Journal import get_journal
+from utils.Runtime.Sharding import filter_shard, shard_path
+from utils.Runtime.StateStore import get_state_store
+from utils.Runtime.Replay import select_failed, merge_with_previous
+from utils.Runtime.Arguments import get_module_args
+from utils.Runtime.Transport import request_async
+from utils.Runtime.CircuitBreaker import CircuitOpenError, PAUSED_STATUS
+from utils.Runtime.LogQueue import setup_logging
+from utils.Runtime.InputCache import read_json
 
 # Zentrales Limit für parallele Requests
 MAX_PARALLEL_REQUESTS = 5
@@ -14,16 +23,16 @@ DATA_DIR = Path("_data")
 JSON_FILE = DATA_DIR / "OBT_Export_Create_ServiceUsers.json"
 RESULT_FILE = DATA_DIR / "results/result_create_serviceusers.xlsx"
 DUPLICATES_FILE = DATA_DIR / "results/duplicates_create_serviceusers.xlsx"
+REJECTS_FILE = DATA_DIR / "results/rejects_create_serviceusers.xlsx"
 EXCLUDE_ID = "00000000-0000-0000-0000-000000000000"
 
-API_URL = f"{get_base_url()}/api/provisioning-users/v1/users/serviceusers"
+API_PATH = "/api/provisioning-users/v1/users/serviceusers"
 
-logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+setup_logging()
 
 def load_and_filter_users():
     try:
-        with open(JSON_FILE, "r", encoding="utf-8") as file:
-            data = json.load(file)
+        data = read_json(JSON_FILE)
         if isinstance(data, dict):
             data = [data]
         df = pd.DataFrame(data)
@@ -34,8 +43,8 @@ def load_and_filter_users():
         df = df[df["userId"] != EXCLUDE_ID]
         duplicated_names = df[df.duplicated(subset="name", keep=False)]
         if not duplicated_names.empty:
-            duplicated_names.to_excel(DUPLICATES_FILE, index=False)
-            logging.info("Duplikate gespeichert in '%s'", DUPLICATES_FILE)
+            duplicated_names.to_excel(shard_path(DUPLICATES_FILE), index=False)
+            logging.info("Duplikate gespeichert in '%s'", shard_path(DUPLICATES_FILE))
         name_counter = defaultdict(int)
         new_names = []
         for name in df["name"]:
@@ -67,15 +76,23 @@ async def modify_user(session, user_data, headers):
     user_id = user_data["userId"]
     async with semaphore:
         try:
-            async with session.post(f"{API_URL}/{user_id}", headers=headers, json=user_data) as response:
-                resp_text = await response.text()
-                return {
-                    "Benutzer-ID": user_id,
-                    "Benutzername": user_data["name"],
-                    "Status": "Erfolgreich" if response.status in [200, 204] else "Fehlgeschlagen",
-                    "Status-Code": response.status,
-                    "Nachricht": "Benutzer erfolgreich aktualisiert." if response.status in [200, 204] else resp_text
-                }
+            status, resp_text = await request_async(session, "POST", f"{api_url(API_PATH)}/{user_id}", "serviceusers",
+                                                    headers=headers, json=user_data)
+            return {
+                "Benutzer-ID": user_id,
+                "Benutzername": user_data["name"],
+                "Status": "Erfolgreich" if status in [200, 204] else "Fehlgeschlagen",
+                "Status-Code": status,
+                "Nachricht": "Benutzer erfolgreich aktualisiert." if status in [200, 204] else resp_text
+            }
+        except CircuitOpenError as e:
+            return {
+                "Benutzer-ID": user_id,
+                "Benutzername": user_data["name"],
+                "Status": PAUSED_STATUS,
+                "Status-Code": PAUSED_STATUS,
+                "Nachricht": str(e)
+            }
         except Exception as e:
             return {
                 "Benutzer-ID": user_id,
@@ -88,8 +105,8 @@ async def modify_user(session, user_data, headers):
 def save_results(results):
     try:
         df = pd.DataFrame(results)
-        df.to_excel(RESULT_FILE, index=False)
-        logging.info("Ergebnisse gespeichert in '%s'", RESULT_FILE)
+        df.to_excel(shard_path(RESULT_FILE), index=False)
+        logging.info("Ergebnisse gespeichert in '%s'", shard_path(RESULT_FILE))
     except Exception as e:
         logging.error("Fehler beim Speichern der Ergebnisse: %s", e)
 
@@ -98,18 +115,31 @@ async def main_async():
     if not headers:
         logging.error("Abbruch  Kein gültiger Header (Token) erhalten.")
         return
-    users = load_and_filter_users()
+    users = filter_shard(load_and_filter_users(), lambda u: u["userId"])
+    replay = get_module_args().replay
+    if replay:
+        users = select_failed(users, shard_path(RESULT_FILE), lambda u: u["userId"])
+    users = reject_invalid_references(users, USER_REFERENCES, REJECTS_FILE, lambda u: u.get("userId", ""))
+    store = get_state_store()
+    users, hashes = store.filter_changed("serviceuser", users, lambda u: u["userId"])
     if not users:
         logging.warning("Keine gültigen Benutzer gefunden.")
         return
     results = []
+    journal = get_journal("create_serviceusers", "serviceuser")
+    journal.progress.start(len(users))
     # Nutze die zentrale Konstante auch im TCPConnector
     connector = aiohttp.TCPConnector(limit=MAX_PARALLEL_REQUESTS)
     async with aiohttp.ClientSession(connector=connector) as session:
         tasks = [modify_user(session, user, headers) for user in users]
         for future in asyncio.as_completed(tasks):
             result = await future
+            journal.write_result(result)
+            store.record_result("serviceuser", result, hashes)
             results.append(result)
+    store.flush()
+    if replay:
+        results = merge_with_previous(shard_path(RESULT_FILE), results)
     save_results(results)
 
 def main():
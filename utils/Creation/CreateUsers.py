@@ -1,11 +1,20 @@
 import asyncio
 import aiohttp
 import pandas as pd
-import json
 import logging
 from pathlib import Path
 from collections import defaultdict
-from utils.auth.Authentification import get_auth_headers, get_base_url
+from utils.auth.Authentification import get_auth_headers, api_url
+from utils.Validation.ReferenceIndex import reject_invalid_references, USER_REFERENCES
+from utils.Runtime.Journal import get_journal
+from utils.Runtime.Sharding import filter_shard, shard_path
+from utils.Runtime.StateStore import get_state_store
+from utils.Runtime.Replay import select_failed, merge_with_previous
+from utils.Runtime.Arguments import get_module_args
+from utils.Runtime.Transport import request_async
+from utils.Runtime.CircuitBreaker import CircuitOpenError, PAUSED_STATUS
+from utils.Runtime.LogQueue import setup_logging
+from utils.Runtime.InputCache import read_json
 
 # Zentrale Steuerung für parallele Requests
 MAX_PARALLEL_REQUESTS = 5
@@ -14,11 +23,27 @@ DATA_DIR = Path("_data")
 JSON_FILE = DATA_DIR / "OBT_Export_Create_Users.json"
 RESULT_FILE = DATA_DIR / "results/result_create_users.xlsx"
 DUPLICATES_FILE = DATA_DIR / "results/duplicates_create_users.xlsx"
+REJECTS_FILE = DATA_DIR / "results/rejects_create_users.xlsx"
 
-API_URL = f"{get_base_url()}/api/provisioning-users/v1/users"
+API_PATH = "/api/provisioning-users/v1/users"
 EXCLUDE_ID = "00000000-0000-0000-0000-000000000000"
 
-logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+setup_logging()
+
+def prepare_user(user):
+    """
+    Bereinigt einen einzelnen Benutzer wie load_and_filter_users (Klammern in den IDs,
+    Kategorienliste), z.B. für Aufträge aus intake.py. Doppelte Namen werden nicht geprüft.
+    """
+    user = dict(user)
+    for field in ("userId", "defaultUserCategory"):
+        if isinstance(user.get(field), str):
+            user[field] = user[field].replace("{", "").replace("}", "")
+    categories = user.get("userCategories")
+    user["userCategories"] = (
+        [cat.strip() for cat in categories[0].split(",")] if isinstance(categories, list) and len(categories) > 0 else []
+    )
+    return user
 
 def load_and_filter_users():
     """
@@ -26,8 +51,7 @@ def load_and_filter_users():
     macht doppelte Namen eindeutig und gibt eine Liste von Dictionaries zurück.
     """
     try:
-        with open(JSON_FILE, "r", encoding="utf-8") as file:
-            data = json.load(file)
+        data = read_json(JSON_FILE)
         if isinstance(data, dict):
             data = [data]
         df = pd.DataFrame(data)
@@ -39,8 +63,8 @@ def load_and_filter_users():
         df = df[df["userId"] != EXCLUDE_ID]
         duplicated_names = df[df.duplicated(subset="name", keep=False)]
         if not duplicated_names.empty:
-            duplicated_names.to_excel(DUPLICATES_FILE, index=False)
-            logging.info("Duplikate gespeichert in '%s'", DUPLICATES_FILE)
+            duplicated_names.to_excel(shard_path(DUPLICATES_FILE), index=False)
+            logging.info("Duplikate gespeichert in '%s'", shard_path(DUPLICATES_FILE))
         name_counter = defaultdict(int)
         new_names = []
         for name in df["name"]:
@@ -50,7 +74,9 @@ def load_and_filter_users():
             name_counter[name] += 1
         df["name"] = new_names
         df = df.drop_duplicates(subset="userId")
-        return df.to_dict(orient="records")
+        # Über ein Objekt-Array statt df.to_dict: gleiche Python-Werte, ohne pro Zelle zu konvertieren
+        columns = list(df.columns)
+        return [dict(zip(columns, values)) for values in df.to_numpy(dtype=object).tolist()]
     except Exception as e:
         logging.error("Fehler beim Lesen der JSON-Datei: %s", e)
         return []
@@ -64,15 +90,23 @@ async def create_user(session, user_data, headers):
     """
     async with semaphore:
         try:
-            async with session.post(API_URL, headers=headers, json=user_data) as response:
-                resp_text = await response.text()
-                return {
-                    "Benutzer-ID": user_data.get("userId", ""),
-                    "Benutzername": user_data.get("name", ""),
-                    "Status": "Erfolgreich" if response.status in [200, 201] else "Fehlgeschlagen",
-                    "Status-Code": response.status,
-                    "Nachricht": "Benutzer erfolgreich erstellt." if response.status in [200, 201] else resp_text
-                }
+            status, resp_text = await request_async(session, "POST", api_url(API_PATH), "users", headers=headers, json=user_data)
+            return {
+                "Benutzer-ID": user_data.get("userId", ""),
+                "Benutzername": user_data.get("name", ""),
+                "Status": "Erfolgreich" if status in [200, 201] else "Fehlgeschlagen",
+                "Status-Code": status,
+                "Nachricht": "Benutzer erfolgreich erstellt." if status in [200, 201] else resp_text
+            }
+        except CircuitOpenError as e:
+            # Server dauerhaft nicht erreichbar: Datensatz für ein späteres Replay vormerken
+            return {
+                "Benutzer-ID": user_data.get("userId", ""),
+                "Benutzername": user_data.get("name", ""),
+                "Status": PAUSED_STATUS,
+                "Status-Code": PAUSED_STATUS,
+                "Nachricht": str(e)
+            }
         except Exception as e:
             return {
                 "Benutzer-ID": user_data.get("userId", ""),
@@ -88,8 +122,8 @@ def save_results(results):
     """
     try:
         df = pd.DataFrame(results)
-        df.to_excel(RESULT_FILE, index=False)
-        logging.info("Ergebnisse gespeichert in '%s'", RESULT_FILE)
+        df.to_excel(shard_path(RESULT_FILE), index=False)
+        logging.info("Ergebnisse gespeichert in '%s'", shard_path(RESULT_FILE))
     except Exception as e:
         logging.error("Fehler beim Speichern der Ergebnisse: %s", e)
 
@@ -102,17 +136,33 @@ async def main_async():
     if not headers:
         logging.error("Abbruch: Kein gültiger Header (Token) erhalten.")
         return
-    users = load_and_filter_users()
+    users = filter_shard(load_and_filter_users(), lambda u: u["userId"])
+    replay = get_module_args().replay
+    if replay:
+        # Nur die im letzten Lauf fehlgeschlagenen Benutzer erneut senden
+        users = select_failed(users, shard_path(RESULT_FILE), lambda u: u["userId"])
+    # Benutzer mit unbekannten Kategorien gar nicht erst senden
+    users = reject_invalid_references(users, USER_REFERENCES, REJECTS_FILE, lambda u: u.get("userId", ""))
+    # Seit der letzten erfolgreichen Synchronisation unveränderte Benutzer überspringen
+    store = get_state_store()
+    users, hashes = store.filter_changed("user", users, lambda u: u["userId"])
     if not users:
         logging.warning("Keine gültigen Benutzer gefunden.")
         return
     results = []
+    journal = get_journal("create_users", "user")
+    journal.progress.start(len(users))
     connector = aiohttp.TCPConnector(limit=MAX_PARALLEL_REQUESTS)
     async with aiohttp.ClientSession(connector=connector) as session:
         tasks = [create_user(session, user, headers) for user in users]
         for future in asyncio.as_completed(tasks):
             result = await future
+            journal.write_result(result)
+            store.record_result("user", result, hashes)
             results.append(result)
+    store.flush()
+    if replay:
+        results = merge_with_previous(shard_path(RESULT_FILE), results)
     save_results(results)
 
 def main():
@@ -0,0 +1,60 @@
+import hashlib
+import json
+import logging
+import numpy as np
+import pandas as pd
+from utils.Runtime.StateStore import VOLATILE_FIELDS
+
+# Erste Datenzeile im Excel (Zeile 1 enthält die Spaltennamen)
+FIRST_EXCEL_ROW = 2
+
+def _canonical(value, ignore):
+    if isinstance(value, dict):
+        return {key: _canonical(item, ignore) for key, item in value.items() if key not in ignore}
+    if isinstance(value, list):
+        items = [_canonical(item, ignore) for item in value]
+        return sorted(items, key=lambda item: json.dumps(item, sort_keys=True, ensure_ascii=False, default=str))
+    return value
+
+def canonical_policy(policy, ignore=VOLATILE_FIELDS):
+    """
+    Kanonische Textform einer Policy für den Vergleich: ohne volatile Felder (mutationDate),
+    Schlüssel und Listen sortiert.
+    """
+    return json.dumps(_canonical(policy, ignore), sort_keys=True, ensure_ascii=False, default=str)
+
+def deduplicate_policies(policies, mapping_file=None, label=None):
+    """
+    Fasst Policies mit gleichem Inhalt zusammen. Liefert die Positionen der zu sendenden
+    Policies (jeweils die erste Zeile einer Gruppe, in der ursprünglichen Reihenfolge).
+    Gibt es Duplikate, schreibt die Zuordnung Excel-Zeile → gesendete Zeile nach mapping_file.
+    """
+    if not policies:
+        return []
+    keys = pd.Series([canonical_policy(policy) for policy in policies])
+    codes, uniques = pd.factorize(keys)
+    positions = np.arange(len(policies))
+    first = pd.Series(positions).groupby(codes).transform("min").to_numpy()
+    kept = positions[first == positions].tolist()
+    folded = len(policies) - len(kept)
+    if not folded:
+        return kept
+    group_sizes = np.bincount(codes)
+    in_group = group_sizes[codes] > 1
+    hashes = np.array([hashlib.sha1(key.encode("utf-8")).hexdigest()[:16] for key in uniques])
+    mapping = pd.DataFrame({
+        "Excel-Zeile": positions[in_group] + FIRST_EXCEL_ROW,
+        "Policy": [label(policies[pos]) if label else "" for pos in positions[in_group]],
+        "Inhalts-Hash": hashes[codes[in_group]],
+        "Gesendet mit Zeile": first[in_group] + FIRST_EXCEL_ROW,
+        "Zusammengefasst": first[in_group] != positions[in_group],
+    })
+    logging.info("%d von %d Policy-Zeilen haben denselben Inhalt wie eine frühere Zeile und werden nicht "
+                 "separat gesendet.", folded, len(policies))
+    if mapping_file:
+        try:
+            mapping.to_excel(mapping_file, index=False)
+            logging.info("Zuordnung der zusammengefassten Zeilen gespeichert in '%s'", mapping_file)
+        except Exception as e:
+            logging.error("Fehler beim Speichern der Zuordnung: %s", e)
+    return kept
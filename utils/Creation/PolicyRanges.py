@@ -0,0 +1,41 @@
+import os
+
+# Zusammenhängende Nummern als "von-bis" senden (z.B. "700-799"); nur aktivieren,
+# wenn der Server dieses Format für das range-Feld akzeptiert
+COMPACT_RANGES = os.environ.get("MIGRATION_COMPACT_RANGES") == "1"
+# Bereichsnummern sortiert und ohne Duplikate senden; sonst bleibt die Reihenfolge des Exports.
+# Das Zusammenfassen zu "von-bis" setzt die sortierte Form voraus
+CANONICAL_RANGES = COMPACT_RANGES or os.environ.get("MIGRATION_CANONICAL_RANGES") == "1"
+
+def _sort_key(value):
+    # Numerische Einträge aufsteigend, alles andere danach in Textreihenfolge
+    return (0, int(value), "") if value.isdigit() else (1, 0, value)
+
+def canonical_range(items, canonical=CANONICAL_RANGES, compact=COMPACT_RANGES):
+    """
+    Liefert den kommaseparierten String für das range-Feld, Leerzeichen und leere Einträge entfernt.
+    Mit canonical=True sortiert und ohne Duplikate, sonst in der Reihenfolge der Eingabe.
+    Mit compact=True werden zusätzlich lückenlose Folgen zu "von-bis" zusammengefasst.
+    """
+    values = [str(item).strip() for item in items if str(item).strip()]
+    if not canonical and not compact:
+        return ",".join(values)
+    values = sorted(set(values), key=_sort_key)
+    if not compact:
+        return ",".join(values)
+    parts = []
+    start = end = None
+    for value in values:
+        if value.isdigit() and end is not None and int(value) == end + 1:
+            end = int(value)
+            continue
+        if start is not None:
+            parts.append(str(start) if start == end else f"{start}-{end}")
+            start = end = None
+        if value.isdigit():
+            start = end = int(value)
+        else:
+            parts.append(value)
+    if start is not None:
+        parts.append(str(start) if start == end else f"{start}-{end}")
+    return ",".join(parts)
@@ -0,0 +1,282 @@
+import asyncio
+import aiohttp
+import pandas as pd
+import logging
+from pathlib import Path
+from utils.auth.Authentification import get_auth_headers, api_url
+from utils.Validation.ReferenceIndex import find_invalid_references, write_rejects, USER_REFERENCES
+from utils.Runtime.Journal import get_journal
+from utils.Runtime.Sharding import filter_shard, shard_path
+from utils.Runtime.StateStore import get_state_store
+from utils.Runtime.Replay import select_failed, merge_with_previous
+from utils.Runtime.Arguments import get_module_args
+from utils.Runtime.Transport import request_async
+from utils.Runtime.CircuitBreaker import CircuitOpenError, PAUSED_STATUS
+from utils.Runtime.LogQueue import setup_logging
+from utils.Runtime.Progress import get_progress
+from utils.Creation.CreateUsers import load_and_filter_users
+from utils.Modification.ModifyPassword import encode_password, load_password_updates
+from utils.Modification.ModifyUsers import (
+    load_and_prepare_users, remove_empty_values, apply_application_limits, plan_application_limits,
+    limited_payload, over_limit_records
+)
+
+# Anzahl Benutzer, deren Kette (Erstellen → Passwort → Ändern) gleichzeitig läuft
+MAX_PARALLEL_USERS = 5
+
+DATA_DIR = Path("_data")
+RESULT_FILE = DATA_DIR / "results/result_provision_users.xlsx"
+OVER_LIMIT_FILE = DATA_DIR / "results/users_over_limit.xlsx"
+REJECTS_FILE = DATA_DIR / "results/rejects_provision_users.xlsx"
+API_PATH = "/api/provisioning-users/v1/users"
+
+# Reihenfolge der Stufen pro Benutzer und zugehöriger Eintrag im Benutzerauftrag
+STAGES = ["Erstellen", "Passwort", "Ändern"]
+STAGE_INPUTS = {"Erstellen": "create", "Passwort": "password", "Ändern": "modify"}
+# Objektart pro Stufe in der Zustandsdatenbank (identisch zu den Einzelmodulen)
+STAGE_ENTITIES = {"Erstellen": "user", "Passwort": "user_password", "Ändern": "user_modify"}
+
+setup_logging()
+
+def join_user_inputs():
+    """
+    Lädt die drei Eingaben (Create-JSON, Passwort-Excel, Modify-JSON inkl. Mandanten)
+    und verbindet sie über die userId zu einem Auftrag pro Benutzer.
+    Fehlt eine Eingabe für einen Benutzer, wird die entsprechende Stufe übersprungen.
+    """
+    create_users = {u["userId"]: u for u in load_and_filter_users()}
+    try:
+        passwords = load_password_updates()
+    except Exception as e:
+        logging.error("Fehler beim Laden der Passwort-Datei: %s", e)
+        passwords = {}
+    try:
+        modify_users = {u["userId"]: u for u in load_and_prepare_users()}
+    except Exception as e:
+        logging.error("Fehler beim Laden der Modify-Daten: %s", e)
+        modify_users = {}
+    # Applikations-Slots über den ganzen Export vergeben (vor filter_shard), wie in ModifyUsers
+    limited = plan_application_limits(modify_users.values())
+    # Ein Benutzer mit ungültigen Referenzen in Create- oder Modify-Daten wird komplett verworfen
+    records = list(create_users.values()) + list(modify_users.values())
+    rejected = write_rejects(records, find_invalid_references(records, USER_REFERENCES),
+                             REJECTS_FILE, lambda u: u.get("userId", ""))
+    rejected_ids = {records[pos]["userId"] for pos in rejected}
+    jobs = []
+    # Reihenfolge: zuerst die zu erstellenden Benutzer, danach reine Änderungen
+    user_ids = list(dict.fromkeys(list(create_users) + list(passwords) + list(modify_users)))
+    for uid in user_ids:
+        if uid in rejected_ids:
+            continue
+        jobs.append({
+            "userId": uid,
+            "create": create_users.get(uid),
+            "password": passwords.get(uid),
+            "modify": modify_users.get(uid),
+            "access": limited.get(uid),
+        })
+    return jobs
+
+def stage_payload(stage, job):
+    """
+    Liefert die Payload einer Stufe so, wie sie auch die Einzelmodule hashen.
+    """
+    if stage == "Erstellen":
+        return job["create"]
+    if stage == "Passwort":
+        return {"userId": job["userId"], "password": job["password"]}
+    if job.get("access") is not None:
+        return limited_payload(job["modify"], {job["userId"]: job["access"]})
+    return remove_empty_values(job["modify"])
+
+def skip_unchanged_stages(jobs):
+    """
+    Entfernt pro Stufe die Eingaben, die seit der letzten erfolgreichen Synchronisation
+    unverändert sind, und merkt sich die Hashes der übrigen. Benutzer ohne verbleibende
+    Stufe werden nicht mehr verarbeitet.
+    """
+    store = get_state_store()
+    for stage in STAGES:
+        candidates = [job for job in jobs if job[STAGE_INPUTS[stage]]]
+        changed, hashes = store.filter_changed(STAGE_ENTITIES[stage], candidates, lambda job: job["userId"],
+                                               payload=lambda job: stage_payload(stage, job))
+        changed_ids = {job["userId"] for job in changed}
+        for job in candidates:
+            if job["userId"] in changed_ids:
+                job.setdefault("hashes", {})[stage] = hashes[str(job["userId"])]
+            else:
+                job[STAGE_INPUTS[stage]] = None
+    return [job for job in jobs if any(job[STAGE_INPUTS[stage]] for stage in STAGES)]
+
+def build_stage_request(stage, job, headers):
+    """
+    Baut den Request einer Stufe als (Methode, URL, Endpunkt-Klasse, Header, Request-Argumente, Erfolgscodes).
+    Liefert None, wenn für den Benutzer keine Eingabe zu dieser Stufe vorliegt.
+    """
+    user_id = job["userId"]
+    if not job[STAGE_INPUTS[stage]]:
+        return None
+    if stage == "Erstellen":
+        return "POST", api_url(API_PATH), "users", headers, {"json": job["create"]}, [200, 201]
+    if stage == "Passwort":
+        password_headers = dict(headers, **{"Content-Type": "text/plain"})
+        return ("PUT", f"{api_url(API_PATH)}/{user_id}/password", "passwords", password_headers,
+                {"data": encode_password(job["password"])}, [200])
+    if "access" in job:
+        user_data = stage_payload(stage, job)
+    else:
+        # Einzelaufträge (intake.py) kennen den Export nicht: die Slots zählt der laufende Prozess
+        user_data = apply_application_limits(remove_empty_values(job["modify"]))
+    return "PUT", f"{api_url(API_PATH)}/{user_id}", "users", headers, {"json": user_data}, [200, 204]
+
+def result_row(job):
+    """
+    Leere Ergebniszeile eines Benutzers: alle Stufen übersprungen, Status erfolgreich.
+    """
+    source = job["modify"] or job["create"] or {}
+    row = {"Benutzer-ID": job["userId"], "Benutzername": source.get("name", "")}
+    row.update({stage: "Übersprungen" for stage in STAGES})
+    row.update({"Status": "Erfolgreich", "Fehlgeschlagene Stufe": "", "Status-Code": "", "Nachricht": ""})
+    return row
+
+def error_row(job, error):
+    """
+    Ergebniszeile eines Benutzers, dessen Kette mit einem unerwarteten Fehler abgebrochen ist
+    (z.B. beim Schreiben in die Zustandsdatenbank); er erscheint so im Ergebnis und beim Replay.
+    """
+    row = result_row(job)
+    for stage in STAGES:
+        if job[STAGE_INPUTS[stage]]:
+            row[stage] = "Nicht ausgeführt"
+    row.update({"Status": "Fehlgeschlagen", "Status-Code": "Interner Fehler", "Nachricht": str(error)})
+    return row
+
+async def provision_user(session, job, headers):
+    """
+    Führt für einen Benutzer nacheinander Erstellen, Passwort setzen und Ändern aus.
+    Schlägt eine Stufe fehl, werden die folgenden Stufen nicht mehr ausgeführt.
+    Gibt eine Ergebniszeile mit dem Status jeder Stufe zurück.
+    """
+    row = result_row(job)
+    failed = False
+    for stage in STAGES:
+        if failed:
+            # Nachfolgende Stufen bauen auf der fehlgeschlagenen auf und werden nicht gesendet
+            if job[STAGE_INPUTS[stage]]:
+                row[stage] = "Nicht ausgeführt"
+            continue
+        outcome = "Fehlgeschlagen"
+        try:
+            request = build_stage_request(stage, job, headers)
+        except Exception as e:
+            # Payload lässt sich nicht aufbereiten: Stufe fehlgeschlagen, ohne Request
+            logging.error("Fehler beim Aufbereiten der Stufe %s für %s: %s", stage, job["userId"], e)
+            status, text = "Interner Fehler", str(e)
+        else:
+            if request is None:
+                continue
+            method, url, endpoint, stage_headers, kwargs, ok_codes = request
+            try:
+                status, text = await request_async(session, method, url, endpoint, headers=stage_headers, **kwargs)
+                if status in ok_codes:
+                    outcome = "Erfolgreich"
+            except CircuitOpenError as e:
+                # Server dauerhaft nicht erreichbar: Benutzer ab dieser Stufe für ein Replay vormerken
+                status, text, outcome = PAUSED_STATUS, str(e), PAUSED_STATUS
+            except Exception as e:
+                status, text = "Netzwerkfehler", str(e)
+        get_state_store().record(STAGE_ENTITIES[stage], job["userId"], job["hashes"][stage], outcome)
+        if outcome == "Erfolgreich":
+            row[stage] = "Erfolgreich"
+            row["Status-Code"] = status
+            continue
+        failed = True
+        row.update({
+            stage: outcome,
+            "Status": outcome,
+            "Fehlgeschlagene Stufe": stage,
+            "Status-Code": status,
+            "Nachricht": text,
+        })
+    return row
+
+async def worker(session, queue, headers, results):
+    """
+    Arbeitet Benutzeraufträge aus der Queue ab; jeder Benutzer läuft vollständig in einem Worker.
+    """
+    journal = get_journal("provision_users", "user")
+    while True:
+        job = await queue.get()
+        try:
+            try:
+                result = await provision_user(session, job, headers)
+            except Exception as e:
+                # Ein Fehler bei einem Benutzer darf den Worker nicht beenden, sonst wartet queue.join() ewig
+                logging.error("Fehler bei der Verarbeitung von %s: %s", job["userId"], e)
+                result = error_row(job, e)
+            failed_stage = result["Fehlgeschlagene Stufe"]
+            # Server-ID, sobald der Benutzer in diesem Lauf angelegt wurde, auch wenn eine spätere
+            # Stufe fehlschlug: rollback.py löscht ihn dann trotzdem
+            created = result["Erstellen"] == "Erfolgreich"
+            journal.write(result["Benutzer-ID"], result["Status"], result["Status-Code"],
+                          f"{failed_stage}: {result['Nachricht']}" if failed_stage else "",
+                          server_id=result["Benutzer-ID"] if created else "")
+            results.append(result)
+        finally:
+            queue.task_done()
+
+def save_results(results, filepath):
+    """
+    Speichert Ergebnisse als Excel-Datei.
+    """
+    try:
+        pd.DataFrame(results).to_excel(filepath, index=False)
+        logging.info("Ergebnisse gespeichert in '%s'", filepath)
+    except Exception as e:
+        logging.error("Fehler beim Speichern der Ergebnisse: %s", e)
+
+async def main_async():
+    """
+    Authentifiziert, verbindet alle Benutzereingaben über die userId und
+    führt die Ketten unabhängiger Benutzer parallel über eine gemeinsame Session aus.
+    """
+    headers = get_auth_headers()
+    if not headers:
+        logging.error("Abbruch: Kein gültiger Header (Token) erhalten.")
+        return
+    jobs = filter_shard(join_user_inputs(), lambda job: job["userId"])
+    replay = get_module_args().replay
+    if replay:
+        # Nur die im letzten Lauf fehlgeschlagenen Benutzer erneut durch die Kette schicken
+        jobs = select_failed(jobs, shard_path(RESULT_FILE), lambda job: job["userId"])
+    jobs = skip_unchanged_stages(jobs)
+    if not jobs:
+        logging.warning("Keine gültigen Benutzer gefunden.")
+        return
+    logging.info("Starte kombinierte Verarbeitung von %d Benutzern...", len(jobs))
+    get_progress("provision_users").start(len(jobs))
+    queue = asyncio.Queue()
+    for job in jobs:
+        queue.put_nowait(job)
+    results = []
+    connector = aiohttp.TCPConnector(limit=MAX_PARALLEL_USERS)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        workers = [asyncio.create_task(worker(session, queue, headers, results)) for _ in range(MAX_PARALLEL_USERS)]
+        await queue.join()
+        for task in workers:
+            task.cancel()
+    get_state_store().flush()
+    if replay:
+        results = merge_with_previous(shard_path(RESULT_FILE), results)
+    save_results(results, shard_path(RESULT_FILE))
+    if over_limit_records:
+        save_results(over_limit_records, shard_path(OVER_LIMIT_FILE))
+
+def main():
+    """
+    Startet das asynchrone Hauptprogramm.
+    """
+    asyncio.run(main_async())
+
+if __name__ == "__main__":
+    main()
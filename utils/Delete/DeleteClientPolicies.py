@@ -1,49 +1,69 @@
-import requests
-import pandas as pd
 import logging
 from pathlib import Path
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from utils.auth.Authentification import get_auth_headers, get_base_url
+from concurrent.futures import ThreadPoolExecutor, wait
+from utils.auth.Authentification import get_auth_headers, api_url
+from utils.Runtime.Journal import get_journal
+from utils.Runtime.StateStore import get_state_store
+from utils.Runtime.Transport import request, TransportError
+from utils.Runtime.CircuitBreaker import CircuitOpenError, PAUSED_STATUS
+from utils.Runtime.Replay import select_failed_from_journal
+from utils.Runtime.Arguments import get_module_args
+from utils.Runtime.Sharding import filter_shard
+from utils.Runtime.LogQueue import setup_logging
+from utils.Runtime.Progress import get_progress
+from utils.Runtime.InputCache import stream_excel_column
 
 # Definiert das Arbeitsverzeichnis und die relevanten Dateipfade
 DATA_DIR = Path("_data")
 EXCEL_FILE = DATA_DIR / "DeleteClientPolicies.xlsx"
-API_URL = f"{get_base_url()}/api/provisioning-users/v1/policies/mandants"
+API_PATH = "/api/provisioning-users/v1/policies/mandants"
 
 # Initialisiert das Logging für die Konsolenausgabe
-logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+setup_logging()
 
 def load_ClientPolicies():
-    # Lädt die Liste der zu löschenden Client-Policy-UIDs aus der Excel-Datei
+    # Lädt die zu löschenden Client-Policy-UIDs blockweise aus der Excel-Datei, damit das Löschen
+    # schon mit dem ersten Block beginnt
     try:
-        ClientPolicies_df = pd.read_excel(EXCEL_FILE)
-        if "UID" not in ClientPolicies_df.columns:
-            logging.error("Die Spalte 'UID' wurde in der Datei nicht gefunden.")
-            return []
-        # Gibt eine Liste aller gültigen UIDs zurück
-        return ClientPolicies_df["UID"].dropna().astype(str).tolist()
+        yield from stream_excel_column(EXCEL_FILE, "UID")
+    except KeyError:
+        logging.error("Die Spalte 'UID' wurde in der Datei nicht gefunden.")
     except Exception as e:
         logging.error("Fehler beim Laden der Excel-Datei: %s", e)
-        return []
 
 def delete_ClientPolicy(uid, headers):
     # Löscht eine einzelne Client-Policy anhand der UID über die API
+    journal = get_journal("delete_clientpolicies", "mandant_policy")
     try:
-        response = requests.delete(f"{API_URL}/{uid}", headers=headers)
+        response = request("DELETE", f"{api_url(API_PATH)}/{uid}", "mandant_policies", headers=headers)
         if response.status_code in [200, 204]:
-            logging.info("✅ UID '%s' erfolgreich gelöscht.", uid)
+            logging.debug("✅ UID '%s' erfolgreich gelöscht.", uid)
+            journal.write(uid, "Erfolgreich", response.status_code, server_id=uid)
+            # Gelöschte Objekte werden bei der nächsten Erstellung wieder gesendet
+            get_state_store().mark_deleted(["mandant_policy"], uid)
         else:
             logging.error("❌ Fehler bei UID '%s': %s - %s", uid, response.status_code, response.text)
-    except requests.RequestException as e:
+            journal.write(uid, "Fehlgeschlagen", response.status_code, response.text)
+    except CircuitOpenError as e:
+        logging.error("⏸ UID '%s' nicht gelöscht: %s", uid, e)
+        journal.write(uid, PAUSED_STATUS, PAUSED_STATUS, str(e))
+    except TransportError as e:
         logging.error("❌ Netzwerkfehler bei UID '%s': %s", uid, e)
+        journal.write(uid, "Fehlgeschlagen", "Netzwerkfehler", str(e))
 
-def delete_ClientPolicies_concurrently(uids, headers, max_workers=10):
-    # Löscht mehrere Client-Policies parallel mithilfe von Threads
+def delete_ClientPolicies_concurrently(uid_chunks, headers, max_workers=10):
+    # Löscht die Client-Policies parallel mithilfe von Threads, sobald ein Block UIDs gelesen ist.
+    # Ein neuer Block wird erst angenommen, wenn der vorletzte abgearbeitet ist.
+    # Fehler werden im delete_ClientPolicy geloggt; zurückgegeben wird die Anzahl UIDs.
+    count = 0
     with ThreadPoolExecutor(max_workers=max_workers) as executor:
-        futures = [executor.submit(delete_ClientPolicy, uid, headers) for uid in uids]
-        for future in as_completed(futures):
-            # Ergebnisse werden nicht benötigt, Fehler werden im delete_ClientPolicy geloggt
-            pass
+        previous = []
+        for uids in uid_chunks:
+            submitted = [executor.submit(delete_ClientPolicy, uid, headers) for uid in uids]
+            count += len(submitted)
+            wait(previous)
+            previous = submitted
+    return count
 
 def main():
     # Hauptfunktion: lädt UIDs, prüft Token und startet das parallele Löschen
@@ -52,13 +72,19 @@ def main():
         logging.error("Abbruch: Kein gültiger Token erhalten.")
         return
 
-    uids = load_ClientPolicies()
-    if not uids:
-        logging.warning("Keine UIDs zum Löschen gefunden.")
-        return
+    uid_chunks = (filter_shard(chunk, lambda uid: uid, log=False) for chunk in load_ClientPolicies())
+    if get_module_args().replay:
+        # Nur die im angegebenen Lauf fehlgeschlagenen oder pausierten UIDs erneut löschen
+        uids = [uid for chunk in uid_chunks for uid in chunk]
+        uid_chunks = [select_failed_from_journal(uids, "delete_clientpolicies", lambda uid: uid)]
 
-    logging.info("Starte paralleles Löschen von %d Policies...", len(uids))
-    delete_ClientPolicies_concurrently(uids, headers)
+    logging.info("Starte paralleles Löschen der Policies...")
+    progress = get_progress("delete_clientpolicies")
+    progress.start(None)
+    count = delete_ClientPolicies_concurrently(uid_chunks, headers)
+    progress.set_total(count)
+    if not count:
+        logging.warning("Keine UIDs zum Löschen gefunden.")
 
 if __name__ == "__main__":
     # Startpunkt des Skripts
@@ -0,0 +1,123 @@
+import argparse
+import asyncio
+import gzip
+import json
+import logging
+import random
+import uuid
+from aiohttp import web
+
+# Lokaler Ersatz für die Abacus-API zum Testen der Module ohne Zielsystem.
+# Daten werden nur im Speicher gehalten.
+DEFAULT_PORT = 8085
+API_BASE = "/api/provisioning-users/v1"
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+def create_app(error_rate=0.0, latency_ms=0):
+    """
+    Baut die aiohttp-Anwendung mit Token-, Benutzer-, Passwort-, Kategorie- und Policy-Endpunkten.
+    error_rate: Anteil der schreibenden Requests, die mit 500 beantwortet werden.
+    latency_ms: künstliche Antwortzeit pro Request.
+    """
+    store = {"users": {}, "categories": {}, "programs": {}, "mandants": {}}
+    stats = {"requests": 0, "gzip_requests": 0, "wire_bytes": 0, "body_bytes": 0}
+
+    async def read_json(request):
+        """
+        Liest den JSON-Body; gzip-komprimierte Bodies (Content-Encoding: gzip) werden entpackt.
+        """
+        body = await request.read()
+        stats["wire_bytes"] += request.content_length or len(body)
+        if request.headers.get("Content-Encoding", "").lower() == "gzip":
+            stats["gzip_requests"] += 1
+            # aiohttp entpackt den Body je nach Version bereits selbst
+            if body[:2] == b"\x1f\x8b":
+                body = gzip.decompress(body)
+        stats["body_bytes"] += len(body)
+        return json.loads(body) if body else {}
+
+    @web.middleware
+    async def simulate(request, handler):
+        stats["requests"] += 1
+        if latency_ms:
+            await asyncio.sleep(latency_ms / 1000)
+        if request.method != "GET" and request.path.startswith(API_BASE) and random.random() < error_rate:
+            return web.Response(status=500, text="Simulierter Serverfehler")
+        return await handler(request)
+
+    async def token(request):
+        return web.json_response({"access_token": "mock-token", "token_type": "Bearer", "expires_in": 3600})
+
+    def collection(kind, id_field, created_status=201):
+        async def create(request):
+            data = await read_json(request)
+            object_id = request.match_info.get("id") or data.get(id_field) or str(uuid.uuid4())
+            data[id_field] = object_id
+            store[kind][object_id] = data
+            return web.json_response(data, status=created_status)
+
+        async def list_all(request):
+            return web.json_response(list(store[kind].values()))
+
+        async def get_one(request):
+            data = store[kind].get(request.match_info["id"])
+            return web.json_response(data) if data else web.Response(status=404)
+
+        async def update(request):
+            object_id = request.match_info["id"]
+            if object_id not in store[kind]:
+                return web.Response(status=404)
+            store[kind][object_id].update(await read_json(request))
+            return web.Response(status=204)
+
+        async def delete(request):
+            return web.Response(status=204 if store[kind].pop(request.match_info["id"], None) else 404)
+
+        return create, list_all, get_one, update, delete
+
+    async def update_password(request):
+        await request.read()
+        return web.Response(status=200 if request.match_info["id"] in store["users"] else 404)
+
+    async def get_stats(request):
+        return web.json_response(stats)
+
+    # IDs aus den Exporten enthalten geschweifte Klammern, die das Standardmuster von aiohttp ausschliesst
+    id_route = "{id:[^/]+}"
+    app = web.Application(middlewares=[simulate], client_max_size=50 * 1024 ** 2)
+    app.router.add_post("/oauth/oauth2/v1/token", token)
+    app.router.add_get("/mock/stats", get_stats)
+    app.router.add_put(f"{API_BASE}/users/{id_route}/password", update_password)
+    # Service-Benutzer werden wie Benutzer abgelegt und sind über /users/{id} lesbar;
+    # die API bestätigt sie mit 200 statt 201 (so erwartet es CreateServiceUsers)
+    service_create, *_ = collection("users", "userId", created_status=200)
+    app.router.add_post(f"{API_BASE}/users/serviceusers/{id_route}", service_create)
+    for path, kind, id_field in [
+        ("users", "users", "userId"),
+        ("categories", "categories", "userCategoryId"),
+        ("policies/programs", "programs", "id"),
+        ("policies/mandants", "mandants", "id"),
+    ]:
+        create, list_all, get_one, update, delete = collection(kind, id_field)
+        app.router.add_post(f"{API_BASE}/{path}", create)
+        app.router.add_get(f"{API_BASE}/{path}", list_all)
+        app.router.add_get(f"{API_BASE}/{path}/{id_route}", get_one)
+        app.router.add_put(f"{API_BASE}/{path}/{id_route}", update)
+        app.router.add_delete(f"{API_BASE}/{path}/{id_route}", delete)
+    return app
+
+def main():
+    """
+    Startet den Mock-Server; die Basis-URL in ClientSecret.txt muss auf http://localhost:<port> zeigen.
+    """
+    parser = argparse.ArgumentParser(description="Lokaler Mock der Abacus-Benutzerverwaltung")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Anteil simulierter 500-Antworten")
+    parser.add_argument("--latency", type=float, default=0, help="Künstliche Antwortzeit in Millisekunden")
+    args = parser.parse_args()
+    logging.info("Mock-Server läuft auf http://localhost:%d", args.port)
+    web.run_app(create_app(args.error_rate, args.latency), port=args.port, print=None, access_log=None)
+
+if __name__ == "__main__":
+    main()
@@ -1,22 +1,45 @@
 import base64
+import math
 import pandas as pd
-import requests
 import logging
 from pathlib import Path
-from concurrent.futures import ThreadPoolExecutor
-from utils.auth.Authentification import get_auth_headers, get_base_url
+from concurrent.futures import ThreadPoolExecutor, wait
+from utils.auth.Authentification import get_auth_headers, api_url
+from utils.Runtime.Journal import get_journal
+from utils.Runtime.Sharding import filter_shard, shard_path
+from utils.Runtime.StateStore import get_state_store
+from utils.Runtime.Replay import select_failed, merge_with_previous
+from utils.Runtime.Arguments import get_module_args
+from utils.Runtime.Transport import request, TransportError
+from utils.Runtime.CircuitBreaker import CircuitOpenError, PAUSED_STATUS
+from utils.Runtime.LogQueue import setup_logging
+from utils.Runtime.Progress import get_progress
+from utils.Runtime.ExcelStream import stream_chunks
 
 # Verzeichnis- und Dateipfade
 DATA_DIR = Path("_data")
 EXCEL_FILE = DATA_DIR / "OBT_Export_Modify_Passwords_Users.xlsx"
 RESULT_FILE = DATA_DIR / "results/result_modify_passwords.xlsx"
-BASE_URL = f"{get_base_url()}/api/provisioning-users/v1/users"
+API_PATH = "/api/provisioning-users/v1/users"
+
+# Anzahl Threads für den parallelen Versand
+MAX_WORKERS = 5
 
 # Logging-Konfiguration für Konsolenausgaben
-logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+setup_logging()
 
 # Speichert Ergebnisse jeder Passwortänderung für die spätere Auswertung
 results = []
+# Payload-Hashes der zu sendenden Passwörter für die Zustandsdatenbank
+password_hashes = {}
+
+def add_result(result):
+    """
+    Speichert das Ergebnis einer Passwortänderung und schreibt es ins Journal des Laufs.
+    """
+    results.append(result)
+    get_journal("modify_passwords", "user_password").write_result(result)
+    get_state_store().record_result("user_password", result, password_hashes)
 
 def clean_user_id(user_id):
     """
@@ -36,13 +59,13 @@ def update_password(user_id, password, headers):
     Ergebnisse werden im globalen 'results'-Array gespeichert.
     """
     user_id = clean_user_id(user_id)
-    url = f"{BASE_URL}/{user_id}/password"
+    url = f"{api_url(API_PATH)}/{user_id}/password"
     encoded_password = encode_password(password)
 
     # Prüfe auf fehlende UserId oder Passwort
     if not user_id or not password:
         logging.warning("Ungültige Daten für UserID: %s", user_id)
-        results.append({
+        add_result({
             "Benutzer-ID": user_id,
             "Status": "Fehlgeschlagen",
             "Status-Code": "Ungültige Daten",
@@ -52,10 +75,10 @@ def update_password(user_id, password, headers):
 
     try:
         # Passwortänderung via API (PUT-Request)
-        response = requests.put(url, headers=headers, data=encoded_password, timeout=10)
+        response = request("PUT", url, "passwords", headers=headers, data=encoded_password)
         if response.status_code == 200:
-            logging.info("Passwort aktualisiert: %s", user_id)
-            results.append({
+            logging.debug("Passwort aktualisiert: %s", user_id)
+            add_result({
                 "Benutzer-ID": user_id,
                 "Status": "Erfolgreich",
                 "Status-Code": response.status_code,
@@ -63,40 +86,104 @@ def update_password(user_id, password, headers):
             })
         else:
             logging.error("Fehler %s für %s: %s", response.status_code, user_id, response.text)
-            results.append({
+            add_result({
                 "Benutzer-ID": user_id,
                 "Status": "Fehlgeschlagen",
                 "Status-Code": response.status_code,
                 "Nachricht": response.text
             })
-    except requests.RequestException as e:
+    except CircuitOpenError as e:
+        # Server dauerhaft nicht erreichbar: Datensatz für ein späteres Replay vormerken
+        add_result({
+            "Benutzer-ID": user_id,
+            "Status": PAUSED_STATUS,
+            "Status-Code": PAUSED_STATUS,
+            "Nachricht": str(e)
+        })
+    except TransportError as e:
         # Fehlerbehandlung bei Netzwerkproblemen oder Timeouts
         logging.error("Netzwerkfehler bei %s: %s", user_id, e)
-        results.append({
+        add_result({
             "Benutzer-ID": user_id,
             "Status": "Fehlgeschlagen",
             "Status-Code": "Netzwerkfehler",
             "Nachricht": str(e)
         })
 
-def process_password_updates(df, headers):
+def cell_value(value):
+    """
+    Zellwert als getrimmter String; leere Zellen (None bzw. NaN bei pandas) werden zu "",
+    damit sie beim Senden als fehlend abgelehnt und nicht als Passwort "nan" gesendet werden.
     """
-    Führt die Passwortänderung für alle Benutzer mit mehreren Threads parallel aus.
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return ""
+    return str(value).strip()
+
+def load_password_updates():
     """
-    with ThreadPoolExecutor(max_workers=5) as executor:
-        executor.map(
-            lambda row: update_password(str(row.UserId), str(row.Password).strip(), headers),
-            df.itertuples(index=False)
-        )
+    Lädt die Passwortliste aus der Excel-Datei und liefert ein Mapping UserId → Passwort.
+    Einträge ohne UserId oder Passwort werden übernommen und erst beim Senden abgelehnt.
+    Gelesen wird nur im Speicher, nie über den Eingabe-Cache (Klartext-Passwörter).
+    """
+    return {
+        password_key(row): cell_value(row.Password)
+        for chunk in stream_chunks(EXCEL_FILE, ["UserId", "Password"])
+        for row in chunk
+    }
+
+def password_key(row):
+    return clean_user_id(cell_value(row.UserId))
+
+def password_payload(row):
+    return {"userId": password_key(row), "password": cell_value(row.Password)}
+
+def password_chunks(counts):
+    """
+    Liest die Passwortliste blockweise und liefert pro Block die zu sendenden Zeilen:
+    nur der eigene Shard, ohne seit der letzten Synchronisation unveränderte Passwörter.
+    Beim Replay wird die ganze Liste gelesen, da die Auswahl über alle Zeilen erfolgt.
+    counts zählt gelesene ("read") und zu sendende ("selected") Zeilen.
+    """
+    store = get_state_store()
+    known = {} if get_module_args().full_sync else store.synced_hashes("user_password")
+    chunks = (filter_shard(chunk, password_key, log=False)
+              for chunk in stream_chunks(EXCEL_FILE, ["UserId", "Password"]))
+    if get_module_args().replay:
+        # Nur die im letzten Lauf fehlgeschlagenen Passwörter erneut senden
+        chunks = [select_failed([row for chunk in chunks for row in chunk], shard_path(RESULT_FILE), password_key)]
+    for chunk in chunks:
+        counts["read"] += len(chunk)
+        rows, hashes = store.filter_changed("user_password", chunk, password_key, payload=password_payload,
+                                            known=known, log=False)
+        password_hashes.update(hashes)
+        counts["selected"] += len(rows)
+        yield rows
+
+def process_password_updates(chunks, headers):
+    """
+    Führt die Passwortänderung mit mehreren Threads parallel aus, sobald ein Block gelesen ist.
+    Ein neuer Block wird erst angenommen, wenn der vorletzte abgearbeitet ist; so liegen nie
+    mehr als zwei Blöcke in der Warteschlange der Threads.
+    """
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        previous = []
+        for rows in chunks:
+            submitted = [executor.submit(update_password, cell_value(row.UserId), cell_value(row.Password), headers)
+                         for row in rows]
+            wait(previous)
+            previous = submitted
 
 def save_results():
     """
     Schreibt das Ergebnis aller Passwortänderungen in eine Excel-Datei.
     """
     try:
-        df = pd.DataFrame(results)
-        df.to_excel(RESULT_FILE, index=False)
-        logging.info("Ergebnisse gespeichert in '%s'", RESULT_FILE)
+        rows = results
+        if get_module_args().replay:
+            rows = merge_with_previous(shard_path(RESULT_FILE), results)
+        df = pd.DataFrame(rows)
+        df.to_excel(shard_path(RESULT_FILE), index=False)
+        logging.info("Ergebnisse gespeichert in '%s'", shard_path(RESULT_FILE))
     except Exception as e:
         logging.error("Fehler beim Speichern der Ergebnisse: %s", e)
 
@@ -109,13 +196,22 @@ def main():
         logging.error("Abbruch: Kein gültiger Token erhalten.")
         return
     headers["Content-Type"] = "text/plain"
+
+    counts = {"read": 0, "selected": 0}
+    progress = get_progress("modify_passwords")
+    progress.start(None)
     try:
-        df = pd.read_excel(EXCEL_FILE)
+        process_password_updates(password_chunks(counts), headers)
     except Exception as e:
         logging.error("Fehler beim Laden der Excel-Datei: %s", e)
-        return
-
-    process_password_updates(df, headers)
+        if not results:
+            return
+    progress.set_total(counts["selected"])
+    skipped = counts["read"] - counts["selected"]
+    if skipped:
+        logging.info("%d von %d Passwörtern unverändert seit der letzten Synchronisation, übersprungen.",
+                     skipped, counts["read"])
+    get_state_store().flush()
     save_results()
 
 if __name__ == "__main__":
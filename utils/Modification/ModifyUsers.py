@@ -1,11 +1,22 @@
 import asyncio
 import aiohttp
 import pandas as pd
-import json
 import logging
 from pathlib import Path
 from collections import defaultdict
-from utils.auth.Authentification import get_auth_headers, get_base_url
+from utils.auth.Authentification import get_auth_headers, api_url
+from utils.Validation.ReferenceIndex import reject_invalid_references, USER_REFERENCES
+from utils.Runtime.Journal import get_journal
+from utils.Runtime.Sharding import filter_shard, shard_path
+from utils.Runtime.StateStore import get_state_store
+from utils.Runtime.Replay import select_failed, merge_with_previous
+from utils.Runtime.Arguments import get_module_args
+from utils.Runtime.Transport import request_async
+from utils.Runtime.CircuitBreaker import CircuitOpenError, PAUSED_STATUS
+from utils.Runtime.LogQueue import setup_logging
+from utils.Runtime.InputCache import read_json, read_excel, preload
+from utils.Runtime.CompactRecords import CompactRecord, PackedFlags, pack_flags
+from utils.Runtime.Dispatch import dispatch_order
 
 # Definition aller relevanten Datei- und API-Pfade
 DATA_DIR = Path("_data")
@@ -14,18 +25,20 @@ CLIENTUSERCLASSES_FILE = DATA_DIR / "OBT_Export_sub_ClientUserClasses.xlsx"
 CLIENTAPPLICATIONSUPPERVISOR_FILE = DATA_DIR / "OBT_Export_sub_ClientApplicationSupervisor.xlsx"
 RESULT_FILE = DATA_DIR / "results/result_modify_users.xlsx"
 DUPLICATES_FILE = DATA_DIR / "results/duplicates_modify_users.xlsx"
+REJECTS_FILE = DATA_DIR / "results/rejects_modify_users.xlsx"
 EXCLUDE_ID = "00000000-0000-0000-0000-000000000000"
-API_URL = f"{get_base_url()}/api/provisioning-users/v1/users"
+API_PATH = "/api/provisioning-users/v1/users"
 
 # Logging-Format für einheitliche Ausgaben
-logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+setup_logging()
 
 def map_excel_to_dict(filepath, user_col, mandant_col, value_columns):
     """
     Wandelt eine Excel-Datei in ein Mapping von UserUID → Mandantenberechtigungen um.
     Nur Datensätze, bei denen mindestens eine Berechtigung aktiv ist, werden übernommen.
+    Jede Berechtigung wird mit pack_flags als Zahl (Mandant + ein Bit pro Spalte) abgelegt.
     """
-    df = pd.read_excel(filepath, dtype=str).fillna("0")
+    df = read_excel(filepath, dtype=str).fillna("0")
     result = defaultdict(list)
     for _, row in df.iterrows():
         # Entferne Klammern aus UserUID (wie sie im JSON fehlen)
@@ -34,37 +47,77 @@ def map_excel_to_dict(filepath, user_col, mandant_col, value_columns):
             mandant = int(row[mandant_col])
         except Exception:
             continue  # Zeile überspringen, wenn Mandant ungültig
-        entry = {"mandantNumber": mandant}
         # Berechtigungen als Boolean abbilden
-        for col in value_columns:
-            entry[col] = row[col] == "1"
+        flags = [row[col] == "1" for col in value_columns]
         # Nur speichern, wenn mindestens eine Berechtigung gesetzt ist
-        if any(entry[col] for col in value_columns):
-            result[uid].append(entry)
+        if any(flags):
+            result[uid].append(pack_flags(mandant, flags))
     return result
 
+def is_empty(value):
+    """
+    None, leerer String, leeres Dict (auch CompactRecord) oder leere Liste.
+    Prüft die Länge, statt mit == zu vergleichen, das kompakte Datensätze erst auspacken müsste.
+    """
+    if value is None:
+        return True
+    if isinstance(value, (str, dict, list)):
+        return not value
+    # type statt isinstance: CompactRecord ist ein Mapping, isinstance ginge über die langsame ABC-Prüfung
+    return type(value) is CompactRecord and not value
+
+def is_container(value):
+    return isinstance(value, (dict, list)) or type(value) is CompactRecord
+
 def remove_empty_values(d):
     """
     Entfernt rekursiv alle Felder mit None, leeren Strings, leeren Dicts oder Listen.
     So werden ungültige/leere Daten vor dem API-Call entfernt.
+    Kompakte Benutzer-Datensätze werden dabei wieder zu dicts.
     """
+    if type(d) is CompactRecord:
+        d = d.expand()
+    # Leere Werte sind immer falsy: is_empty nur für diese prüfen, Rekursion nur in Container
     if isinstance(d, dict):
-        return {k: remove_empty_values(v) for k, v in d.items() if v not in [None, "", {}, []]}
+        return {k: remove_empty_values(v) if is_container(v) else v for k, v in d.items() if v or not is_empty(v)}
     elif isinstance(d, list):
-        return [remove_empty_values(x) for x in d if x not in [None, "", {}, []]]
+        return [remove_empty_values(x) if is_container(x) else x for x in d if x or not is_empty(x)]
     return d
 
+# Spaltennamen aus Excel für das Mapping
+CLASS_COLUMNS = [
+    "divisions", "accounts", "costCentres", "employeePayrollAccounting", "employeeHrms",
+    "releasePayrollHr", "swiss21Salary", "saveMandant", "restoreMandant", "abaAuditAdmin",
+    "abaAuditView", "abaClockMonitor", "abaTrak"
+]
+SUPERVISOR_COLUMNS = [
+    "fibu", "debi", "kred", "lohn", "adre", "orde", "hrms", "inve",
+    "proj", "epay", "shop", "upps", "sccm", "info", "immo", "norm"
+]
+
+def build_user_record(user, user_classes, user_sup):
+    """
+    Hängt die Mandantenberechtigungen an einen User an und speichert ihn kompakt.
+    Leere Felder werden wie beim Senden (remove_empty_values) gleich hier entfernt.
+    """
+    uid = user["userId"]
+    user["userClassMandants"] = PackedFlags("mandantNumber", CLASS_COLUMNS, user_classes.get(uid, ())) or []
+    user["userAppSupervisorMandants"] = PackedFlags("mandantNumber", SUPERVISOR_COLUMNS, user_sup.get(uid, ())) or []
+    return CompactRecord(remove_empty_values(user))
+
 def load_and_prepare_users():
     """
     Lädt das User-JSON ein, bereinigt Userdaten, entfernt Duplikate,
-    mapped User- und Supervisor-Mandanten aus Excel und liefert die User als Liste von Dicts zurück.
+    mapped User- und Supervisor-Mandanten aus Excel und liefert die User als Liste von
+    CompactRecords zurück (lesbar wie dicts, remove_empty_values liefert die Payload).
     """
-    with open(JSON_FILE, "r", encoding="utf-8") as f:
-        users = json.load(f)
+    users = read_json(JSON_FILE)
     # Falls nur ein Userobjekt (statt Liste) im JSON steht, Liste daraus machen
     if isinstance(users, dict):
         users = [users]
     df = pd.DataFrame(users)
+    # Das eingelesene JSON wird ab hier nicht mehr gebraucht
+    del users
     # Entferne Klammern aus UserId und DefaultUserCategory
     df["userId"] = df["userId"].str.replace("{", "").str.replace("}", "", regex=False)
     df["defaultUserCategory"] = df["defaultUserCategory"].str.replace("{", "").str.replace("}", "", regex=False)
@@ -81,40 +134,33 @@ def load_and_prepare_users():
         name_counter[name] += 1
     df["name"] = new_names
     df = df.drop_duplicates(subset="userId")
-    users = df.to_dict(orient="records")
-    # Spaltennamen aus Excel für das Mapping
-    class_cols = [
-        "divisions", "accounts", "costCentres", "employeePayrollAccounting", "employeeHrms",
-        "releasePayrollHr", "swiss21Salary", "saveMandant", "restoreMandant", "abaAuditAdmin",
-        "abaAuditView", "abaClockMonitor", "abaTrak"
-    ]
-    sup_cols = [
-        "fibu", "debi", "kred", "lohn", "adre", "orde", "hrms", "inve",
-        "proj", "epay", "shop", "upps", "sccm", "info", "immo", "norm"
-    ]
-    # Excel-Mappings für User-Klassen und App-Supervisor
-    user_classes = map_excel_to_dict(CLIENTUSERCLASSES_FILE, "UserUID", "mandantNumber", class_cols)
-    user_sup = map_excel_to_dict(CLIENTAPPLICATIONSUPPERVISOR_FILE, "UserUID", "Client", sup_cols)
-    # Je User: Arrays anhängen, ggf. leer wenn kein Mapping
-    for user in users:
-        uid = user["userId"]
-        user["userClassMandants"] = [m for m in user_classes[uid] if m.get("mandantNumber") is not None]
-        user["userAppSupervisorMandants"] = [m for m in user_sup[uid] if m.get("mandantNumber") is not None]
-    return users
+    # Excel-Mappings für User-Klassen und App-Supervisor (beide Dateien parallel parsen, falls nicht vorgeladen)
+    preload([("excel", CLIENTUSERCLASSES_FILE, {"dtype": str}),
+             ("excel", CLIENTAPPLICATIONSUPPERVISOR_FILE, {"dtype": str})], block=True)
+    user_classes = map_excel_to_dict(CLIENTUSERCLASSES_FILE, "UserUID", "mandantNumber", CLASS_COLUMNS)
+    user_sup = map_excel_to_dict(CLIENTAPPLICATIONSUPPERVISOR_FILE, "UserUID", "Client", SUPERVISOR_COLUMNS)
+    # Zeilenweise statt über df.to_dict, damit nie alle User gleichzeitig als dict im Speicher liegen
+    columns = list(df.columns)
+    return [build_user_record(dict(zip(columns, values)), user_classes, user_sup)
+            for values in df.itertuples(index=False, name=None)]
+
+# Gleichzeitige PUT-Requests; die Reihenfolge bestimmt dispatch_order (grösste Payloads zuerst)
+MAX_PARALLEL_REQUESTS = 5
+semaphore = asyncio.Semaphore(MAX_PARALLEL_REQUESTS)
+
+# Kostenmodell für die Versandreihenfolge: geschätzte Payload-Bytes eines Users
+BASE_PAYLOAD_BYTES = 600
+MANDANT_ENTRY_BYTES = {"userClassMandants": 330, "userAppSupervisorMandants": 300}
 
-semaphore = asyncio.Semaphore(1)
 LIMIT_PER_APP = 70
 app_counters = defaultdict(int)
 over_limit_records = []
 
-async def modify_user(session, user_data, headers):
+def apply_application_limits(user_data):
     """
-    Führt das Update für einen User via API aus.
-    Prüft, ob Applikations-Limits überschritten sind, entfernt leere Werte vor dem Request,
-    gibt ein Dict mit dem Update-Status zurück.
+    Limitiert, wie oft pro Applikation "True" gesetzt werden darf.
+    Überzählige Freigaben werden auf False gesetzt und in over_limit_records vermerkt.
     """
-    user_id = user_data["userId"]
-    user_data = remove_empty_values(user_data)
     over_limit = False
     # Limitiere, wie oft pro Applikation "True" gesetzt werden darf
     if "applicationAccess" in user_data:
@@ -126,20 +172,74 @@ async def modify_user(session, user_data, headers):
                     user_data["applicationAccess"][app] = False
                     over_limit = True
     if over_limit:
-        record = {"userId": user_id, "name": user_data.get("name"), "fullName": user_data.get("fullName")}
+        record = {"userId": user_data.get("userId"), "name": user_data.get("name"), "fullName": user_data.get("fullName")}
         record.update(user_data.get("applicationAccess", {}))
         over_limit_records.append(record)
+    return user_data
+
+def plan_application_limits(users):
+    """
+    Wendet die Applikations-Limits in der Reihenfolge der Eingabe an, unabhängig von der
+    späteren Versandreihenfolge. Liefert {userId: applicationAccess} der gekürzten User.
+    Erwartet den ganzen Export (vor filter_shard): so vergibt jeder Shard dieselben Slots,
+    und LIMIT_PER_APP gilt für alle Shards zusammen statt für jeden einzeln.
+    """
+    limited = {}
+    for user in users:
+        access = user.get("applicationAccess")
+        if not access:
+            continue
+        record = apply_application_limits({"userId": user["userId"], "name": user.get("name"),
+                                           "fullName": user.get("fullName"), "applicationAccess": dict(access)})
+        if record["applicationAccess"] != access:
+            limited[user["userId"]] = record["applicationAccess"]
+    return limited
+
+def limited_payload(user, limited):
+    """
+    Payload eines Users, wie sie gesendet wird: ohne leere Werte und mit den von
+    plan_application_limits gekürzten Applikationsfreigaben. Diese Payload wird auch gehasht,
+    damit ein User erneut gesendet wird, wenn er einen Slot erhält oder verliert.
+    """
+    user_data = remove_empty_values(user)
+    if limited and user["userId"] in limited:
+        user_data["applicationAccess"] = limited[user["userId"]]
+    return user_data
+
+def payload_cost(user):
+    """
+    Geschätzte Payload-Grösse in Bytes aus der Anzahl Mandanteneinträge, ohne die Payload zu bauen.
+    """
+    return BASE_PAYLOAD_BYTES + sum(size * user.length(field) for field, size in MANDANT_ENTRY_BYTES.items())
+
+async def modify_user(session, user_data, headers, limited=None):
+    """
+    Führt das Update für einen User via API aus.
+    Entfernt leere Werte vor dem Request und übernimmt die mit plan_application_limits
+    gekürzten Applikationsfreigaben, gibt ein Dict mit dem Update-Status zurück.
+    """
+    user_id = user_data["userId"]
+    user_data = limited_payload(user_data, limited)
     async with semaphore:
         try:
-            async with session.put(f"{API_URL}/{user_id}", headers=headers, json=user_data) as response:
-                resp_text = await response.text()
-                return {
-                    "Benutzer-ID": user_id,
-                    "Benutzername": user_data.get("name", ""),
-                    "Status": "Erfolgreich" if response.status in [200, 204] else "Fehlgeschlagen",
-                    "Status-Code": response.status,
-                    "Nachricht": "Benutzer erfolgreich aktualisiert." if response.status in [200, 204] else resp_text
-                }
+            status, resp_text = await request_async(session, "PUT", f"{api_url(API_PATH)}/{user_id}", "users",
+                                                    headers=headers, json=user_data)
+            return {
+                "Benutzer-ID": user_id,
+                "Benutzername": user_data.get("name", ""),
+                "Status": "Erfolgreich" if status in [200, 204] else "Fehlgeschlagen",
+                "Status-Code": status,
+                "Nachricht": "Benutzer erfolgreich aktualisiert." if status in [200, 204] else resp_text
+            }
+        except CircuitOpenError as e:
+            # Server dauerhaft nicht erreichbar: Datensatz für ein späteres Replay vormerken
+            return {
+                "Benutzer-ID": user_id,
+                "Benutzername": user_data.get("name", ""),
+                "Status": PAUSED_STATUS,
+                "Status-Code": PAUSED_STATUS,
+                "Nachricht": str(e)
+            }
         except Exception as e:
             return {
                 "Benutzer-ID": user_id,
@@ -172,17 +272,41 @@ async def main_async():
         logging.error("Kein gültiger Header (Token) erhalten.")
         return
     users = load_and_prepare_users()
+    # Slots über den ganzen Export vergeben, bevor der Shard ausgewählt wird
+    limited = plan_application_limits(users)
+    users = filter_shard(users, lambda u: u["userId"])
+    replay = get_module_args().replay
+    if replay:
+        # Nur die im letzten Lauf fehlgeschlagenen Benutzer erneut senden
+        users = select_failed(users, shard_path(RESULT_FILE), lambda u: u["userId"])
+    # Benutzer mit unbekannten Kategorien gar nicht erst senden
+    users = reject_invalid_references(users, USER_REFERENCES, REJECTS_FILE, lambda u: u.get("userId", ""))
+    # Seit der letzten erfolgreichen Synchronisation unveränderte Benutzer überspringen; verglichen
+    # wird die gekürzte Payload, die Slots sind oben über den ganzen Export vergeben
+    store = get_state_store()
+    users, hashes = store.filter_changed("user_modify", users, lambda u: u["userId"],
+                                         payload=lambda u: limited_payload(u, limited))
     if not users:
         logging.warning("Keine gültigen Benutzer gefunden.")
         return
     results = []
+    journal = get_journal("modify_users", "user")
+    journal.progress.start(len(users))
+    users = dispatch_order(users, payload_cost)
     connector = aiohttp.TCPConnector(limit=10)
     async with aiohttp.ClientSession(connector=connector) as session:
-        tasks = [modify_user(session, user, headers) for user in users]
+        # Tasks in Versandreihenfolge anlegen; der Semaphor gibt sie in dieser Reihenfolge frei
+        tasks = [asyncio.ensure_future(modify_user(session, user, headers, limited)) for user in users]
         for future in asyncio.as_completed(tasks):
-            results.append(await future)
-    save_results(results, RESULT_FILE)
-    save_results(over_limit_records, DATA_DIR / "results/users_over_limit.xlsx")
+            result = await future
+            journal.write_result(result)
+            store.record_result("user_modify", result, hashes)
+            results.append(result)
+    store.flush()
+    if replay:
+        results = merge_with_previous(shard_path(RESULT_FILE), results)
+    save_results(results, shard_path(RESULT_FILE))
+    save_results(over_limit_records, shard_path(DATA_DIR / "results/users_over_limit.xlsx"))
 
 def main():
     """
@@ -0,0 +1,35 @@
+import argparse
+import os
+import sys
+from functools import lru_cache
+
+def build_parser():
+    """
+    Definiert die Kommandozeilen-Optionen, die jedes Modul versteht.
+    Jede Option kann auch über eine Umgebungsvariable gesetzt werden, damit
+    creation.py und deletion.py sie an ihre Subprozesse weiterreichen können.
+    """
+    parser = argparse.ArgumentParser(add_help=False)
+    parser.add_argument("--shard", default=os.environ.get("MIGRATION_SHARD"),
+                        help="Nur den Teil i von N verarbeiten, z.B. 2/4")
+    parser.add_argument("--run-id", default=os.environ.get("MIGRATION_RUN_ID"),
+                        help="Kennung des Laufs für Journal und Shard-Markierungen")
+    parser.add_argument("--full-sync", action="store_true",
+                        default=os.environ.get("MIGRATION_FULL_SYNC") == "1",
+                        help="Auch unveränderte Objekte erneut senden")
+    parser.add_argument("--replay", action="store_true",
+                        help="Nur die im letzten Result-Workbook fehlgeschlagenen Datensätze erneut senden")
+    parser.add_argument("--status-code", action="append",
+                        help="Beim Replay nur Fehler mit diesem Status-Code (mehrfach möglich)")
+    parser.add_argument("--dispatch-order", choices=["input", "longest"],
+                        default=os.environ.get("MIGRATION_DISPATCH_ORDER", "longest"),
+                        help="Versandreihenfolge: wie in der Eingabe oder grösste Payloads zuerst")
+    return parser
+
+@lru_cache(maxsize=1)
+def get_module_args():
+    """
+    Liest die Modul-Optionen einmalig aus sys.argv; unbekannte Argumente werden ignoriert.
+    """
+    args, _ = build_parser().parse_known_args(sys.argv[1:])
+    return args
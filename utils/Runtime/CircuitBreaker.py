@@ -0,0 +1,131 @@
+import asyncio
+import logging
+import os
+import threading
+import time
+from functools import lru_cache
+from utils.Runtime.Journal import get_journal
+
+# Nach so vielen Fehlern in Folge wird der Versand pausiert
+FAILURE_THRESHOLD = int(os.environ.get("MIGRATION_BREAKER_THRESHOLD", 5))
+# Wartezeit in Sekunden bis zum ersten Probe-Request, verdoppelt sich bei jedem weiteren Fehlschlag
+RESET_TIMEOUT = float(os.environ.get("MIGRATION_BREAKER_RESET", 15))
+MAX_RESET_TIMEOUT = 300
+# Nach dieser Pausendauer werden die wartenden Datensätze als "Pausiert" abgeschlossen
+MAX_PAUSE = float(os.environ.get("MIGRATION_BREAKER_MAX_PAUSE", 900))
+
+# Status für Datensätze, die wegen eines offenen Circuit Breakers nicht gesendet wurden
+PAUSED_STATUS = "Pausiert"
+
+CLOSED, OPEN, HALF_OPEN = "geschlossen", "offen", "halboffen"
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+class CircuitOpenError(Exception):
+    """
+    Der Server ist länger als MAX_PAUSE nicht erreichbar; der Datensatz wurde nicht gesendet.
+    """
+
+class CircuitBreaker:
+    """
+    Gemeinsamer Circuit Breaker für alle Threads und Coroutinen eines Prozesses.
+    Nach FAILURE_THRESHOLD Fehlern in Folge öffnet er: Neue Requests warten, statt in
+    Timeouts zu laufen. Nach der Wartezeit darf genau ein Probe-Request durch (halboffen);
+    gelingt er, schliesst der Breaker wieder, sonst verlängert sich die Pause.
+    Beginn und Ende jeder Pause werden im Journal des Laufs vermerkt.
+    """
+
+    def __init__(self, failure_threshold=FAILURE_THRESHOLD, reset_timeout=RESET_TIMEOUT, max_pause=MAX_PAUSE):
+        self.failure_threshold = failure_threshold
+        self.base_reset_timeout = reset_timeout
+        self.reset_timeout = reset_timeout
+        self.max_pause = max_pause
+        self.lock = threading.Lock()
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self.paused_since = None
+        self.probe_in_flight = False
+        self.gave_up = False
+
+    def _try_acquire(self):
+        """
+        Prüft, ob ein Request gesendet werden darf. Liefert (erlaubt, Wartezeit in Sekunden).
+        """
+        with self.lock:
+            now = time.monotonic()
+            if self.state == CLOSED:
+                return True, 0
+            if self.paused_since is not None and now - self.paused_since > self.max_pause:
+                if not self.gave_up:
+                    self.gave_up = True
+                    logging.error("Server seit %.0f s nicht erreichbar, restliche Datensätze werden als '%s' "
+                                  "vorgemerkt.", now - self.paused_since, PAUSED_STATUS)
+                    get_journal("circuit_breaker", "pause").write("", "Abgebrochen", message=f"Pause > {self.max_pause:.0f} s")
+                raise CircuitOpenError(f"Server seit {int(now - self.paused_since)} s nicht erreichbar.")
+            if self.state == OPEN and now - self.opened_at >= self.reset_timeout:
+                self.state = HALF_OPEN
+            if self.state == HALF_OPEN and not self.probe_in_flight:
+                self.probe_in_flight = True
+                return True, 0
+            remaining = self.reset_timeout - (now - self.opened_at) if self.state == OPEN else 0.5
+            return False, max(min(remaining, 1.0), 0.05)
+
+    def before_request(self):
+        """
+        Blockiert, solange der Breaker offen ist (für Thread-basierte Sender).
+        """
+        while True:
+            allowed, wait = self._try_acquire()
+            if allowed:
+                return
+            time.sleep(wait)
+
+    async def before_request_async(self):
+        """
+        Wartet, solange der Breaker offen ist, ohne die Event-Loop zu blockieren.
+        """
+        while True:
+            allowed, wait = self._try_acquire()
+            if allowed:
+                return
+            await asyncio.sleep(wait)
+
+    def record_success(self):
+        with self.lock:
+            if self.state != CLOSED:
+                paused = time.monotonic() - self.paused_since
+                logging.info("Circuit Breaker geschlossen, Versand wird nach %.0f s fortgesetzt.", paused)
+                get_journal("circuit_breaker", "pause").write("", "Fortgesetzt", message=f"Pause {paused:.0f} s")
+            self.state = CLOSED
+            self.failures = 0
+            self.probe_in_flight = False
+            self.paused_since = None
+            self.gave_up = False
+            self.reset_timeout = self.base_reset_timeout
+
+    def record_failure(self, reason=""):
+        with self.lock:
+            self.failures += 1
+            now = time.monotonic()
+            if self.state == HALF_OPEN:
+                # Probe fehlgeschlagen: Pause verlängern
+                self.state = OPEN
+                self.opened_at = now
+                self.probe_in_flight = False
+                self.reset_timeout = min(self.reset_timeout * 2, MAX_RESET_TIMEOUT)
+                logging.warning("Probe-Request fehlgeschlagen, nächster Versuch in %.0f s.", self.reset_timeout)
+            elif self.state == CLOSED and self.failures >= self.failure_threshold:
+                self.state = OPEN
+                self.opened_at = now
+                self.paused_since = now
+                logging.error("Circuit Breaker geöffnet nach %d Fehlern in Folge (%s), Versand pausiert.",
+                              self.failures, reason)
+                get_journal("circuit_breaker", "pause").write("", "Pausiert", message=str(reason))
+
+@lru_cache(maxsize=1)
+def get_circuit_breaker():
+    """
+    Liefert den gemeinsamen Circuit Breaker des Prozesses.
+    """
+    return CircuitBreaker()
@@ -0,0 +1,120 @@
+import math
+import sys
+from collections.abc import Mapping
+
+# Feldlisten, die sich alle Datensätze mit gleichem Aufbau teilen: {Feldnamen: {Feld: Position}}
+_LAYOUTS = {}
+# Ein einziges NaN-Objekt statt eines eigenen Floats pro fehlendem Wert
+NAN = float("nan")
+
+def _layout(fields):
+    fields = tuple(fields)
+    layout = _LAYOUTS.get(fields)
+    if layout is None:
+        # Nur beim ersten Datensatz eines Aufbaus internieren, danach genügt das Nachschlagen
+        fields = tuple(sys.intern(field) for field in fields)
+        layout = _LAYOUTS[fields] = {field: pos for pos, field in enumerate(fields)}
+    return layout
+
+def compact_value(value):
+    """
+    Speichert einen Wert platzsparend: Strings interniert, Listen als Tupel, Objekte als CompactRecord.
+    """
+    if isinstance(value, str):
+        return sys.intern(value)
+    if isinstance(value, dict):
+        return CompactRecord(value)
+    if isinstance(value, list):
+        return tuple(compact_value(item) for item in value)
+    if isinstance(value, float) and math.isnan(value):
+        return NAN
+    return value
+
+def expand_value(value):
+    """
+    Gegenstück zu compact_value: liefert wieder dicts und Listen, wie sie als JSON gesendet werden.
+    """
+    # type statt isinstance: CompactRecord ist ein Mapping, isinstance ginge für jeden Wert über die ABC-Prüfung
+    if type(value) in (CompactRecord, PackedFlags):
+        return value.expand()
+    if isinstance(value, tuple):
+        return [expand_value(item) for item in value]
+    return value
+
+class CompactRecord(Mapping):
+    """
+    Unveränderlicher Datensatz: die Feldnamen teilen sich alle Datensätze gleichen Aufbaus,
+    die Werte liegen in einem Tupel. Lesender Zugriff wie bei einem dict; expand()
+    baut erst beim Senden das dict für die JSON-Payload.
+    """
+    __slots__ = ("_layout", "_values")
+
+    def __init__(self, data):
+        self._layout = _layout(data)
+        self._values = tuple(compact_value(value) for value in data.values())
+
+    def __getitem__(self, field):
+        return expand_value(self._values[self._layout[field]])
+
+    def __contains__(self, field):
+        return field in self._layout
+
+    def __iter__(self):
+        return iter(self._layout)
+
+    def __len__(self):
+        return len(self._layout)
+
+    def __repr__(self):
+        return f"CompactRecord({self.expand()!r})"
+
+    def expand(self):
+        return {field: expand_value(value) for field, value in zip(self._layout, self._values)}
+
+    def length(self, field):
+        """
+        Anzahl Einträge eines Listenfelds ohne es auszupacken; 0, wenn das Feld fehlt.
+        """
+        pos = self._layout.get(field)
+        return len(self._values[pos]) if pos is not None else 0
+
+def pack_flags(key, flags):
+    """
+    Packt eine Nummer und eine Folge von Wahrheitswerten in eine Zahl (Flag i = Bit i).
+    """
+    packed = 0
+    for bit, flag in enumerate(flags):
+        if flag:
+            packed |= 1 << bit
+    return key << len(flags) | packed if flags else key
+
+class PackedFlags:
+    """
+    Liste gleich aufgebauter Einträge {Nummernfeld: Zahl, Flag-Feld: bool, ...}, z.B. die
+    Mandantenberechtigungen eines Benutzers, gespeichert als mit pack_flags gepackte Zahlen.
+    """
+    __slots__ = ("_fields", "_packed")
+
+    def __init__(self, key_field, flag_fields, packed):
+        self._fields = tuple(_layout((key_field, *flag_fields)))
+        self._packed = tuple(packed)
+
+    def __len__(self):
+        return len(self._packed)
+
+    def __iter__(self):
+        return iter(self.expand())
+
+    def __repr__(self):
+        return f"PackedFlags({self.expand()!r})"
+
+    def expand(self):
+        key_field, *flag_fields = self._fields
+        width = len(flag_fields)
+        entries = []
+        for packed in self._packed:
+            entry = {key_field: packed >> width}
+            for bit, field in enumerate(flag_fields):
+                entry[field] = bool(packed >> bit & 1)
+            entries.append(entry)
+        return entries
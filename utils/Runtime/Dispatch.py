@@ -0,0 +1,28 @@
+import logging
+from utils.Runtime.Arguments import get_module_args
+
+def longest_first(records, cost):
+    """
+    Grösste Aufträge zuerst (LPT): die teuren Requests laufen früh parallel zu vielen kleinen,
+    statt am Ende allein. Bei gleichen Kosten bleibt die Reihenfolge der Eingabe erhalten.
+    """
+    return sorted(records, key=cost, reverse=True)
+
+# Versandreihenfolgen; jede Strategie erhält die Datensätze und ein Kostenmodell
+DISPATCH_ORDERS = {
+    "input": lambda records, cost: list(records),
+    "longest": longest_first,
+}
+
+def dispatch_order(records, cost, order=None):
+    """
+    Ordnet die Datensätze für den Versand nach der mit --dispatch-order bzw.
+    MIGRATION_DISPATCH_ORDER gewählten Strategie. cost liefert pro Datensatz
+    eine Zahl, z.B. die geschätzte Payload-Grösse in Bytes.
+    """
+    order = order or get_module_args().dispatch_order
+    ordered = DISPATCH_ORDERS[order](records, cost)
+    if order != "input" and ordered:
+        logging.info("Versandreihenfolge '%s': grösster Auftrag %d, kleinster %d.",
+                     order, cost(ordered[0]), cost(ordered[-1]))
+    return ordered
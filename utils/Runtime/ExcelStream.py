@@ -0,0 +1,93 @@
+import logging
+import os
+import queue
+import threading
+from collections import namedtuple
+
+# Anzahl Zeilen pro Block, den die Sender am Stück übernehmen
+CHUNK_ROWS = int(os.environ.get("MIGRATION_CHUNK_ROWS", 5000))
+# So viele gelesene Blöcke dürfen höchstens auf die Sender warten; begrenzt den Speicherbedarf
+PREFETCH_CHUNKS = 2
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+# Markiert das Ende des Lesens in der Warteschlange
+_DONE = object()
+
+def cell_text(value):
+    """
+    Zellwert als String wie in den Exporten erwartet: ganze Zahlen ohne ".0", leere Zellen als "".
+    """
+    if value is None:
+        return ""
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value).strip()
+
+def read_chunks(path, columns, chunk_rows=CHUNK_ROWS, convert=cell_text):
+    """
+    Liest die angegebenen Spalten eines Workbooks zeilenweise im Nur-Lese-Modus von openpyxl und
+    liefert Blöcke von höchstens chunk_rows Zeilen als Listen von namedtuples (Feld = Spaltenname).
+    Komplett leere Zeilen werden übersprungen. Fehlt eine Spalte, wird ein KeyError ausgelöst.
+    """
+    from openpyxl import load_workbook
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        header = [str(name).strip() if name is not None else "" for name in next(rows, ())]
+        missing = [column for column in columns if column not in header]
+        if missing:
+            raise KeyError(f"Spalte(n) {', '.join(missing)} fehlen in '{path}'.")
+        positions = [header.index(column) for column in columns]
+        row_type = namedtuple("Row", columns)
+        chunk = []
+        for row in rows:
+            values = [row[pos] if pos < len(row) else None for pos in positions]
+            if all(value is None for value in values):
+                continue
+            chunk.append(row_type(*map(convert, values)))
+            if len(chunk) >= chunk_rows:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+    finally:
+        workbook.close()
+
+def stream_chunks(path, columns, chunk_rows=CHUNK_ROWS, prefetch=PREFETCH_CHUNKS, convert=cell_text):
+    """
+    Wie read_chunks, das Lesen läuft aber in einem eigenen Thread: die Sender arbeiten am ersten
+    Block, während die weiteren gelesen werden. Höchstens prefetch Blöcke liegen gelesen bereit.
+    Fehler beim Lesen werden beim Abholen des nächsten Blocks ausgelöst.
+    """
+    chunks = queue.Queue(maxsize=prefetch)
+    stop = threading.Event()
+
+    def produce():
+        try:
+            for chunk in read_chunks(path, columns, chunk_rows, convert):
+                # Nicht endlos blockieren, falls der Verbraucher vorzeitig aufgehört hat
+                while not stop.is_set():
+                    try:
+                        chunks.put(chunk, timeout=0.5)
+                        break
+                    except queue.Full:
+                        continue
+                if stop.is_set():
+                    return
+            chunks.put(_DONE)
+        except BaseException as e:
+            chunks.put(e)
+
+    reader = threading.Thread(target=produce, name=f"excel-reader-{os.path.basename(path)}", daemon=True)
+    reader.start()
+    try:
+        while True:
+            item = chunks.get()
+            if item is _DONE:
+                return
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+    finally:
+        stop.set()
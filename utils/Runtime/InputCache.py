@@ -0,0 +1,252 @@
+import hashlib
+import json
+import logging
+import os
+import pickle
+import time
+from concurrent.futures import ProcessPoolExecutor, wait
+from pathlib import Path
+
+# Bereits geparste Eingaben; gültig, solange Grösse und Änderungszeit der Quelldatei gleich bleiben
+CACHE_DIR = Path("_data/cache")
+# So lange wartet ein Schritt höchstens auf ein laufendes Vorladen derselben Datei
+PRELOAD_TIMEOUT = 600
+# Eingaben mit Klartext-Passwörtern: werden nie im Cache auf die Platte geschrieben
+UNCACHED_FILES = {"OBT_Export_Modify_Passwords_Users.xlsx"}
+
+# Eingaben der Schritte in der Reihenfolge, in der creation.py und deletion.py sie brauchen:
+# (Art, Pfad, Parameter) mit denselben Parametern wie beim Lesen im Modul.
+# Die Art "stream" liest das Modul blockweise selbst (ExcelStream); sie wird nicht vorgeladen.
+DATA_DIR = Path("_data")
+STEP_INPUTS = {
+    "utils.Creation.CreateCategory": [("frame_json", DATA_DIR / "OBT_Export_Create_Categories.json", {})],
+    "utils.Creation.CreateServiceUsers": [("json", DATA_DIR / "OBT_Export_Create_ServiceUsers.json", {})],
+    "utils.Creation.CreateUsers": [("json", DATA_DIR / "OBT_Export_Create_Users.json", {})],
+    "utils.Modification.ModifyPassword": [("stream", DATA_DIR / "OBT_Export_Modify_Passwords_Users.xlsx", {})],
+    "utils.Modification.ModifyUsers": [
+        ("json", DATA_DIR / "OBT_Export_Modify_Users.json", {}),
+        ("excel", DATA_DIR / "OBT_Export_sub_ClientUserClasses.xlsx", {"dtype": str}),
+        ("excel", DATA_DIR / "OBT_Export_sub_ClientApplicationSupervisor.xlsx", {"dtype": str}),
+    ],
+    "utils.Creation.CreateProgramPolicy": [("excel", DATA_DIR / "OBT_Export_Create_ProgrammPolicies.xlsx", {})],
+    "utils.Creation.CreateClientPolicy": [("excel", DATA_DIR / "OBT_Export_Create_ClientPolicies.xlsx", {})],
+    "utils.Delete.DeleteUsers": [("column", DATA_DIR / "DeleteUsers.xlsx", {"column": "UID"})],
+    "utils.Delete.DeleteProgrammPolicies": [("column", DATA_DIR / "DeleteProgrammPolicies.xlsx", {"column": "UID"})],
+    "utils.Delete.DeleteClientPolicies": [("column", DATA_DIR / "DeleteClientPolicies.xlsx", {"column": "UID"})],
+    "utils.Delete.DeleteCategories": [("column", DATA_DIR / "DeleteCategories.xlsx", {"column": "UID"})],
+}
+STEP_INPUTS["utils.Creation.ProvisionUsers"] = (STEP_INPUTS["utils.Creation.CreateUsers"]
+                                               + STEP_INPUTS["utils.Modification.ModifyPassword"]
+                                               + STEP_INPUTS["utils.Modification.ModifyUsers"])
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+def _read_column(path, column):
+    # Einzelne Spalte ohne pandas lesen; None, wenn die Spalte fehlt
+    from openpyxl import load_workbook
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        header = next(rows, ())
+        if column not in header:
+            return None
+        index = header.index(column)
+        values = (row[index] if index < len(row) else None for row in rows)
+        return [str(int(value)) if isinstance(value, float) and value.is_integer() else str(value)
+                for value in values if value is not None and str(value).strip()]
+    finally:
+        workbook.close()
+
+def _read_json_column(path, column):
+    # Nur die Werte eines Felds aus einem JSON-Export; der Cache bleibt so auch bei grossen Exporten klein
+    with open(path, "r", encoding="utf-8") as file:
+        data = json.load(file)
+    if isinstance(data, dict):
+        data = [data]
+    return [record.get(column) for record in data]
+
+def _parse(kind, path, kwargs):
+    if kind == "column":
+        return _read_column(path, **kwargs)
+    if kind == "json_column":
+        return _read_json_column(path, **kwargs)
+    # pandas nur laden, wenn tatsächlich geparst werden muss
+    import pandas as pd
+    if kind == "excel":
+        return pd.read_excel(path, **kwargs)
+    if kind == "frame_json":
+        return pd.read_json(path, **kwargs)
+    with open(path, "r", encoding="utf-8") as file:
+        return json.load(file)
+
+def cache_path(kind, path, kwargs):
+    """
+    Pfad des Caches für eine Eingabe; der Name ändert sich mit Grösse, Änderungszeit und Leseparametern.
+    """
+    stat = os.stat(path)
+    source = f"{kind}|{Path(path).resolve()}|{sorted(kwargs.items(), key=str)}"
+    version = f"{stat.st_size}|{stat.st_mtime_ns}"
+    source_digest = hashlib.sha1(source.encode("utf-8")).hexdigest()[:8]
+    version_digest = hashlib.sha1(version.encode("utf-8")).hexdigest()[:12]
+    return CACHE_DIR / f"{Path(path).stem}-{source_digest}-{version_digest}.pkl"
+
+def _load_cache(target):
+    try:
+        with open(target, "rb") as file:
+            return pickle.load(file)
+    except (OSError, pickle.UnpicklingError, EOFError):
+        return None
+
+def _store_cache(target, data):
+    target.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = target.with_name(f"{target.name}.{os.getpid()}.tmp")
+    with open(tmp_path, "wb") as file:
+        pickle.dump(data, file, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, target)
+    # Veraltete Caches derselben Quelldatei entfernen
+    for old in target.parent.glob(f"{target.stem.rsplit('-', 1)[0]}-*.pkl"):
+        if old != target:
+            old.unlink(missing_ok=True)
+
+def _wait_for_preload(target):
+    """
+    Wartet, falls gerade ein Vorlade-Prozess dieselbe Eingabe parst.
+    """
+    lock = target.with_suffix(".lock")
+    while lock.exists() and not target.exists():
+        try:
+            if time.time() - lock.stat().st_mtime > PRELOAD_TIMEOUT:
+                return
+        except FileNotFoundError:
+            return
+        time.sleep(0.1)
+
+def load_input(kind, path, kwargs=None):
+    """
+    Liest eine Eingabe aus dem Cache oder parst sie und legt sie im Cache ab.
+    Fehler beim Lesen der Quelldatei werden wie bei pandas/json weitergereicht.
+    """
+    kwargs = kwargs or {}
+    if Path(path).name in UNCACHED_FILES:
+        return _parse(kind, path, kwargs)
+    target = cache_path(kind, path, kwargs)
+    _wait_for_preload(target)
+    data = _load_cache(target) if target.exists() else None
+    if data is not None:
+        logging.debug("Eingabe '%s' aus dem Cache geladen.", path)
+        return data
+    data = _parse(kind, path, kwargs)
+    try:
+        _store_cache(target, data)
+    except OSError as e:
+        logging.warning("Cache für '%s' konnte nicht geschrieben werden: %s", path, e)
+    return data
+
+def cached_input(kind, path, kwargs=None):
+    """
+    Liefert eine Eingabe nur, wenn sie bereits fertig im Cache liegt; sonst None.
+    Wartet nicht auf ein laufendes Vorladen und parst nichts.
+    """
+    kwargs = kwargs or {}
+    try:
+        target = cache_path(kind, path, kwargs)
+    except FileNotFoundError:
+        return None
+    return _load_cache(target) if target.exists() else None
+
+def read_excel(path, **kwargs):
+    """
+    Wie pd.read_excel, mit Cache.
+    """
+    return load_input("excel", path, kwargs)
+
+def read_excel_column(path, column):
+    """
+    Liest die Werte einer Spalte als Liste von Strings ohne leere Zellen, mit Cache.
+    Liefert None, wenn die Spalte fehlt. Braucht weder beim Parsen noch aus dem Cache pandas.
+    """
+    return load_input("column", path, {"column": column})
+
+def stream_excel_column(path, column, chunk_rows=None):
+    """
+    Liefert die Werte einer Spalte blockweise als Listen von Strings ohne leere Zellen.
+    Liegt die Spalte schon im Cache, werden die Blöcke daraus gebildet; sonst wird das Workbook
+    in einem eigenen Thread gelesen, sodass der erste Block bereitsteht, bevor die Datei ganz
+    gelesen ist. Fehlt die Spalte, wird ein KeyError ausgelöst.
+    """
+    from utils.Runtime.ExcelStream import CHUNK_ROWS, stream_chunks
+    chunk_rows = chunk_rows or CHUNK_ROWS
+    values = cached_input("column", path, {"column": column})
+    if values is not None:
+        for start in range(0, len(values), chunk_rows):
+            yield values[start:start + chunk_rows]
+        return
+    for chunk in stream_chunks(path, [column], chunk_rows):
+        yield [row[0] for row in chunk if row[0]]
+
+def read_json(path):
+    """
+    Wie json.load, mit Cache.
+    """
+    return load_input("json", path)
+
+def read_json_column(path, column):
+    """
+    Liest die Werte eines Felds aller Einträge eines JSON-Exports als Liste (fehlende Felder als None), mit Cache.
+    """
+    return load_input("json_column", path, {"column": column})
+
+def read_json_frame(path, **kwargs):
+    """
+    Wie pd.read_json, mit Cache.
+    """
+    return load_input("frame_json", path, kwargs)
+
+def _preload_one(kind, path, kwargs):
+    target = cache_path(kind, path, kwargs)
+    if target.exists():
+        return
+    lock = target.with_suffix(".lock")
+    target.parent.mkdir(parents=True, exist_ok=True)
+    try:
+        with open(lock, "x", encoding="utf-8") as file:
+            file.write(str(os.getpid()))
+    except FileExistsError:
+        # Ein anderer Prozess lädt diese Eingabe bereits
+        return
+    try:
+        _store_cache(target, _parse(kind, path, kwargs))
+    finally:
+        lock.unlink(missing_ok=True)
+
+def preload(specs, max_workers=None, block=False):
+    """
+    Parst die angegebenen Eingaben parallel in Worker-Prozessen und legt sie im Cache ab.
+    Nicht vorhandene Dateien werden übersprungen. Mit block=True wird auf alle gewartet,
+    sonst wird der Executor zurückgegeben und läuft im Hintergrund weiter.
+    """
+    unique = {}
+    for kind, path, kwargs in specs:
+        unique.setdefault((kind, str(path), str(sorted(kwargs.items(), key=str))), (kind, Path(path), kwargs))
+    specs = [(kind, path, kwargs) for kind, path, kwargs in unique.values()
+             if kind != "stream" and path.name not in UNCACHED_FILES and path.exists()
+             and not cache_path(kind, path, kwargs).exists()]
+    if not specs:
+        return None
+    executor = ProcessPoolExecutor(max_workers=max_workers or min(len(specs), os.cpu_count() or 1))
+    futures = [executor.submit(_preload_one, *spec) for spec in specs]
+    if block:
+        wait(futures)
+        executor.shutdown()
+        for future in futures:
+            if future.exception():
+                logging.warning("Vorladen fehlgeschlagen: %s", future.exception())
+        return None
+    return executor
+
+def preload_steps(modules):
+    """
+    Startet das Vorladen aller Eingaben der angegebenen Module in ihrer Reihenfolge im Hintergrund.
+    """
+    specs = [spec for module in modules for spec in STEP_INPUTS.get(module, [])]
+    return preload(specs)
@@ -0,0 +1,98 @@
+import json
+import logging
+import threading
+from datetime import datetime
+from functools import lru_cache
+from pathlib import Path
+from utils.Runtime.Arguments import get_module_args
+from utils.Runtime.Sharding import shard_suffix
+from utils.Runtime.Progress import get_progress
+
+# Journale landen pro Lauf in einem eigenen Unterverzeichnis
+JOURNAL_DIR = Path("_data/results/journal")
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+@lru_cache(maxsize=1)
+def get_run_id():
+    """
+    Liefert die Kennung des aktuellen Laufs. Ohne Vorgabe wird sie aus dem Startzeitpunkt gebildet.
+    """
+    return get_module_args().run_id or datetime.now().strftime("%Y%m%d-%H%M%S")
+
+def run_dir(run_id=None):
+    """
+    Verzeichnis, in dem Journale und Markierungen eines Laufs liegen.
+    """
+    return JOURNAL_DIR / (run_id or get_run_id())
+
+class Journal:
+    """
+    Schreibt pro verarbeitetem Datensatz eine JSON-Zeile mit Status und IDs.
+    Kann gleichzeitig aus Threads und Coroutinen beschrieben werden.
+    """
+
+    def __init__(self, step, entity):
+        self.step = step
+        self.entity = entity
+        self.path = run_dir() / f"{step}{shard_suffix()}.jsonl"
+        self.lock = threading.Lock()
+        self.file = None
+        self.progress = get_progress(step)
+
+    def write(self, source_id, status, status_code="", message="", server_id=""):
+        entry = {
+            "time": datetime.now().isoformat(),
+            "step": self.step,
+            "entity": self.entity,
+            "source_id": source_id,
+            "server_id": server_id or "",
+            "status": status,
+            "status_code": status_code,
+            "message": message,
+        }
+        with self.lock:
+            if self.file is None:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                self.file = open(self.path, "a", encoding="utf-8", buffering=1)
+            self.file.write(json.dumps(entry, ensure_ascii=False, default=str) + "\n")
+        self.progress.add(status)
+
+    def write_result(self, result, id_field="Benutzer-ID"):
+        """
+        Übernimmt eine Ergebniszeile im Format der Result-Workbooks ins Journal.
+        """
+        self.write(result.get(id_field, ""), result.get("Status", ""),
+                   result.get("Status-Code", ""), result.get("Nachricht", ""))
+
+@lru_cache(maxsize=None)
+def get_journal(step, entity):
+    """
+    Liefert das Journal eines Schritts; wird erst beim ersten Eintrag angelegt.
+    """
+    return Journal(step, entity)
+
+def read_journal(run_id=None, step=None):
+    """
+    Liest alle Journal-Einträge eines Laufs (aller Shards), optional nur für einen Schritt.
+    """
+    entries = []
+    pattern = f"{step}*.jsonl" if step else "*.jsonl"
+    for path in sorted(run_dir(run_id).glob(pattern)):
+        with open(path, "r", encoding="utf-8") as file:
+            entries.extend(json.loads(line) for line in file if line.strip())
+    return entries
+
+def server_id_from_response(text, fields=("id", "userId", "userCategoryId")):
+    """
+    Liest die vom Server vergebene ID aus einer JSON-Antwort, falls vorhanden.
+    """
+    try:
+        body = json.loads(text)
+    except (TypeError, ValueError):
+        return ""
+    if isinstance(body, dict):
+        for field in fields:
+            if body.get(field):
+                return str(body[field])
+    return ""
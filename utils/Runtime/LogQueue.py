@@ -0,0 +1,29 @@
+import atexit
+import logging
+import queue
+from logging.handlers import QueueHandler, QueueListener
+
+LOG_FORMAT = "%(asctime)s - %(levelname)s - %(message)s"
+
+_listener = None
+
+def setup_logging(level=logging.INFO):
+    """
+    Leitet alle Log-Ausgaben des Prozesses über eine Queue an einen Hintergrund-Thread,
+    der sie auf die Konsole schreibt. Threads und Event-Loop warten so nicht auf die
+    Ausgabe (z.B. über die Pipe zu creation.py). Mehrfache Aufrufe sind wirkungslos.
+    """
+    global _listener
+    if _listener is not None:
+        return
+    logging.basicConfig(level=level, format=LOG_FORMAT)
+    root = logging.getLogger()
+    handlers = [handler for handler in root.handlers if not isinstance(handler, QueueHandler)]
+    for handler in handlers:
+        root.removeHandler(handler)
+    log_queue = queue.SimpleQueue()
+    root.addHandler(QueueHandler(log_queue))
+    _listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    # Beim Beenden zuletzt stoppen, damit alle Einträge noch ausgegeben werden
+    atexit.register(_listener.stop)
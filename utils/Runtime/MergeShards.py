@@ -0,0 +1,64 @@
+import re
+import logging
+import pandas as pd
+from collections import defaultdict
+from pathlib import Path
+
+RESULTS_DIR = Path("_data/results")
+# Laufverzeichnisse mit Journalen und Kopien der Ergebnisse (watch.py) werden nicht zusammengeführt
+JOURNAL_DIR_NAME = "journal"
+SHARD_PATTERN = re.compile(r"^(?P<base>.+)_shard(?P<index>\d+)of(?P<count>\d+)$")
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+def find_shard_results(results_dir=RESULTS_DIR):
+    """
+    Gruppiert alle Shard-Workbooks im Ergebnisverzeichnis nach Verzeichnis und Basisnamen.
+    Berücksichtigt auch die Unterverzeichnisse pro Zielsystem (targets.py, siehe shard_path),
+    nicht aber die Kopien in den Laufverzeichnissen unter journal/.
+    """
+    groups = defaultdict(list)
+    for path in sorted(results_dir.rglob("*_shard*of*.xlsx")):
+        if JOURNAL_DIR_NAME in path.relative_to(results_dir).parts:
+            continue
+        match = SHARD_PATTERN.match(path.stem)
+        if match:
+            groups[(path.parent, match["base"], int(match["count"]))].append((int(match["index"]), path))
+    return groups
+
+def merge_shard_results(results_dir=RESULTS_DIR):
+    """
+    Fasst die Shard-Workbooks zu den üblichen Ergebnisdateien zusammen
+    (z.B. result_create_users_shard1of4.xlsx ... → result_create_users.xlsx).
+    Fehlende Shards werden gemeldet, die vorhandenen trotzdem zusammengeführt. Ergebnisse pro
+    Zielsystem werden in ihrem Unterverzeichnis zusammengeführt.
+    """
+    merged = []
+    for (directory, base, count), parts in find_shard_results(results_dir).items():
+        found = {index for index, _ in parts}
+        missing = sorted(set(range(1, count + 1)) - found)
+        if missing:
+            logging.warning("'%s': Shards %s von %d fehlen.", directory / base, missing, count)
+        frames = []
+        for _, path in sorted(parts):
+            try:
+                frames.append(pd.read_excel(path))
+            except Exception as e:
+                logging.error("Fehler beim Lesen von '%s': %s", path, e)
+        if not frames:
+            continue
+        target = directory / f"{base}.xlsx"
+        pd.concat(frames, ignore_index=True).to_excel(target, index=False)
+        logging.info("%d Shards zusammengeführt in '%s'", len(frames), target)
+        merged.append(target)
+    return merged
+
+def main():
+    """
+    Führt alle Shard-Ergebnisse in _data/results/ und den Verzeichnissen der Zielsysteme zusammen.
+    """
+    if not merge_shard_results():
+        logging.warning("Keine Shard-Ergebnisse gefunden.")
+
+if __name__ == "__main__":
+    main()
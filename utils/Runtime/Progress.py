@@ -0,0 +1,197 @@
+import atexit
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+from functools import lru_cache
+from utils.Runtime.Arguments import get_module_args
+from utils.Runtime.Sharding import get_shard, shard_suffix
+
+# Abstand in Sekunden zwischen zwei Fortschrittsmeldungen eines Schritts
+PROGRESS_INTERVAL = float(os.environ.get("MIGRATION_PROGRESS_INTERVAL", 10))
+# Abstand in Sekunden, in dem die Statusdatei eines Schritts aktualisiert wird
+STATUS_INTERVAL = 1.0
+
+SUCCESS_STATUS = "Erfolgreich"
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+def format_duration(seconds):
+    """
+    Formatiert eine Dauer in Sekunden als h:mm:ss.
+    """
+    seconds = int(seconds)
+    return f"{seconds // 3600}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}"
+
+class Progress:
+    """
+    Zählt die verarbeiteten Datensätze eines Schritts und fasst sie periodisch in einer
+    Fortschrittsmeldung (Anzahl, Rate, ETA) zusammen, statt jeden Erfolg einzeln zu loggen.
+    Zusätzlich wird höchstens einmal pro STATUS_INTERVAL eine kleine Statusdatei im
+    Journal-Verzeichnis des Laufs geschrieben, die creation.py und externe Tools lesen können.
+    Wird über das Journal bei jedem Eintrag aufgerufen.
+    """
+
+    def __init__(self, step, interval=PROGRESS_INTERVAL):
+        self.step = step
+        self.interval = interval
+        self.lock = threading.Lock()
+        self.total = None
+        self.started = None
+        self.last_report = None
+        self.last_status = None
+        self.window = (0.0, 0)
+        self.current_rate = 0.0
+        self.succeeded = 0
+        self.failed = 0
+
+    @property
+    def done(self):
+        return self.succeeded + self.failed
+
+    def start(self, total):
+        """
+        Setzt die Anzahl zu verarbeitender Datensätze und startet die Zeitmessung.
+        """
+        with self.lock:
+            self.total = total
+            self.started = self.last_report = self.last_status = time.monotonic()
+            self.window = (self.started, 0)
+        self.write_status("läuft")
+
+    def set_total(self, total):
+        """
+        Setzt die Anzahl Datensätze nachträglich, z.B. wenn die Eingabe blockweise gelesen wird
+        und erst am Ende feststeht, wie viele es sind.
+        """
+        with self.lock:
+            self.total = total
+
+    def add(self, status):
+        with self.lock:
+            if status == SUCCESS_STATUS:
+                self.succeeded += 1
+            else:
+                self.failed += 1
+            if self.started is None:
+                return
+            now = time.monotonic()
+            status_due = now - self.last_status >= STATUS_INTERVAL
+            report_due = now - self.last_report >= self.interval
+            if status_due:
+                # Aktuelle Rate über das Zeitfenster seit der letzten Statusdatei
+                window_start, window_done = self.window
+                self.current_rate = (self.done - window_done) / (now - window_start)
+                self.window = (now, self.done)
+                self.last_status = now
+            if report_due:
+                self.last_report = now
+        if status_due:
+            self.write_status("läuft")
+        if report_due:
+            self.report()
+
+    def snapshot(self):
+        """
+        Liefert den aktuellen Stand inkl. Rate (Datensätze pro Sekunde) und geschätzter Restdauer.
+        """
+        with self.lock:
+            elapsed = time.monotonic() - self.started if self.started else 0.0
+            done = self.done
+            rate = done / elapsed if elapsed > 0 else 0.0
+            remaining = (self.total - done) / rate if rate > 0 and self.total is not None else None
+            return {
+                "step": self.step,
+                "total": self.total,
+                "done": done,
+                "succeeded": self.succeeded,
+                "failed": self.failed,
+                "rate": rate,
+                "current_rate": self.current_rate or rate,
+                "elapsed": elapsed,
+                "eta": remaining,
+            }
+
+    def report(self, final=False):
+        state = self.snapshot()
+        eta = "" if final or state["eta"] is None else f", ETA {format_duration(state['eta'])}"
+        logging.info("%s %s: %d/%s (%d erfolgreich, %d fehlgeschlagen), %.1f/s%s",
+                     "Abgeschlossen" if final else "Fortschritt", self.step, state["done"],
+                     state["total"] if state["total"] is not None else "?", state["succeeded"],
+                     state["failed"], state["current_rate"] if not final else state["rate"], eta)
+
+    def write_status(self, state):
+        """
+        Schreibt den aktuellen Stand atomar in die Statusdatei des Schritts.
+        """
+        # Import erst hier, da das Journal seinerseits dieses Modul importiert
+        from utils.Runtime.Journal import run_dir
+        path = run_dir() / f"status_{self.step}{shard_suffix()}.json"
+        status = dict(self.snapshot(), state=state, run_id=get_module_args().run_id,
+                      shard="/".join(map(str, get_shard())) if get_shard() else None,
+                      pid=os.getpid(), updated=datetime.now().isoformat())
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+            tmp_path.write_text(json.dumps(status, ensure_ascii=False), encoding="utf-8")
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logging.debug("Statusdatei '%s' konnte nicht geschrieben werden: %s", path, e)
+
+    def finish(self):
+        """
+        Schreibt die abschliessende Zusammenfassung, falls der Schritt gestartet wurde.
+        """
+        if self.started is not None:
+            self.write_status("abgeschlossen")
+            self.report(final=True)
+
+@lru_cache(maxsize=None)
+def get_progress(step):
+    """
+    Liefert den Fortschrittszähler eines Schritts; die Zusammenfassung folgt beim Beenden.
+    """
+    progress = Progress(step)
+    atexit.register(progress.finish)
+    return progress
+
+def read_status(run_id=None):
+    """
+    Liest die Statusdateien aller Schritte und Shards eines Laufs.
+    """
+    from utils.Runtime.Journal import run_dir
+    statuses = []
+    for path in sorted(run_dir(run_id).glob("status_*.json")):
+        try:
+            statuses.append(json.loads(path.read_text(encoding="utf-8")))
+        except (OSError, ValueError):
+            # Datei wird gerade ersetzt oder ist unvollständig
+            continue
+    return statuses
+
+def format_status(status):
+    """
+    Einzeilige Darstellung eines Status für die Konsole.
+    """
+    total = status["total"] if status["total"] is not None else "?"
+    eta = f", ETA {format_duration(status['eta'])}" if status.get("eta") is not None and status["state"] == "läuft" else ""
+    shard = f" [{status['shard']}]" if status.get("shard") else ""
+    # Während des Laufs die aktuelle Rate, danach den Durchschnitt anzeigen
+    rate = status["current_rate"] if status["state"] == "läuft" else status["rate"]
+    return (f"{status['step']}{shard}: {status['done']}/{total} ({status['succeeded']} erfolgreich, "
+            f"{status['failed']} fehlgeschlagen), {rate:.1f}/s{eta} – {status['state']}")
+
+def main():
+    """
+    Zeigt den Stand aller Schritte eines Laufs, z.B. python -m utils.Runtime.Progress --run-id <id>.
+    """
+    statuses = read_status(get_module_args().run_id)
+    if not statuses:
+        print("Keine Statusdateien gefunden.")
+    for status in statuses:
+        print(format_status(status))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+import asyncio
+import atexit
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from datetime import datetime
+from functools import lru_cache
+from pathlib import Path
+from utils.Runtime.Journal import run_dir
+from utils.Runtime.Sharding import shard_suffix
+
+# Erlaubte Requests pro Sekunde je Endpunkt-Klasse (0 = unbegrenzt);
+# überschreibbar mit MIGRATION_RATE_<KLASSE>, z.B. MIGRATION_RATE_USERS=20
+RATE_LIMITS = {
+    "token": 0,
+    "categories": 0,
+    "users": 0,
+    "serviceusers": 0,
+    "passwords": 0,
+    "program_policies": 0,
+    "mandant_policies": 0,
+}
+# Gesamtbudget über alle Endpunkt-Klassen des Prozesses (0 = unbegrenzt)
+GLOBAL_RATE_LIMIT = float(os.environ.get("MIGRATION_RATE_LIMIT", 0))
+# Wie viele Requests nach einer Ruhephase direkt hintereinander erlaubt sind (in Sekunden Budget)
+BURST_SECONDS = 1.0
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+def endpoint_rate(endpoint, limits=RATE_LIMITS):
+    """
+    Konfigurierte Rate einer Endpunkt-Klasse in Requests pro Sekunde (0 = unbegrenzt).
+    """
+    override = os.environ.get(f"MIGRATION_RATE_{endpoint.upper()}")
+    return float(override) if override else limits.get(endpoint, 0)
+
+class TokenBucket:
+    """
+    Token-Bucket mit fester Rate. Requests reservieren ihr Token sofort und warten
+    anschliessend die berechnete Zeit ab, so bleibt die Reihenfolge fair und der Lock
+    wird nie während des Wartens gehalten.
+    """
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or max(rate * BURST_SECONDS, 1)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def reserve(self):
+        """
+        Entnimmt ein Token und liefert die Wartezeit in Sekunden, bis es gültig ist.
+        """
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+class RateLimiter:
+    """
+    Gemeinsamer Rate Limiter aller asynchronen und Thread-basierten Sender eines Prozesses:
+    ein Bucket pro Endpunkt-Klasse plus optional ein Gesamtbudget.
+    Die Wartezeit durch Drosselung wird pro Klasse als Metrik gesammelt.
+    """
+
+    def __init__(self, limits=None, global_limit=GLOBAL_RATE_LIMIT):
+        self.limits = dict(RATE_LIMITS, **(limits or {}))
+        self.global_bucket = TokenBucket(global_limit) if global_limit > 0 else None
+        self.buckets = {}
+        self.lock = threading.Lock()
+        self.metrics = {}
+
+    def _bucket(self, endpoint):
+        with self.lock:
+            if endpoint not in self.buckets:
+                rate = endpoint_rate(endpoint, self.limits)
+                self.buckets[endpoint] = TokenBucket(rate) if rate > 0 else None
+            return self.buckets[endpoint]
+
+    def _reserve(self, endpoint):
+        waits = [bucket.reserve() for bucket in (self._bucket(endpoint), self.global_bucket) if bucket]
+        wait = max(waits, default=0.0)
+        with self.lock:
+            metric = self.metrics.setdefault(endpoint, {"requests": 0, "throttled": 0, "wait_seconds": 0.0})
+            metric["requests"] += 1
+            if wait > 0:
+                metric["throttled"] += 1
+                metric["wait_seconds"] += wait
+        return wait
+
+    def acquire(self, endpoint):
+        """
+        Blockiert, bis ein Request der Endpunkt-Klasse gesendet werden darf.
+        """
+        wait = self._reserve(endpoint)
+        if wait > 0:
+            time.sleep(wait)
+
+    async def acquire_async(self, endpoint):
+        """
+        Wartet, bis ein Request der Endpunkt-Klasse gesendet werden darf, ohne die Event-Loop zu blockieren.
+        """
+        wait = self._reserve(endpoint)
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def get_metrics(self):
+        """
+        Liefert pro Endpunkt-Klasse Anzahl Requests, gedrosselte Requests und die Wartezeit in Sekunden.
+        """
+        with self.lock:
+            return {endpoint: dict(metric) for endpoint, metric in self.metrics.items()}
+
+    def report(self):
+        """
+        Loggt die Drosselungs-Metriken und hängt sie an die Metrikdatei des Laufs an.
+        """
+        metrics = self.get_metrics()
+        if not metrics:
+            return
+        for endpoint, metric in metrics.items():
+            if metric["throttled"]:
+                logging.info("Drosselung '%s': %d von %d Requests gewartet, insgesamt %.1f s.",
+                             endpoint, metric["throttled"], metric["requests"], metric["wait_seconds"])
+        path = run_dir() / f"metrics{shard_suffix()}.jsonl"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "a", encoding="utf-8") as file:
+            file.write(json.dumps({
+                "time": datetime.now().isoformat(),
+                "module": Path(sys.argv[0]).stem,
+                "metric": "throttle",
+                "values": metrics,
+            }, ensure_ascii=False) + "\n")
+
+@lru_cache(maxsize=1)
+def get_rate_limiter():
+    """
+    Liefert den gemeinsamen Rate Limiter des Prozesses; die Metriken werden beim Beenden geschrieben.
+    """
+    limiter = RateLimiter()
+    atexit.register(limiter.report)
+    return limiter
@@ -0,0 +1,83 @@
+import logging
+from utils.Runtime.Arguments import get_module_args
+from utils.Runtime.CircuitBreaker import PAUSED_STATUS
+from utils.Runtime.Journal import read_journal
+
+# Status, die bei einem Replay erneut gesendet werden (inkl. wegen Serverausfall pausierter Datensätze)
+REPLAY_STATUSES = ["Fehlgeschlagen", PAUSED_STATUS]
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+def normalize_id(value):
+    """
+    Vereinheitlicht IDs aus Result-Workbooks und Exporten (ohne Klammern und Leerzeichen).
+    """
+    return str(value).strip().strip("{}").strip()
+
+def load_failed_ids(result_file, status_codes=None, id_field="Benutzer-ID"):
+    """
+    Liest die IDs aller fehlgeschlagenen Zeilen aus einem früheren Result-Workbook,
+    optional nur mit den angegebenen Status-Codes (z.B. 500 oder Netzwerkfehler).
+    """
+    import pandas as pd
+    df = pd.read_excel(result_file, dtype={"Status-Code": str})
+    failed = df[df["Status"].isin(REPLAY_STATUSES)]
+    if status_codes:
+        failed = failed[failed["Status-Code"].astype(str).isin([str(code) for code in status_codes])]
+    return set(failed[id_field].dropna().map(normalize_id))
+
+def select_failed(records, result_file, key, id_field="Benutzer-ID"):
+    """
+    Wählt aus den frisch aufgebauten Payloads nur die im letzten Lauf fehlgeschlagenen aus.
+    Die Auswahl erfolgt über einen Index auf die ID statt über einen Vergleich pro Zeile.
+    """
+    try:
+        failed_ids = load_failed_ids(result_file, get_module_args().status_code, id_field)
+    except FileNotFoundError:
+        logging.error("Replay nicht möglich: '%s' wurde nicht gefunden.", result_file)
+        return []
+    index = {}
+    for record in records:
+        index.setdefault(normalize_id(key(record)), record)
+    selected = [index[uid] for uid in failed_ids if uid in index]
+    missing = len(failed_ids) - len(selected)
+    if missing:
+        logging.warning("%d fehlgeschlagene IDs sind im Export nicht mehr vorhanden.", missing)
+    logging.info("Replay: %d fehlgeschlagene Datensätze aus '%s' werden erneut gesendet.", len(selected), result_file)
+    return selected
+
+def merge_with_previous(result_file, results, id_field="Benutzer-ID"):
+    """
+    Ersetzt im früheren Result-Workbook die Zeilen der erneut gesendeten IDs durch die
+    neuen Ergebnisse, damit das Workbook weiterhin den Stand aller Datensätze zeigt.
+    """
+    import pandas as pd
+    try:
+        previous = pd.read_excel(result_file)
+    except FileNotFoundError:
+        return results
+    replayed = {normalize_id(result.get(id_field, "")) for result in results}
+    kept = previous[~previous[id_field].map(normalize_id).isin(replayed)]
+    return kept.to_dict(orient="records") + list(results)
+
+def select_failed_from_journal(records, step, key):
+    """
+    Replay für Module ohne Result-Workbook: wählt die Datensätze aus, deren letzter
+    Journal-Eintrag im mit --run-id angegebenen Lauf fehlgeschlagen oder pausiert ist.
+    """
+    run_id = get_module_args().run_id
+    if not run_id:
+        logging.error("Replay für '%s' benötigt die --run-id des früheren Laufs.", step)
+        return []
+    last_entries = {}
+    for entry in read_journal(run_id, step):
+        last_entries[normalize_id(entry["source_id"])] = entry
+    status_codes = get_module_args().status_code
+    failed_ids = {
+        uid for uid, entry in last_entries.items()
+        if entry["status"] in REPLAY_STATUSES
+        and (not status_codes or str(entry["status_code"]) in [str(code) for code in status_codes])
+    }
+    selected = [record for record in records if normalize_id(key(record)) in failed_ids]
+    logging.info("Replay: %d fehlgeschlagene Datensätze aus Lauf '%s' werden erneut gesendet.", len(selected), run_id)
+    return selected
@@ -0,0 +1,167 @@
+import json
+import logging
+import os
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from datetime import datetime
+from utils.Runtime.Journal import run_dir
+from utils.Runtime.Sharding import shard_suffix
+from utils.Runtime.Progress import read_status, format_status
+
+# Anzahl Schritte, die gleichzeitig laufen dürfen (1 = streng nacheinander)
+MAX_PARALLEL_STEPS = 3
+
+# Ausgaben paralleler Schritte zeilenweise und nicht ineinander geschrieben
+_print_lock = threading.Lock()
+
+def _print(text):
+    with _print_lock:
+        print(text, end="", flush=True)
+
+def run_module(module_path, prefix="", args=(), env=None):
+    """
+    Führt ein angegebenes Python-Modul als Subprozess aus und gibt dessen Ausgabe
+    (stdout und stderr) laufend aus, damit Fortschrittsmeldungen sofort sichtbar sind.
+    Mit prefix wird jede Zeile markiert, z.B. wenn mehrere Schritte parallel laufen.
+    args und env werden an den Subprozess übergeben (Standard: Umgebung dieses Prozesses).
+    Liefert den Exit-Code des Subprozesses.
+    """
+    _print(f"\n{prefix}--- Running: {module_path} ---\n")
+    # Starte das Modul als separaten Prozess und reiche jede Zeile direkt weiter
+    process = subprocess.Popen([sys.executable, "-m", module_path, *args], stdout=subprocess.PIPE,
+                               stderr=subprocess.STDOUT, text=True, bufsize=1, env=env)
+    for line in process.stdout:
+        _print(f"{prefix}{line}")
+    process.wait()
+    # Abschliessenden Stand aus der Statusdatei des Schritts anzeigen
+    run_id = (env or os.environ).get("MIGRATION_RUN_ID")
+    for status in read_status(run_id) if run_id else []:
+        if status.get("pid") == process.pid:
+            _print(f"{prefix}--- {format_status(status)} ---\n")
+    return process.returncode
+
+def share_rate_budget(max_parallel):
+    """
+    Teilt das globale Request-Budget (MIGRATION_RATE_LIMIT) gleichmässig auf die gleichzeitig
+    laufenden Schritte auf, damit sie zusammen das Budget nicht überschreiten.
+    """
+    budget = float(os.environ.get("MIGRATION_RATE_LIMIT") or 0)
+    if budget > 0 and max_parallel > 1:
+        os.environ["MIGRATION_RATE_LIMIT"] = str(budget / max_parallel)
+        logging.info("Request-Budget %.1f/s aufgeteilt auf %d parallele Schritte (je %.1f/s).",
+                     budget, max_parallel, budget / max_parallel)
+
+def step_dependencies(steps, dependencies):
+    """
+    Abhängigkeiten der Schritte, beschränkt auf die Schritte dieses Laufs.
+    """
+    return {step: [dep for dep in dependencies.get(step, []) if dep in steps] for step in steps}
+
+def run_graph(steps, dependencies, run, max_parallel=MAX_PARALLEL_STEPS):
+    """
+    Führt die Schritte als Abhängigkeitsgraph aus: jeder Schritt startet, sobald alle seine
+    Abhängigkeiten beendet sind, höchstens max_parallel gleichzeitig. Bereite Schritte starten
+    in der Reihenfolge von steps; mit max_parallel=1 entspricht das dem seriellen Ablauf.
+    Liefert pro Schritt Start (Sekunden seit Beginn), Dauer und Exit-Code.
+    """
+    deps = step_dependencies(steps, dependencies)
+    pending = list(steps)
+    timings, running = {}, {}
+    origin = time.monotonic()
+
+    def timed(step):
+        started = time.monotonic()
+        returncode = run(step)
+        return {"start": started - origin, "duration": time.monotonic() - started, "returncode": returncode}
+
+    with ThreadPoolExecutor(max_workers=max_parallel) as executor:
+        while pending or running:
+            for step in list(pending):
+                if len(running) >= max_parallel:
+                    break
+                if all(dep in timings for dep in deps[step]):
+                    pending.remove(step)
+                    running[executor.submit(timed, step)] = step
+            if not running:
+                raise ValueError(f"Zyklische Abhängigkeiten zwischen: {', '.join(pending)}")
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                timings[running.pop(future)] = future.result()
+    return timings
+
+def simulate_graph(steps, dependencies, durations, max_parallel=MAX_PARALLEL_STEPS):
+    """
+    Wie run_graph, aber ohne etwas auszuführen: plant die Schritte mit den angegebenen
+    Dauern (Sekunden) nach denselben Regeln ein. Liefert Timings im Format von run_graph.
+    """
+    deps = step_dependencies(steps, dependencies)
+    pending = list(steps)
+    timings, running = {}, {}
+    now = 0.0
+    while pending or running:
+        for step in list(pending):
+            if len(running) >= max_parallel:
+                break
+            if all(dep in timings and dep not in running for dep in deps[step]):
+                pending.remove(step)
+                timings[step] = {"start": now, "duration": durations[step], "returncode": 0}
+                running[step] = now + durations[step]
+        if not running:
+            raise ValueError(f"Zyklische Abhängigkeiten zwischen: {', '.join(pending)}")
+        # Zum Ende des nächsten laufenden Schritts vorrücken
+        now = min(running.values())
+        for step in [step for step, end in running.items() if end <= now]:
+            del running[step]
+    return timings
+
+def critical_paths(timings, dependencies):
+    """
+    Liefert pro Schritt die Dauer der längsten Kette von Abhängigkeiten, die mit ihm endet,
+    und den Vorgänger auf dieser Kette.
+    """
+    deps = step_dependencies(timings, dependencies)
+    paths = {}
+
+    def path(step):
+        if step not in paths:
+            before = max(deps[step], key=lambda dep: path(dep)[0], default=None)
+            paths[step] = (timings[step]["duration"] + (path(before)[0] if before else 0.0), before)
+        return paths[step]
+
+    for step in timings:
+        path(step)
+    return paths
+
+def report_schedule(timings, dependencies, metric="schedule"):
+    """
+    Gibt Start, Dauer und kritischen Pfad jedes Schritts aus und hängt sie an die Metrikdatei des Laufs an.
+    """
+    if not timings:
+        return
+    paths = critical_paths(timings, dependencies)
+    last = max(paths, key=lambda step: paths[step][0])
+    critical, step = [], last
+    while step:
+        critical.insert(0, step)
+        step = paths[step][1]
+    wall = max(t["start"] + t["duration"] for t in timings.values())
+    lines = [f"\n--- Ablauf: {wall:.1f} s gesamt, {sum(t['duration'] for t in timings.values()):.1f} s Schrittdauer ---",
+             f"{'Schritt':<40} {'Start (s)':>10} {'Dauer (s)':>10} {'Krit. Pfad (s)':>15}"]
+    for step, timing in sorted(timings.items(), key=lambda item: item[1]["start"]):
+        marker = " *" if step in critical else ""
+        lines.append(f"{step:<40} {timing['start']:>10.1f} {timing['duration']:>10.1f} {paths[step][0]:>15.1f}{marker}")
+    lines.append(f"* kritischer Pfad: {' -> '.join(s.rsplit('.', 1)[-1] for s in critical)}")
+    _print("\n".join(lines) + "\n")
+    path = run_dir(os.environ["MIGRATION_RUN_ID"]) / f"metrics{shard_suffix()}.jsonl"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "a", encoding="utf-8") as file:
+        file.write(json.dumps({
+            "time": datetime.now().isoformat(),
+            "module": os.path.basename(sys.argv[0]).rsplit(".", 1)[0],
+            "metric": metric,
+            "values": {step: dict(timing, critical_path=paths[step][0], on_critical_path=step in critical)
+                       for step, timing in timings.items()},
+        }, ensure_ascii=False) + "\n")
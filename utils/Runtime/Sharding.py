@@ -0,0 +1,150 @@
+import hashlib
+import logging
+import os
+import time
+from functools import lru_cache
+from pathlib import Path
+from utils.Runtime.Arguments import get_module_args
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+def parse_shard(value):
+    """
+    Wandelt eine Angabe wie "2/4" in das Tupel (2, 4) um.
+    Shards werden ab 1 gezählt, d.h. gültig sind 1/N bis N/N.
+    """
+    try:
+        index, count = (int(part) for part in str(value).split("/"))
+    except ValueError:
+        raise ValueError(f"Ungültige Shard-Angabe '{value}', erwartet wird i/N.")
+    if count < 1 or not 1 <= index <= count:
+        raise ValueError(f"Ungültige Shard-Angabe '{value}', i muss zwischen 1 und N liegen.")
+    return index, count
+
+@lru_cache(maxsize=1)
+def get_shard():
+    """
+    Liefert den Shard dieses Prozesses als (i, N) oder None, wenn nicht geshardet wird.
+    """
+    value = get_module_args().shard
+    return parse_shard(value) if value else None
+
+def shard_of(key, count):
+    """
+    Ordnet einen Schlüssel (userId, UID oder Policy-Schlüssel) stabil einem Shard 1..N zu.
+    Der Hash ist unabhängig von Prozess und Host, Klammern und Groß-/Kleinschreibung
+    werden ignoriert, damit alle Module denselben Benutzer demselben Shard zuweisen.
+    """
+    normalized = str(key).strip().strip("{}").strip().lower()
+    digest = hashlib.sha1(normalized.encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "big") % count + 1
+
+def filter_shard(records, key, log=True):
+    """
+    Behält nur die Datensätze, deren Schlüssel zum Shard dieses Prozesses gehört.
+    Mit log=False entfällt die Meldung, z.B. wenn blockweise gefiltert wird.
+    """
+    shard = get_shard()
+    if shard is None:
+        return records
+    index, count = shard
+    selected = [record for record in records if shard_of(key(record), count) == index]
+    if log:
+        logging.info("Shard %d/%d: %d von %d Datensätzen.", index, count, len(selected), len(records))
+    return selected
+
+def shard_suffix():
+    """
+    Liefert den Dateinamen-Zusatz des aktuellen Shards, z.B. "_shard2of4".
+    """
+    shard = get_shard()
+    return f"_shard{shard[0]}of{shard[1]}" if shard else ""
+
+def get_target():
+    """
+    Name des Zielsystems, wenn targets.py denselben Lauf gegen mehrere Ziele ausführt, sonst None.
+    """
+    return os.environ.get("MIGRATION_TARGET") or None
+
+def shard_path(path):
+    """
+    Hängt den Shard-Zusatz an den Dateinamen an, damit sich Shards nicht gegenseitig überschreiben.
+    Bei mehreren Zielsystemen liegt die Datei zusätzlich in einem Unterverzeichnis pro Ziel.
+    """
+    path = Path(path)
+    target = get_target()
+    if target:
+        path = path.parent / target / path.name
+        path.parent.mkdir(parents=True, exist_ok=True)
+    return path.with_name(f"{path.stem}{shard_suffix()}{path.suffix}")
+
+def mark_done(marker):
+    """
+    Legt eine Markierungsdatei an, auf die andere Shards warten können.
+    """
+    marker = Path(marker)
+    marker.parent.mkdir(parents=True, exist_ok=True)
+    marker.touch()
+
+def wait_for(markers, timeout=None, poll_interval=5):
+    """
+    Wartet, bis alle Markierungsdateien existieren. Liefert False bei Zeitüberschreitung.
+    """
+    markers = [Path(m) for m in markers]
+    started = time.monotonic()
+    while not all(m.exists() for m in markers):
+        if timeout is not None and time.monotonic() - started > timeout:
+            return False
+        time.sleep(poll_interval)
+    return True
+
+def wait_for_any(markers, timeout=None, poll_interval=5):
+    """
+    Wartet, bis eine der Markierungsdateien existiert, und liefert sie.
+    Liefert None bei Zeitüberschreitung.
+    """
+    markers = [Path(m) for m in markers]
+    started = time.monotonic()
+    while True:
+        for marker in markers:
+            if marker.exists():
+                return marker
+        if timeout is not None and time.monotonic() - started > timeout:
+            return None
+        time.sleep(poll_interval)
+
+def clear_marker(marker):
+    """
+    Entfernt eine Markierungsdatei, z.B. die eines früheren Versuchs mit derselben Lauf-Kennung.
+    """
+    Path(marker).unlink(missing_ok=True)
+
+def mark_result(done, failed, ok):
+    """
+    Schreibt je nach Ergebnis die Markierung "erledigt" oder "fehlgeschlagen" und entfernt
+    die jeweils andere, z.B. aus einem früheren Versuch mit derselben Lauf-Kennung.
+    """
+    clear_marker(failed if ok else done)
+    mark_done(done if ok else failed)
+
+def shard_markers(directory, name, count):
+    """
+    Markierungen (erledigt, fehlgeschlagen) der Shards 1..count für einen gemeinsamen Zwischenstand,
+    z.B. "deletion_shard2of4.done" und "deletion_shard2of4.failed".
+    """
+    directory = Path(directory)
+    return [(directory / f"{name}_shard{i}of{count}.done", directory / f"{name}_shard{i}of{count}.failed")
+            for i in range(1, count + 1)]
+
+def wait_for_shards(markers, timeout=None, poll_interval=5):
+    """
+    Wartet, bis jeder Shard seine Markierung aus shard_markers geschrieben hat, insgesamt höchstens
+    timeout Sekunden. Liefert die Nummern der Shards, die fehlgeschlagen sind oder sich nicht gemeldet haben.
+    """
+    deadline = None if timeout is None else time.monotonic() + timeout
+    problems = []
+    for number, (done, failed) in enumerate(markers, start=1):
+        remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+        if wait_for_any([done, failed], remaining, poll_interval) != done:
+            problems.append(number)
+    return problems
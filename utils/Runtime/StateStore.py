@@ -0,0 +1,181 @@
+import atexit
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+from datetime import datetime
+from functools import lru_cache
+from pathlib import Path
+from utils.auth.Authentification import get_config
+from utils.Runtime.Arguments import get_module_args
+from utils.Runtime.Sharding import get_target
+
+# Lokale Zustandsdatenbank aller bisher migrierten Objekte
+STATE_DB = Path("_data/state/migration_state.sqlite")
+
+# Felder, die sich bei jedem Lauf ändern und nicht in den Hash eingehen
+VOLATILE_FIELDS = {"mutationDate"}
+
+# Anzahl Einträge, nach denen gesammelte Ergebnisse in die Datenbank geschrieben werden
+FLUSH_EVERY = 500
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+@lru_cache(maxsize=1)
+def _hash_key():
+    """
+    Schlüssel für die Payload-Hashes. Da auch Passwörter gehasht werden, dient das
+    Client-Secret als Schlüssel, damit die Datenbank keine knackbaren Hashes enthält.
+    """
+    return hashlib.sha256((get_config().client_secret or "").encode("utf-8")).digest()
+
+def payload_hash(payload, ignore=VOLATILE_FIELDS):
+    """
+    Bildet einen stabilen Hash über die Payload; Schlüsselreihenfolge und volatile Felder
+    spielen keine Rolle.
+    """
+    if isinstance(payload, dict):
+        payload = {k: v for k, v in payload.items() if k not in ignore}
+    canonical = json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.blake2b(canonical.encode("utf-8"), key=_hash_key(), digest_size=20).hexdigest()
+
+class StateStore:
+    """
+    SQLite-Datenbank mit Quell-ID, Server-ID, letztem Payload-Hash, Status und Zeitstempel
+    pro migriertem Objekt. Ergebnisse werden gesammelt und blockweise geschrieben;
+    mehrere Threads, Coroutinen und Shard-Prozesse können gleichzeitig darauf zugreifen.
+    """
+
+    def __init__(self, path=STATE_DB):
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.lock = threading.Lock()
+        self.pending = []
+        self.pending_deletes = []
+        self.connection = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute(
+            """CREATE TABLE IF NOT EXISTS entities (
+                   entity TEXT NOT NULL,
+                   source_id TEXT NOT NULL,
+                   server_id TEXT,
+                   payload_hash TEXT,
+                   status TEXT,
+                   updated_at TEXT,
+                   PRIMARY KEY (entity, source_id))"""
+        )
+        self.connection.commit()
+
+    def synced_hashes(self, entity):
+        """
+        Liefert {Quell-ID: Hash} aller zuletzt erfolgreich synchronisierten Objekte einer Art.
+        """
+        with self.lock:
+            rows = self.connection.execute(
+                "SELECT source_id, payload_hash FROM entities WHERE entity = ? AND status = 'Erfolgreich'",
+                (entity,),
+            ).fetchall()
+        return dict(rows)
+
+    def deleted_ids(self, entity):
+        """
+        Liefert Quell- und Server-IDs aller Objekte einer Art, die zuletzt gelöscht wurden.
+        """
+        with self.lock:
+            self._flush_locked()
+            rows = self.connection.execute(
+                "SELECT source_id, server_id FROM entities WHERE entity = ? AND status = 'Gelöscht'",
+                (entity,),
+            ).fetchall()
+        return {uid for row in rows for uid in row if uid}
+
+    def filter_changed(self, entity, records, key, payload=lambda record: record, known=None, log=True):
+        """
+        Entfernt alle Datensätze, deren Payload seit der letzten erfolgreichen Synchronisation
+        unverändert ist. Liefert die zu sendenden Datensätze und {Quell-ID: Hash} dazu.
+        Mit --full-sync wird nichts übersprungen, die Hashes werden aber trotzdem gebildet.
+        Wer blockweise filtert, übergibt die einmal gelesenen synced_hashes als known und log=False.
+        """
+        if known is None:
+            known = {} if get_module_args().full_sync else self.synced_hashes(entity)
+        changed, hashes = [], {}
+        for record in records:
+            source_id = str(key(record))
+            digest = payload_hash(payload(record))
+            if known.get(source_id) == digest:
+                continue
+            changed.append(record)
+            hashes[source_id] = digest
+        skipped = len(records) - len(changed)
+        if skipped and log:
+            logging.info("%d von %d Objekten (%s) unverändert seit der letzten Synchronisation, übersprungen.",
+                         skipped, len(records), entity)
+        return changed, hashes
+
+    def record(self, entity, source_id, digest, status, server_id=""):
+        """
+        Merkt sich das Ergebnis eines Requests; geschrieben wird blockweise.
+        """
+        with self.lock:
+            self.pending.append((entity, str(source_id), server_id or None, digest, status,
+                                 datetime.now().isoformat()))
+            if len(self.pending) >= FLUSH_EVERY:
+                self._flush_locked()
+
+    def record_result(self, entity, result, hashes, id_field="Benutzer-ID"):
+        """
+        Übernimmt eine Ergebniszeile im Format der Result-Workbooks.
+        """
+        source_id = str(result.get(id_field, ""))
+        self.record(entity, source_id, hashes.get(source_id), result.get("Status", ""))
+
+    def mark_deleted(self, entities, uid):
+        """
+        Markiert ein gelöschtes Objekt, damit es bei der nächsten Erstellung wieder gesendet wird.
+        Policies werden über die Server-ID gefunden, Benutzer und Kategorien über die Quell-ID.
+        """
+        uid = str(uid).strip().strip("{}")
+        with self.lock:
+            now = datetime.now().isoformat()
+            self.pending_deletes.extend((now, entity, uid, uid) for entity in entities)
+            if len(self.pending_deletes) >= FLUSH_EVERY:
+                self._flush_locked()
+
+    def flush(self):
+        with self.lock:
+            self._flush_locked()
+
+    def _flush_locked(self):
+        if not self.pending and not self.pending_deletes:
+            return
+        self.connection.executemany(
+            """INSERT INTO entities (entity, source_id, server_id, payload_hash, status, updated_at)
+               VALUES (?, ?, ?, ?, ?, ?)
+               ON CONFLICT (entity, source_id) DO UPDATE SET
+                   server_id = COALESCE(excluded.server_id, entities.server_id),
+                   payload_hash = excluded.payload_hash,
+                   status = excluded.status,
+                   updated_at = excluded.updated_at""",
+            self.pending,
+        )
+        self.connection.executemany(
+            # IDs aus den Exporten sind teils in geschweiften Klammern abgelegt
+            "UPDATE entities SET status = 'Gelöscht', updated_at = ? "
+            "WHERE entity = ? AND (trim(source_id, '{} ') = ? OR trim(server_id, '{} ') = ?)",
+            self.pending_deletes,
+        )
+        self.connection.commit()
+        self.pending = []
+        self.pending_deletes = []
+
+@lru_cache(maxsize=1)
+def get_state_store():
+    """
+    Liefert die Zustandsdatenbank des Prozesses; offene Einträge werden beim Beenden geschrieben.
+    Jedes Zielsystem (MIGRATION_TARGET) hat seine eigene Datenbank.
+    """
+    target = get_target()
+    store = StateStore(STATE_DB.with_name(f"{STATE_DB.stem}_{target}{STATE_DB.suffix}") if target else STATE_DB)
+    atexit.register(store.flush)
+    return store
@@ -0,0 +1,102 @@
+import gzip
+import json
+import os
+from utils.Runtime.CircuitBreaker import get_circuit_breaker
+from utils.Runtime.RateLimiter import get_rate_limiter
+
+# Timeouts in Sekunden pro Endpunkt-Klasse; überschreibbar mit MIGRATION_TIMEOUT_<KLASSE>
+ENDPOINT_TIMEOUTS = {
+    "token": 10,
+    "categories": 30,
+    "users": 30,
+    "serviceusers": 30,
+    "passwords": 10,
+    "program_policies": 60,
+    "mandant_policies": 60,
+}
+DEFAULT_TIMEOUT = 30
+
+# JSON-Bodies ab dieser Grösse in Bytes werden gzip-komprimiert gesendet (0 = nie komprimieren)
+GZIP_THRESHOLD = int(os.environ.get("MIGRATION_GZIP_THRESHOLD", 0))
+
+# Antworten, die auf einen gestörten Server hindeuten und den Circuit Breaker füttern
+FAILURE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+class TransportError(Exception):
+    """
+    Netzwerkfehler beim Senden mit request(); die Ursache (requests.RequestException)
+    steht in __cause__. So müssen die Aufrufer requests nicht selbst importieren.
+    """
+
+def get_timeout(endpoint):
+    """
+    Liefert den Timeout einer Endpunkt-Klasse in Sekunden.
+    """
+    override = os.environ.get(f"MIGRATION_TIMEOUT_{endpoint.upper()}")
+    return float(override) if override else ENDPOINT_TIMEOUTS.get(endpoint, DEFAULT_TIMEOUT)
+
+def compress_body(kwargs, threshold=GZIP_THRESHOLD):
+    """
+    Ersetzt einen json-Body ab der Schwelle durch den gzip-komprimierten Body mit
+    Content-Encoding-Header. Kleinere Bodies und andere Requests bleiben unverändert.
+    """
+    if not threshold or kwargs.get("json") is None:
+        return kwargs
+    body = json.dumps(kwargs["json"], ensure_ascii=False).encode("utf-8")
+    if len(body) < threshold:
+        return kwargs
+    kwargs = dict(kwargs)
+    del kwargs["json"]
+    kwargs["data"] = gzip.compress(body, compresslevel=5)
+    kwargs["headers"] = dict(kwargs.get("headers") or {}, **{
+        "Content-Encoding": "gzip",
+        "Content-Type": "application/json",
+    })
+    return kwargs
+
+def _record(breaker, status):
+    if status in FAILURE_STATUS_CODES:
+        breaker.record_failure(f"HTTP {status}")
+    else:
+        breaker.record_success()
+
+def request(method, url, endpoint, **kwargs):
+    """
+    Sendet einen Request mit requests über den gemeinsamen Circuit Breaker, den
+    Rate Limiter und mit dem Timeout der Endpunkt-Klasse. Liefert die Response; Netzwerkfehler werden
+    als TransportError weitergereicht, ein dauerhaft offener Breaker als CircuitOpenError.
+    """
+    # requests erst hier laden, damit der Import der Module schnell bleibt
+    import requests
+    breaker = get_circuit_breaker()
+    breaker.before_request()
+    get_rate_limiter().acquire(endpoint)
+    kwargs.setdefault("timeout", get_timeout(endpoint))
+    kwargs = compress_body(kwargs)
+    try:
+        response = requests.request(method, url, **kwargs)
+    except requests.RequestException as e:
+        breaker.record_failure(type(e).__name__)
+        raise TransportError(str(e)) from e
+    _record(breaker, response.status_code)
+    return response
+
+async def request_async(session, method, url, endpoint, **kwargs):
+    """
+    Asynchrones Gegenstück zu request() für aiohttp. Liefert (Status-Code, Antworttext).
+    """
+    # aiohttp erst hier laden; Module mit Thread-Sendern brauchen es nicht
+    import aiohttp
+    breaker = get_circuit_breaker()
+    await breaker.before_request_async()
+    await get_rate_limiter().acquire_async(endpoint)
+    kwargs.setdefault("timeout", aiohttp.ClientTimeout(total=get_timeout(endpoint)))
+    kwargs = compress_body(kwargs)
+    try:
+        async with session.request(method, url, **kwargs) as response:
+            text = await response.text()
+    except Exception as e:
+        breaker.record_failure(type(e).__name__)
+        raise
+    _record(breaker, response.status)
+    return response.status, text
@@ -0,0 +1,342 @@
+import argparse
+import gc
+import json
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from utils.Runtime.Arguments import get_module_args
+from utils.Runtime.InputCache import STEP_INPUTS, preload, read_json_column
+from utils.Runtime.LogQueue import setup_logging
+from utils.Runtime.Progress import format_duration, read_status
+from utils.Runtime.RateLimiter import GLOBAL_RATE_LIMIT, endpoint_rate
+from utils.Runtime.Sharding import filter_shard, get_shard, shard_path
+from utils.Runtime.StateStore import get_state_store
+
+# Ergebnis der Planung
+DATA_DIR = Path("_data")
+PLAN_FILE = DATA_DIR / "results/plan_creation.json"
+
+# Kostenmodell eines Requests ohne Messwerte: feste Antwortzeit plus Übertragung proportional zur Payload
+# (wie benchmarks/dispatch_makespan.py); überschreibbar mit --latency-ms bzw. --bytes-per-ms
+LATENCY_MS = float(os.environ.get("MIGRATION_PLAN_LATENCY_MS", 100))
+BYTES_PER_MS = float(os.environ.get("MIGRATION_PLAN_BYTES_PER_MS", 200))
+
+setup_logging()
+
+# Ein Encoder für alle Payloads; json.dumps mit Optionen baut für jeden Aufruf einen neuen
+ENCODER = json.JSONEncoder(ensure_ascii=False, default=str)
+
+def payload_bytes(payload):
+    """
+    Grösse des JSON-Bodys in Bytes.
+    """
+    return len(ENCODER.encode(payload).encode("utf-8"))
+
+def count_input(path):
+    """
+    Anzahl Einträge eines JSON-Exports vor dem Filtern der Lade-Funktion; über die
+    zwischengespeicherte ID-Spalte des Referenz-Index statt über den ganzen Export.
+    """
+    return len(read_json_column(path, "userId"))
+
+def select(records, key, skipped, entity=None, payload=lambda record: record, references=None, index=None):
+    """
+    Wendet die Auswahl der Module ohne Seiteneffekte an: Shard, Referenzprüfung (ohne Rejects-Datei)
+    und unveränderte Objekte laut Zustandsdatenbank. Zählt die Übersprungenen in skipped.
+    """
+    selected = filter_shard(records, key, log=False)
+    skipped["anderer Shard"] = len(records) - len(selected)
+    if references:
+        from utils.Validation.ReferenceIndex import find_invalid_references
+        rejected = set(find_invalid_references(selected, references, index)["Position"])
+        skipped["ungültige Referenzen"] = len(rejected)
+        selected = [record for pos, record in enumerate(selected) if pos not in rejected]
+    if entity:
+        store = get_state_store()
+        known = {} if get_module_args().full_sync else store.synced_hashes(entity)
+        # Ohne synchronisierte Objekte (z.B. beim ersten Lauf) muss nichts gehasht werden
+        if known:
+            changed, _ = store.filter_changed(entity, selected, key, payload=payload, known=known, log=False)
+            skipped["unverändert"] = len(selected) - len(changed)
+            selected = changed
+    return selected
+
+def summarize(records, key, payload, skipped, input_count):
+    sizes = [payload_bytes(payload(record)) for record in records]
+    return {
+        "input": input_count,
+        "records": len(records),
+        "requests": len(records),
+        "bytes": sum(sizes),
+        "max_bytes": max(sizes, default=0),
+        "skipped": skipped,
+        "ids": {str(key(record)) for record in records},
+    }
+
+def plan_categories(index):
+    from utils.Creation.CreateCategory import JSON_FILE, load_and_filter_categories
+    from utils.Runtime.InputCache import read_json_frame
+    categories = load_and_filter_categories()
+    skipped = {"ausgeschlossen oder doppelt": len(read_json_frame(JSON_FILE)) - len(categories)}
+    shard = get_shard()
+    if shard and shard[0] != 1:
+        # Kategorien erstellt nur Shard 1
+        skipped["anderer Shard"], categories = len(categories), []
+    key = lambda category: category["userCategoryId"]
+    store = get_state_store()
+    known = {} if get_module_args().full_sync else store.synced_hashes("category")
+    if known:
+        changed, _ = store.filter_changed("category", categories, key, known=known, log=False)
+        skipped["unverändert"], categories = len(categories) - len(changed), changed
+    return summarize(categories, key, lambda category: category, skipped, len(categories) + sum(skipped.values()))
+
+def plan_users(index):
+    from utils.Creation.CreateUsers import JSON_FILE, load_and_filter_users
+    from utils.Validation.ReferenceIndex import USER_REFERENCES
+    key = lambda user: user["userId"]
+    users = load_and_filter_users()
+    input_count = count_input(JSON_FILE)
+    skipped = {"ausgeschlossen oder doppelt": input_count - len(users)}
+    users = select(users, key, skipped, "user", references=USER_REFERENCES, index=index)
+    return summarize(users, key, lambda user: user, skipped, input_count)
+
+def plan_service_users(index):
+    from utils.Creation.CreateServiceUsers import JSON_FILE, clean_user_data, load_and_filter_users
+    from utils.Validation.ReferenceIndex import USER_REFERENCES
+    key = lambda user: user["userId"]
+    users = load_and_filter_users()
+    input_count = count_input(JSON_FILE)
+    skipped = {"ausgeschlossen oder doppelt": input_count - len(users)}
+    users = select(users, key, skipped, "serviceuser", references=USER_REFERENCES, index=index)
+    return summarize(users, key, lambda user: clean_user_data(dict(user)), skipped, input_count)
+
+def plan_passwords(index):
+    from utils.Modification.ModifyPassword import EXCEL_FILE, encode_password, password_key, password_payload
+    from utils.Runtime.ExcelStream import stream_chunks
+    # Blockweise wie ModifyPassword und nur im Speicher: Klartext-Passwörter kommen nie in den Cache
+    rows, input_count = [], 0
+    for chunk in stream_chunks(EXCEL_FILE, ["UserId", "Password"]):
+        input_count += len(chunk)
+        # update_password lehnt Zeilen ohne UserId oder Passwort ab, ohne einen Request zu senden
+        rows.extend(row for row in chunk if password_key(row) and password_payload(row)["password"])
+    skipped = {"unvollständig": input_count - len(rows)}
+    rows = select(rows, password_key, skipped, "user_password", payload=password_payload)
+    return summarize(rows, password_key, lambda row: encode_password(password_payload(row)["password"]), skipped, input_count)
+
+def plan_modify_users(index):
+    from utils.Modification.ModifyUsers import (
+        JSON_FILE, load_and_prepare_users, limited_payload, plan_application_limits
+    )
+    from utils.Validation.ReferenceIndex import USER_REFERENCES
+    key = lambda user: user["userId"]
+    users = load_and_prepare_users()
+    input_count = count_input(JSON_FILE)
+    skipped = {"ausgeschlossen oder doppelt": input_count - len(users)}
+    limited = plan_application_limits(users)
+    payload = lambda user: limited_payload(user, limited)
+    users = select(users, key, skipped, "user_modify", payload=payload, references=USER_REFERENCES, index=index)
+    return summarize(users, key, payload, skipped, input_count)
+
+def plan_policies(module, build, entity, index):
+    """
+    Gemeinsamer Ablauf beider Policy-Module: Zeilen bauen, inhaltsgleiche zusammenfassen, auswählen.
+    """
+    from utils.Creation.PolicyDedup import deduplicate_policies
+    from utils.Runtime.InputCache import read_excel
+    from utils.Validation.ReferenceIndex import POLICY_REFERENCES, policy_key
+    policies = build(read_excel(module.EXCEL_FILE), module.COLUMN_MAPPING)
+    input_count = len(policies)
+    # Ohne Zuordnungsdatei: die Planung schreibt keine Ergebnisdateien der Module
+    policies = [policies[pos] for pos in deduplicate_policies(policies)]
+    skipped = {"zusammengefasst": input_count - len(policies)}
+    policies = select(policies, policy_key, skipped, entity, references=POLICY_REFERENCES, index=index)
+    return summarize(policies, policy_key, lambda policy: policy, skipped, input_count)
+
+def plan_program_policies(index):
+    from utils.Creation import CreateProgramPolicy
+    return plan_policies(CreateProgramPolicy, CreateProgramPolicy.build_programm_policies, "program_policy", index)
+
+def plan_client_policies(index):
+    from utils.Creation import CreateClientPolicy
+    return plan_policies(CreateClientPolicy, CreateClientPolicy.build_mandant_policies, "mandant_policy", index)
+
+def concurrency(module_path):
+    """
+    Gleichzeitige Requests, mit denen das Modul sendet (aus seinen Konstanten).
+    """
+    from importlib import import_module
+    module = import_module(module_path)
+    for name in ("MAX_PARALLEL_USERS", "MAX_WORKERS", "MAX_PARALLEL_REQUESTS"):
+        if hasattr(module, name):
+            return getattr(module, name)
+    # CreateCategory und CreateClientPolicy senden nacheinander
+    return 1
+
+# Pro Schritt: Planungsfunktion, Fortschritts-Schritt (für Messwerte) und Endpunkt-Klasse (für die Drosselung)
+STEP_PLANS = {
+    "utils.Creation.CreateCategory": (plan_categories, "create_categories", "categories"),
+    "utils.Creation.CreateServiceUsers": (plan_service_users, "create_serviceusers", "serviceusers"),
+    "utils.Creation.CreateUsers": (plan_users, "create_users", "users"),
+    "utils.Modification.ModifyPassword": (plan_passwords, "modify_passwords", "passwords"),
+    "utils.Modification.ModifyUsers": (plan_modify_users, "modify_users", "users"),
+    "utils.Creation.CreateProgramPolicy": (plan_program_policies, "create_programpolicies", "program_policies"),
+    "utils.Creation.CreateClientPolicy": (plan_client_policies, "create_clientpolicies", "mandant_policies"),
+}
+# Die kombinierte Pipeline sendet dieselben Payloads wie die drei Benutzer-Module
+FUSED_MODULE = "utils.Creation.ProvisionUsers"
+FUSED_PARTS = ["utils.Creation.CreateUsers", "utils.Modification.ModifyPassword", "utils.Modification.ModifyUsers"]
+
+def run_plan(module, index, with_ids):
+    """
+    Plan eines Schritts, auch im Worker-Prozess; die Menge der IDs braucht nur der kombinierte Plan.
+    """
+    started = time.monotonic()
+    # Millionen kurzlebiger dicts ohne Zyklen: die zyklische Speicherbereinigung würde den Heap
+    # dabei immer wieder durchsuchen, freigegeben wird ohnehin über die Referenzzählung
+    gc.disable()
+    try:
+        plan = STEP_PLANS[module][0](index)
+    finally:
+        gc.enable()
+    logging.info("Plan für %s erstellt in %.1f s.", STEP_PLANS[module][1], time.monotonic() - started)
+    if not with_ids:
+        del plan["ids"]
+    return plan
+
+def plan_fused(parts):
+    """
+    Plan von ProvisionUsers aus den Plänen der drei Benutzer-Module: ein Auftrag pro Benutzer,
+    dessen Stufen nacheinander laufen.
+    """
+    ids = set().union(*(part["ids"] for part in parts))
+    skipped = {}
+    for part in parts:
+        for reason, count in part["skipped"].items():
+            skipped[reason] = skipped.get(reason, 0) + count
+    return {
+        "input": sum(part["input"] for part in parts),
+        "records": len(ids),
+        "requests": sum(part["requests"] for part in parts),
+        "bytes": sum(part["bytes"] for part in parts),
+        # Längste Kette: Erstellen, Passwort und Ändern desselben Benutzers nacheinander
+        "max_bytes": sum(part["max_bytes"] for part in parts),
+        "max_requests": len(parts),
+        "skipped": skipped,
+        "ids": ids,
+    }
+
+def measured_rates(run_id):
+    """
+    Durchsatz (Datensätze pro Sekunde) je Schritt aus den Statusdateien eines früheren Laufs, alle Shards zusammen.
+    """
+    totals = {}
+    for status in read_status(run_id):
+        done, elapsed = totals.get(status["step"], (0, 0.0))
+        totals[status["step"]] = (done + status["done"], max(elapsed, status["elapsed"]))
+    return {step: done / elapsed for step, (done, elapsed) in totals.items() if done and elapsed > 0}
+
+def estimate(plan, workers, endpoint, latency_ms, bytes_per_ms, rate=None, global_rate=0.0):
+    """
+    Geschätzte Dauer eines Schritts in Sekunden. Mit gemessenem Durchsatz: Datensätze / Durchsatz.
+    Sonst verteilen sich die Requests (Antwortzeit + Payload / bytes_per_ms) auf workers parallele
+    Sender; der längste einzelne Request bzw. die konfigurierte Drosselung setzen die Untergrenze.
+    """
+    if rate:
+        return plan["records"] / rate
+    total_ms = plan["requests"] * latency_ms + plan["bytes"] / bytes_per_ms
+    longest_ms = plan.get("max_requests", 1) * latency_ms + plan["max_bytes"] / bytes_per_ms if plan["requests"] else 0.0
+    seconds = max(total_ms / workers, longest_ms) / 1000
+    for limit in (endpoint_rate(endpoint), global_rate):
+        if limit > 0:
+            seconds = max(seconds, plan["requests"] / limit)
+    return seconds
+
+def plan_steps(modules, dependencies, max_parallel, measured_run=None, latency_ms=LATENCY_MS,
+               bytes_per_ms=BYTES_PER_MS):
+    """
+    Lädt und transformiert die Eingaben aller Schritte wie im echten Lauf, sendet aber nichts.
+    Gibt pro Schritt Datensätze, Payload-Bytes, Übersprungene und geschätzte Dauer aus, plant die
+    Schritte wie creation.py nach ihren Abhängigkeiten ein und liefert die Pläne.
+    """
+    from utils.Runtime.Scheduler import report_schedule, simulate_graph
+    from utils.Validation.ReferenceIndex import INDEX_INPUTS, build_reference_index
+    started = time.monotonic()
+    preload([spec for module in modules for spec in STEP_INPUTS.get(module, [])] + INDEX_INPUTS, block=True)
+    index = build_reference_index()
+    rates = measured_rates(measured_run) if measured_run else {}
+    # Das globale Request-Budget teilen sich die parallelen Schritte wie bei share_rate_budget
+    global_rate = GLOBAL_RATE_LIMIT / max_parallel if max_parallel > 1 else GLOBAL_RATE_LIMIT
+    fused = FUSED_MODULE in modules
+    needed = list(dict.fromkeys(part for module in modules for part in (FUSED_PARTS if module == FUSED_MODULE else [module])))
+    processes = min(len(needed), os.cpu_count() or 1)
+    if processes > 1:
+        # Die Schritte sind unabhängig: jeder lädt und transformiert in einem eigenen Prozess
+        # ("spawn", damit die Prozesse ihre eigene Log-Queue aufsetzen)
+        with ProcessPoolExecutor(max_workers=processes, mp_context=multiprocessing.get_context("spawn")) as executor:
+            futures = {module: executor.submit(run_plan, module, index, fused) for module in needed}
+        computed = {module: future.result() for module, future in futures.items()}
+    else:
+        computed = {module: run_plan(module, index, fused) for module in needed}
+    plans = {}
+    for module in modules:
+        if module == FUSED_MODULE:
+            plan, progress_step, endpoint = plan_fused([computed[part] for part in FUSED_PARTS]), "provision_users", "users"
+        else:
+            plan = computed[module]
+            _, progress_step, endpoint = STEP_PLANS[module]
+        workers = concurrency(module)
+        rate = rates.get(progress_step)
+        plan = {key: value for key, value in plan.items() if key != "ids"}
+        plan.update(step=progress_step, concurrency=workers, source="gemessen" if rate else "Modell",
+                    estimate_seconds=estimate(plan, workers, endpoint, latency_ms, bytes_per_ms, rate, global_rate))
+        plans[module] = plan
+
+    print(f"\n--- Plan ({'gemessen: ' + measured_run if measured_run else f'Modell: {latency_ms:.0f} ms + Payload / {bytes_per_ms:.0f} Bytes pro ms'}) ---")
+    print(f"{'Schritt':<24} {'Eingabe':>9} {'Senden':>9} {'Requests':>9} {'MB':>8} {'Parallel':>8} "
+          f"{'Dauer':>9}  Übersprungen")
+    for plan in plans.values():
+        skipped = ", ".join(f"{count} {reason}" for reason, count in plan["skipped"].items() if count)
+        print(f"{plan['step']:<24} {plan['input']:>9} {plan['records']:>9} {plan['requests']:>9} "
+              f"{plan['bytes'] / 1e6:>8.1f} {plan['concurrency']:>8} {format_duration(plan['estimate_seconds']):>9}"
+              f"  {skipped or '-'}")
+    timings = simulate_graph(modules, dependencies, {module: plans[module]["estimate_seconds"] for module in modules},
+                             max_parallel)
+    report_schedule(timings, dependencies, metric="plan_schedule")
+    wall = max((timing["start"] + timing["duration"] for timing in timings.values()), default=0.0)
+    logging.info("Geschätzte Gesamtdauer %s bei --max-parallel %d; Planung dauerte %.1f s.",
+                 format_duration(wall), max_parallel, time.monotonic() - started)
+    result = {"time": datetime.now().isoformat(), "measured_run": measured_run, "latency_ms": latency_ms,
+              "bytes_per_ms": bytes_per_ms, "max_parallel": max_parallel, "estimate_seconds": wall,
+              "steps": plans}
+    try:
+        path = shard_path(PLAN_FILE)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps(result, indent=2, ensure_ascii=False), encoding="utf-8")
+        logging.info("Plan gespeichert in '%s'", path)
+    except OSError as e:
+        logging.error("Fehler beim Speichern des Plans: %s", e)
+    return result
+
+def main():
+    """
+    Plant den Erstellungs-Workflow, ohne etwas zu senden; entspricht python creation.py --plan.
+    """
+    from creation import STEP_DEPENDENCIES, select_modules
+    from utils.Runtime.Scheduler import MAX_PARALLEL_STEPS
+    parser = argparse.ArgumentParser(description="Payloads aller Schritte bauen und die Laufzeit schätzen, ohne zu senden")
+    parser.add_argument("--fused", action="store_true", help="Plan für creation.py --fused")
+    parser.add_argument("--max-parallel", type=int, default=MAX_PARALLEL_STEPS)
+    parser.add_argument("--measured-run", help="Durchsatz je Schritt aus den Statusdateien dieses Laufs verwenden")
+    parser.add_argument("--latency-ms", type=float, default=LATENCY_MS, help="Antwortzeit pro Request im Modell")
+    parser.add_argument("--bytes-per-ms", type=float, default=BYTES_PER_MS, help="Übertragungsrate im Modell")
+    args, _ = parser.parse_known_args()
+    os.environ.setdefault("MIGRATION_RUN_ID", datetime.now().strftime("plan-%Y%m%d-%H%M%S"))
+    plan_steps(select_modules(args.fused), STEP_DEPENDENCIES, args.max_parallel, args.measured_run,
+               args.latency_ms, args.bytes_per_ms)
+
+if __name__ == "__main__":
+    main()
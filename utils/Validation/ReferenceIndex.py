@@ -0,0 +1,185 @@
+import hashlib
+import json
+import logging
+import pandas as pd
+from functools import lru_cache
+from pathlib import Path
+from utils.auth.Authentification import get_auth_headers, get_base_url
+from utils.Runtime.InputCache import read_json_column
+from utils.Runtime.Sharding import shard_path
+from utils.Runtime.Transport import request, TransportError
+from utils.Runtime.CircuitBreaker import CircuitOpenError
+
+# Quellen für den lokalen Referenz-Index
+DATA_DIR = Path("_data")
+CATEGORY_FILE = DATA_DIR / "OBT_Export_Create_Categories.json"
+USER_FILES = [
+    DATA_DIR / "OBT_Export_Create_Users.json",
+    DATA_DIR / "OBT_Export_Create_ServiceUsers.json",
+    DATA_DIR / "OBT_Export_Modify_Users.json",
+]
+# Eingaben des Index im Format von InputCache.STEP_INPUTS, z.B. zum Vorladen
+INDEX_INPUTS = ([("json_column", CATEGORY_FILE, {"column": "userCategoryId"})]
+                + [("json_column", filepath, {"column": "userId"}) for filepath in USER_FILES])
+EXCLUDE_ID = "00000000-0000-0000-0000-000000000000"
+API_BASE = "/api/provisioning-users/v1"
+
+# Zusätzlich die bereits auf dem Server vorhandenen Kategorien und Benutzer einlesen
+USE_SERVER_INDEX = False
+
+# Welche Felder worauf verweisen (Feld → Art der Referenz)
+USER_REFERENCES = {"defaultUserCategory": "categories", "userCategories": "categories"}
+POLICY_REFERENCES = {"userCategories": "categories", "users": "users"}
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+def normalize_ids(series):
+    """
+    Vereinheitlicht IDs für den Vergleich: ohne geschweifte Klammern, Leerzeichen und Großschreibung.
+    """
+    return series.astype(str).str.strip().str.strip("{}").str.strip().str.lower()
+
+def read_export_ids(filepath, column):
+    """
+    Liest alle IDs einer Spalte aus einem JSON-Export.
+    Liefert None, wenn die Datei nicht gelesen werden kann.
+    """
+    try:
+        # Aus dem Eingabe-Cache: nur die ID-Spalte, nicht der ganze Export
+        ids = pd.Series(read_json_column(filepath, column), dtype=object).dropna()
+        return set(normalize_ids(ids))
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        logging.error("Fehler beim Lesen von '%s' für den Referenz-Index: %s", filepath, e)
+        return None
+
+def fetch_collection(path, endpoint):
+    """
+    Liest eine Collection der API vollständig und liefert die enthaltenen Objekte.
+    Folgt Paging-Links, falls der Server welche liefert.
+    """
+    headers = get_auth_headers()
+    if not headers:
+        logging.error("Collection '%s' nicht lesbar: Kein gültiger Token erhalten.", path)
+        return []
+    url = f"{get_base_url()}{API_BASE}{path}"
+    items = []
+    while url:
+        try:
+            response = request("GET", url, endpoint, headers=headers)
+        except (TransportError, CircuitOpenError) as e:
+            logging.error("Netzwerkfehler beim Lesen von '%s': %s", url, e)
+            break
+        if response.status_code != 200:
+            logging.error("Fehler beim Lesen von '%s': %s - %s", url, response.status_code, response.text)
+            break
+        body = response.json()
+        items.extend(body if isinstance(body, list) else body.get("value", body.get("items", [])))
+        url = (body.get("@odata.nextLink") or body.get("nextLink")) if isinstance(body, dict) else None
+    return items
+
+def fetch_server_ids(path, id_fields, endpoint):
+    """
+    Liest eine Collection der API und liefert die IDs der enthaltenen Objekte.
+    """
+    ids = set()
+    for item in fetch_collection(path, endpoint):
+        for field in id_fields:
+            if item.get(field):
+                ids.add(item[field])
+                break
+    return set(normalize_ids(pd.Series(list(ids), dtype=object)))
+
+@lru_cache(maxsize=1)
+def build_reference_index():
+    """
+    Baut den Referenz-Index aus dem Kategorien-Export, den Benutzer-Exporten und
+    optional dem Server. Eine Referenzart ohne lesbare Quelle wird mit None markiert
+    und später nicht geprüft, damit ein fehlender Export nicht alle Datensätze verwirft.
+    """
+    categories = read_export_ids(CATEGORY_FILE, "userCategoryId")
+    users = None
+    for filepath in USER_FILES:
+        ids = read_export_ids(filepath, "userId")
+        if ids is not None:
+            users = (users or set()) | ids
+    if USE_SERVER_INDEX:
+        categories = (categories or set()) | fetch_server_ids("/categories", ["userCategoryId", "id"], "categories")
+        users = (users or set()) | fetch_server_ids("/users", ["userId", "id"], "users")
+    index = {"categories": categories, "users": users}
+    for kind, ids in index.items():
+        if ids is None:
+            logging.warning("Keine Quelle für '%s' gefunden, Referenzen werden nicht geprüft.", kind)
+        else:
+            logging.info("Referenz-Index '%s': %d Einträge.", kind, len(ids))
+    return index
+
+def find_invalid_references(records, checks, index=None):
+    """
+    Prüft alle Datensätze in einem vektorisierten Durchlauf gegen den Referenz-Index.
+    Liefert ein DataFrame mit Position, Feld und den fehlenden Referenzen je Verstoss.
+    """
+    index = index or build_reference_index()
+    columns = ["Position", "Feld", "Fehlende Referenzen"]
+    if not records:
+        return pd.DataFrame(columns=columns)
+    problems = []
+    for field, kind in checks.items():
+        known = index.get(kind)
+        if known is None:
+            continue
+        # Listen- und Einzelwerte auf eine Referenz pro Zeile auffalten
+        values = pd.Series([record.get(field) for record in records], dtype=object).explode().dropna()
+        values = normalize_ids(values)
+        values = values[(values != "") & (values != "nan") & (values != EXCLUDE_ID)]
+        missing = values[~values.isin(known)]
+        if missing.empty:
+            continue
+        grouped = missing.groupby(level=0).agg(lambda refs: ", ".join(dict.fromkeys(refs)))
+        problems.append(pd.DataFrame({"Position": grouped.index, "Feld": field, "Fehlende Referenzen": grouped.values}))
+    if not problems:
+        return pd.DataFrame(columns=columns)
+    return pd.concat(problems, ignore_index=True).sort_values("Position", kind="stable")
+
+def write_rejects(records, invalid, rejects_file, label):
+    """
+    Schreibt die abgelehnten Datensätze mit Begründung in die Rejects-Datei
+    und liefert die Menge der abgelehnten Positionen.
+    """
+    if invalid.empty:
+        return set()
+    invalid = invalid.copy()
+    invalid.insert(1, "Datensatz", [label(records[pos]) for pos in invalid["Position"]])
+    rejects_file = shard_path(rejects_file)
+    try:
+        invalid.to_excel(rejects_file, index=False)
+        logging.warning("%d Datensätze mit ungültigen Referenzen gespeichert in '%s'",
+                        invalid["Position"].nunique(), rejects_file)
+    except Exception as e:
+        logging.error("Fehler beim Speichern der Rejects: %s", e)
+    return set(invalid["Position"])
+
+def reject_invalid_references(records, checks, rejects_file, label):
+    """
+    Entfernt Datensätze mit ungültigen Referenzen vor dem Versand
+    und schreibt sie in die Rejects-Datei.
+    """
+    rejected = write_rejects(records, find_invalid_references(records, checks), rejects_file, label)
+    return [record for pos, record in enumerate(records) if pos not in rejected]
+
+def policy_label(policy):
+    """
+    Liefert den deutschen Namen einer Policy für Logging und Rejects.
+    """
+    return policy.get("name", {}).get("data", {}).get("de", "Unbekannt")
+
+def policy_key(policy):
+    """
+    Stabile Kennung einer Policy aus ihrem Inhalt (ohne mutationDate). Der deutsche Name ist
+    weder eindeutig noch immer gesetzt; Zustandsdatenbank, Journal und Replay verwenden daher diesen Schlüssel.
+    """
+    from utils.Runtime.StateStore import VOLATILE_FIELDS
+    content = {key: value for key, value in policy.items() if key not in VOLATILE_FIELDS}
+    canonical = json.dumps(content, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha1(canonical.encode("utf-8")).hexdigest()[:16]
@@ -0,0 +1,199 @@
+import asyncio
+import json
+import logging
+import aiohttp
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from utils.auth.Authentification import get_auth_headers, get_base_url
+from utils.Creation import CreateUsers, CreateServiceUsers, CreateCategory, CreateProgramPolicy, CreateClientPolicy
+from utils.Creation.PolicyRanges import canonical_range
+from utils.Modification import ModifyUsers
+from utils.Validation.ReferenceIndex import API_BASE, fetch_collection, policy_label
+from utils.Runtime.Transport import request_async
+from utils.Runtime.CircuitBreaker import CircuitOpenError
+from utils.Runtime.StateStore import VOLATILE_FIELDS
+from utils.Runtime.Sharding import shard_path
+from utils.Runtime.LogQueue import setup_logging
+from utils.Runtime.InputCache import read_excel
+
+# Ergebnis der Prüfung
+DATA_DIR = Path("_data")
+REPORT_FILE = DATA_DIR / "results/verification_report.xlsx"
+
+# Anzahl gleichzeitiger Lese-Requests für einzeln abgefragte Benutzer
+MAX_PARALLEL_READS = 20
+
+# Felder, die der Server nicht zurückliefert oder die sich bei jedem Lauf ändern
+IGNORED_FIELDS = VOLATILE_FIELDS | {"password"}
+
+MISSING = "<fehlt>"
+
+setup_logging()
+
+def canonical_value(value):
+    """
+    Bringt einen Feldwert in eine vergleichbare Textform: Listen unabhängig von der
+    Reihenfolge, range-Felder kanonisch, Zahlen und Wahrheitswerte einheitlich.
+    """
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, dict):
+        value = {
+            key: canonical_range(str(item).split(","), canonical=True) if key == "range" else canonical_value(item)
+            for key, item in value.items() if key not in IGNORED_FIELDS
+        }
+        return json.dumps(value, sort_keys=True, ensure_ascii=False)
+    if isinstance(value, (list, tuple)):
+        return json.dumps(sorted(canonical_value(item) for item in value), ensure_ascii=False)
+    if value is None or (isinstance(value, float) and np.isnan(value)):
+        return ""
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value).strip()
+
+def canonical_column(values):
+    """
+    Wendet canonical_value auf eine Spalte an. Bei hashbaren Werten wird jeder
+    unterschiedliche Wert nur einmal umgewandelt; fehlende Felder bleiben leer.
+    """
+    present = values.notna()
+    try:
+        uniques = values[present].unique()
+    except TypeError:
+        # Listen und Objekte sind nicht hashbar
+        return values.where(~present, values[present].map(canonical_value))
+    return values.map(dict(zip(uniques, map(canonical_value, uniques))))
+
+def flatten(records, key):
+    """
+    Wandelt Objekte in eine lange Tabelle (Schlüssel, Feld, Wert) um; verschachtelte
+    Objekte werden zu Feldern wie name.data.de. Fehlende Felder entfallen.
+    """
+    if not records:
+        return pd.DataFrame(columns=["Schlüssel", "Feld", "Wert"])
+    df = pd.json_normalize(records)
+    df = df[[column for column in df.columns if column.split(".")[0] not in IGNORED_FIELDS]]
+    df = df.apply(canonical_column)
+    df.insert(0, "Schlüssel", [key(record) for record in records])
+    long = df.melt(id_vars="Schlüssel", var_name="Feld", value_name="Wert")
+    # Nur Felder vergleichen, die im jeweiligen Objekt tatsächlich vorkommen
+    return long.dropna(subset=["Wert"]).reset_index(drop=True)
+
+def compare(kind, expected_records, actual_records, key):
+    """
+    Vergleicht erwartete und gelesene Objekte Feld für Feld über einen Join auf (Schlüssel, Feld).
+    Liefert die Abweichungen als DataFrame.
+    """
+    expected = flatten(expected_records, key)
+    actual = flatten(actual_records, key).drop_duplicates(["Schlüssel", "Feld"])
+    actual_keys = set(actual["Schlüssel"])
+    expected_keys = pd.Series(list(dict.fromkeys(expected["Schlüssel"])), dtype=object)
+    missing = expected_keys[~expected_keys.isin(actual_keys)]
+    merged = expected.merge(actual, on=["Schlüssel", "Feld"], how="left", suffixes=(" erwartet", " Server"))
+    merged = merged[merged["Schlüssel"].isin(actual_keys)]
+    merged["Wert Server"] = merged["Wert Server"].fillna(MISSING)
+    different = merged[merged["Wert erwartet"] != merged["Wert Server"]]
+    report = pd.concat([
+        pd.DataFrame({"Schlüssel": missing, "Feld": "", "Erwartet": "", "Server": "", "Abweichung": "Fehlt auf Server"}),
+        pd.DataFrame({
+            "Schlüssel": different["Schlüssel"],
+            "Feld": different["Feld"],
+            "Erwartet": different["Wert erwartet"],
+            "Server": different["Wert Server"],
+            "Abweichung": "Abweichend",
+        }),
+    ], ignore_index=True)
+    report.insert(0, "Objektart", kind)
+    logging.info("%s: %d erwartet, %d fehlen, %d Objekte mit abweichenden Feldern.", kind,
+                 len(expected_keys), len(missing), different["Schlüssel"].nunique())
+    return report
+
+def normalize_key(value):
+    """
+    Schlüssel wie in normalize_ids, aber für einzelne Werte.
+    """
+    return str(value).strip().strip("{}").strip().lower()
+
+def user_key(user):
+    return normalize_key(user.get("userId", ""))
+
+def category_key(category):
+    return normalize_key(category.get("userCategoryId", ""))
+
+def expected_users():
+    """
+    Erwarteter Endzustand der Benutzer: Erstellungs-Payload, überschrieben mit der Änderungs-Payload.
+    """
+    users = {user_key(user): dict(user) for user in CreateUsers.load_and_filter_users()}
+    for user in ModifyUsers.load_and_prepare_users():
+        payload = ModifyUsers.apply_application_limits(ModifyUsers.remove_empty_values(user))
+        users.setdefault(user_key(payload), {}).update(payload)
+    return list(users.values())
+
+async def fetch_users(user_ids, headers):
+    """
+    Liest Benutzer einzeln mit begrenzter Parallelität; nicht gefundene fehlen im Ergebnis.
+    """
+    semaphore = asyncio.Semaphore(MAX_PARALLEL_READS)
+    url = f"{get_base_url()}{API_BASE}/users"
+
+    async def fetch(session, user_id):
+        async with semaphore:
+            try:
+                status, text = await request_async(session, "GET", f"{url}/{user_id}", "users", headers=headers)
+            except CircuitOpenError as e:
+                logging.error("Benutzer '%s' nicht gelesen: %s", user_id, e)
+                return None
+            except Exception as e:
+                logging.error("Netzwerkfehler beim Lesen von Benutzer '%s': %s", user_id, e)
+                return None
+            if status != 200:
+                if status != 404:
+                    logging.error("Fehler beim Lesen von Benutzer '%s': %s - %s", user_id, status, text)
+                return None
+            return json.loads(text)
+
+    connector = aiohttp.TCPConnector(limit=MAX_PARALLEL_READS)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        users = await asyncio.gather(*(fetch(session, user_id) for user_id in user_ids))
+    return [user for user in users if user]
+
+async def main_async():
+    headers = get_auth_headers()
+    if not headers:
+        logging.error("Abbruch: Kein gültiger Token erhalten.")
+        return
+    reports = []
+
+    users = expected_users()
+    service_users = [CreateServiceUsers.clean_user_data(user) for user in CreateServiceUsers.load_and_filter_users()]
+    server_users = await fetch_users([user["userId"] for user in users], headers)
+    reports.append(compare("Benutzer", users, server_users, user_key))
+    server_service_users = await fetch_users([user["userId"] for user in service_users], headers)
+    reports.append(compare("Service-Benutzer", service_users, server_service_users, user_key))
+
+    reports.append(compare("Kategorien", CreateCategory.load_and_filter_categories(),
+                           fetch_collection("/categories", "categories"), category_key))
+
+    program_policies = CreateProgramPolicy.build_programm_policies(
+        read_excel(CreateProgramPolicy.EXCEL_FILE), CreateProgramPolicy.COLUMN_MAPPING)
+    reports.append(compare("Programm-Policies", program_policies,
+                           fetch_collection("/policies/programs", "program_policies"), policy_label))
+    mandant_policies = CreateClientPolicy.build_mandant_policies(
+        read_excel(CreateClientPolicy.EXCEL_FILE), CreateClientPolicy.COLUMN_MAPPING)
+    reports.append(compare("Mandanten-Policies", mandant_policies,
+                           fetch_collection("/policies/mandants", "mandant_policies"), policy_label))
+
+    report = pd.concat(reports, ignore_index=True)
+    try:
+        report.to_excel(shard_path(REPORT_FILE), index=False)
+        logging.info("Prüfbericht mit %d Abweichungen gespeichert in '%s'", len(report), shard_path(REPORT_FILE))
+    except Exception as e:
+        logging.error("Fehler beim Speichern des Prüfberichts: %s", e)
+
+def main():
+    asyncio.run(main_async())
+
+if __name__ == "__main__":
+    main()
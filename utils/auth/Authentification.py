@@ -1,11 +1,21 @@
-import requests
 import base64
 import logging
+import os
+import time
+from functools import lru_cache
+
+# Zugangsdaten; der Pfad kann mit MIGRATION_CLIENT_SECRET_FILE überschrieben werden
+CLIENT_SECRET_FILE = "utils/auth/ClientSecret.txt"
+
+# Timeout in Sekunden für den Token-Request
+TOKEN_TIMEOUT = 10
+# Alter in Sekunden, ab dem ein langlebiger Prozess den Token neu holt
+TOKEN_MAX_AGE = int(os.environ.get("MIGRATION_TOKEN_MAX_AGE", 1800))
 
 # Konfiguriere das Logging-Format für alle Ausgaben
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
 
-def read_client_credentials(file_path="utils/auth/ClientSecret.txt"):
+def read_client_credentials(file_path=CLIENT_SECRET_FILE):
     """
     Liest Client-ID, Client-Secret und Basis-URL aus einer Textdatei im gegebenen Pfad.
     Die Datei muss mindestens drei Zeilen enthalten:
@@ -30,13 +40,42 @@ def read_client_credentials(file_path="utils/auth/ClientSecret.txt"):
         logging.error("Fehler beim Lesen der Datei '%s': %s", file_path, e)
         return None, None, None
 
+class Config:
+    """
+    Zugangsdaten und Basis-URL der API.
+    """
+
+    def __init__(self, client_id, client_secret, base_url):
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self.base_url = base_url
+
+@lru_cache(maxsize=1)
+def get_config():
+    """
+    Lädt die Konfiguration einmalig pro Prozess: aus ClientSecret.txt, wobei jeder Wert
+    mit MIGRATION_CLIENT_ID, MIGRATION_CLIENT_SECRET bzw. MIGRATION_BASE_URL überschrieben
+    werden kann. Sind alle drei gesetzt, wird die Datei nicht gelesen.
+    """
+    overrides = [os.environ.get(name) for name in ("MIGRATION_CLIENT_ID", "MIGRATION_CLIENT_SECRET", "MIGRATION_BASE_URL")]
+    if all(overrides):
+        values = overrides
+    else:
+        from_file = read_client_credentials(os.environ.get("MIGRATION_CLIENT_SECRET_FILE", CLIENT_SECRET_FILE))
+        values = [override or value for override, value in zip(overrides, from_file)]
+    client_id, client_secret, base_url = values
+    return Config(client_id, client_secret, base_url.rstrip("/") if base_url else base_url)
+
 def get_bearer_token():
     """
     Fordert einen OAuth2-Bearer-Token von der API an.
-    Verwendet Client-ID und Secret, die aus der Konfigurationsdatei gelesen werden.
+    Verwendet Client-ID und Secret aus der Konfiguration.
     Gibt das Access-Token als String zurück oder None bei Fehlern.
     """
-    client_id, client_secret, base_url = read_client_credentials()
+    # requests erst hier laden, damit der Import des Moduls schnell bleibt
+    import requests
+    config = get_config()
+    client_id, client_secret, base_url = config.client_id, config.client_secret, config.base_url
     if not all([client_id, client_secret, base_url]):
         logging.error("Ungültige Konfigurationsdaten.")
         return None
@@ -52,7 +91,7 @@ def get_bearer_token():
     data = {"grant_type": "client_credentials"}
 
     try:
-        response = requests.post(token_url, headers=headers, data=data)
+        response = requests.post(token_url, headers=headers, data=data, timeout=TOKEN_TIMEOUT)
         if response.status_code == 200:
             return response.json().get("access_token")
         else:
@@ -65,19 +104,57 @@ def get_bearer_token():
 def get_auth_headers():
     """
     Erzeugt ein Dictionary mit Authorization-Header für API-Aufrufe.
-    Holt sich dazu den Bearer-Token mit get_bearer_token().
+    Holt sich dazu den Bearer-Token mit get_bearer_token(), ausser watch.py hat bereits
+    einen gültigen Token in MIGRATION_ACCESS_TOKEN übergeben.
     """
-    token = get_bearer_token()
+    token = os.environ.get("MIGRATION_ACCESS_TOKEN") or get_bearer_token()
     if token:
         return {"Authorization": f"Bearer {token}"}
     return None
 
+class TokenKeeper:
+    """
+    Hält einen Token über längere Zeit (watch.py, intake.py) und gibt ihn per
+    MIGRATION_ACCESS_TOKEN auch an gestartete Subprozesse weiter.
+    """
+
+    def __init__(self, max_age=TOKEN_MAX_AGE):
+        self.max_age = max_age
+        self.token = None
+        self.fetched_at = None
+
+    def refresh(self):
+        """
+        Holt einen neuen Token, wenn keiner vorliegt oder er älter als max_age ist. Liefert False bei Fehlern.
+        """
+        if self.fetched_at is not None and time.monotonic() - self.fetched_at < self.max_age:
+            return True
+        token = get_bearer_token()
+        if not token:
+            os.environ.pop("MIGRATION_ACCESS_TOKEN", None)
+            self.token = self.fetched_at = None
+            return False
+        os.environ["MIGRATION_ACCESS_TOKEN"] = self.token = token
+        self.fetched_at = time.monotonic()
+        return True
+
+    def invalidate(self):
+        """
+        Verwirft den Token, z.B. nach einer 401-Antwort; der nächste refresh() holt einen neuen.
+        """
+        self.fetched_at = None
+
 def get_base_url():
     """
-    Liefert die Basis-URL für die API aus der Konfigurationsdatei.
+    Liefert die Basis-URL für die API aus der Konfiguration.
+    """
+    return get_config().base_url
+
+def api_url(path):
+    """
+    Baut die vollständige URL eines API-Pfads; erst beim Aufruf, nicht beim Import.
     """
-    _, _, base_url = read_client_credentials()
-    return base_url
+    return f"{get_base_url()}{path}"
 
 if __name__ == "__main__":
     # Testausführung: Prüft, ob ein Token erfolgreich generiert werden kann.
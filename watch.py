@@ -0,0 +1,213 @@
+import argparse
+import hashlib
+import json
+import logging
+import os
+import shutil
+import time
+from datetime import datetime
+from pathlib import Path
+from creation import STEP_DEPENDENCIES, select_modules
+from utils.auth.Authentification import TokenKeeper
+from utils.Runtime.Journal import run_dir
+from utils.Runtime.Progress import read_status
+from utils.Runtime.InputCache import STEP_INPUTS, preload_steps
+from utils.Runtime.LogQueue import setup_logging
+from utils.Runtime.Scheduler import MAX_PARALLEL_STEPS, run_module, run_graph, report_schedule, share_rate_budget
+
+DATA_DIR = Path("_data")
+RESULTS_DIR = DATA_DIR / "results"
+# Zuletzt verarbeiteter Stand jeder Eingabedatei (Grösse, Änderungszeit, Inhalts-Hash)
+MANIFEST_FILE = DATA_DIR / "state/watch_manifest.json"
+
+# Abstand in Sekunden zwischen zwei Prüfungen von _data/
+POLL_INTERVAL = 10
+# Eine Datei gilt erst als fertig abgelegt, wenn sie so lange nicht mehr verändert wurde
+SETTLE_SECONDS = 5
+
+setup_logging()
+
+def watched_files(modules):
+    """
+    Liefert pro Eingabedatei die Schritte, die sie lesen.
+    """
+    files = {}
+    for module in modules:
+        for _, path, _ in STEP_INPUTS.get(module, []):
+            files.setdefault(str(path), []).append(module)
+    return files
+
+def file_digest(path):
+    digest = hashlib.sha1()
+    with open(path, "rb") as file:
+        for block in iter(lambda: file.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def load_manifest():
+    try:
+        return json.loads(MANIFEST_FILE.read_text(encoding="utf-8"))
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError) as e:
+        logging.warning("Manifest '%s' nicht lesbar, alle Eingaben gelten als neu: %s", MANIFEST_FILE, e)
+        return {}
+
+def save_manifest(manifest):
+    MANIFEST_FILE.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = MANIFEST_FILE.with_name(f"{MANIFEST_FILE.name}.tmp")
+    tmp_path.write_text(json.dumps(manifest, indent=2), encoding="utf-8")
+    os.replace(tmp_path, MANIFEST_FILE)
+
+def scan(files, manifest, settle=SETTLE_SECONDS):
+    """
+    Vergleicht die Eingabedateien mit dem Manifest und liefert {Pfad: Eintrag} der Dateien mit
+    neuem Inhalt. Nur berührte Dateien mit gleichem Inhalt werden im Manifest still nachgeführt;
+    Dateien, die gerade noch geschrieben werden, kommen erst bei einer späteren Prüfung dran.
+    """
+    changed = {}
+    for path in files:
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            continue
+        known = manifest.get(path, {})
+        if known.get("size") == stat.st_size and known.get("mtime_ns") == stat.st_mtime_ns:
+            continue
+        if time.time() - stat.st_mtime < settle:
+            continue
+        entry = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "sha1": file_digest(path)}
+        if entry["sha1"] == known.get("sha1"):
+            manifest[path] = entry
+            continue
+        changed[path] = entry
+    return changed
+
+def affected_steps(changed, files, modules):
+    """
+    Schritte, deren Eingaben sich geändert haben, plus alle davon abhängigen Schritte,
+    in der Reihenfolge von creation.py. Abhängige Schritte senden dank der Zustandsdatenbank
+    nur, was beim letzten Mal nicht erfolgreich war, z.B. Policies auf neu erstellte Benutzer.
+    """
+    steps = {module for path in changed for module in files[path]}
+    for module in modules:
+        if any(dependency in steps for dependency in STEP_DEPENDENCIES.get(module, [])):
+            steps.add(module)
+    return [module for module in modules if module in steps]
+
+def collect_results(target, since):
+    """
+    Kopiert die im Batch geschriebenen Result-Workbooks in das Laufverzeichnis.
+    """
+    copied = []
+    for path in sorted(RESULTS_DIR.glob("*.xlsx")):
+        if path.stat().st_mtime >= since:
+            target.mkdir(parents=True, exist_ok=True)
+            shutil.copy2(path, target / path.name)
+            copied.append(path.name)
+    return copied
+
+def run_batch(changed, steps, max_parallel=MAX_PARALLEL_STEPS):
+    """
+    Führt die betroffenen Schritte als eigenen Lauf aus (unabhängige Schritte parallel) und schreibt
+    batch.json sowie eine Zeile in metrics.jsonl ins Laufverzeichnis. Liefert die Zusammenfassung des Batches.
+    """
+    run_id = datetime.now().strftime("watch-%Y%m%d-%H%M%S")
+    os.environ["MIGRATION_RUN_ID"] = run_id
+    directory = run_dir(run_id)
+    started = time.time()
+    logging.info("Batch %s: %d geänderte Datei(en), Schritte: %s", run_id, len(changed),
+                 ", ".join(step.rsplit(".", 1)[-1] for step in steps))
+    preloader = preload_steps(steps)
+    prefix = (lambda step: f"[{step.rsplit('.', 1)[-1]}] ") if max_parallel > 1 else (lambda step: "")
+    timings = run_graph(steps, STEP_DEPENDENCIES, lambda step: run_module(step, prefix(step)), max_parallel)
+    report_schedule(timings, STEP_DEPENDENCIES)
+    step_results = [{"step": step, "returncode": timing["returncode"], "duration": round(timing["duration"], 3)}
+                    for step, timing in timings.items()]
+    if preloader:
+        # Offene Vorlade-Aufträge verwerfen, laufende abwarten (sonst OSError beim Beenden des Interpreters)
+        preloader.shutdown(cancel_futures=True)
+    statuses = {status["step"]: {key: status.get(key) for key in ("total", "done", "succeeded", "failed", "rate")}
+                for status in read_status(run_id)}
+    summary = {
+        "run_id": run_id,
+        "started": datetime.fromtimestamp(started).isoformat(),
+        "duration": round(time.time() - started, 3),
+        "files": sorted(changed),
+        "steps": step_results,
+        "records": statuses,
+        "results": collect_results(directory / "results", started),
+    }
+    directory.mkdir(parents=True, exist_ok=True)
+    (directory / "batch.json").write_text(json.dumps(summary, indent=2, ensure_ascii=False), encoding="utf-8")
+    with open(directory / "metrics.jsonl", "a", encoding="utf-8") as file:
+        file.write(json.dumps({"time": datetime.now().isoformat(), "module": "watch", "metric": "batch",
+                               "values": summary}, ensure_ascii=False) + "\n")
+    succeeded = sum(status["succeeded"] or 0 for status in statuses.values())
+    failed = sum(status["failed"] or 0 for status in statuses.values())
+    logging.info("Batch %s abgeschlossen in %.1f s: %d erfolgreich, %d fehlgeschlagen, Ergebnisse in '%s'",
+                 run_id, summary["duration"], succeeded, failed, directory)
+    return summary
+
+def process_changes(files, modules, manifest, tokens, max_parallel=MAX_PARALLEL_STEPS):
+    """
+    Eine Prüfung von _data/: geänderte Dateien ermitteln und die betroffenen Schritte ausführen.
+    Das Manifest wird erst nach dem Batch und nur für erfolgreich verarbeitete Dateien nachgeführt;
+    ohne Token bleibt alles für die nächste Prüfung.
+    """
+    changed = scan(files, manifest)
+    if not changed:
+        save_manifest(manifest)
+        return None
+    if not tokens.refresh():
+        logging.error("Kein gültiger Token erhalten, geänderte Dateien werden bei der nächsten Prüfung verarbeitet.")
+        return None
+    summary = run_batch(changed, affected_steps(changed, files, modules), max_parallel)
+    failed_steps = {result["step"] for result in summary["steps"] if result["returncode"] != 0}
+    # Dateien, deren Schritte (inkl. abhängiger) fehlgeschlagen sind, bleiben aus dem Manifest und
+    # werden bei der nächsten Prüfung erneut verarbeitet; die Zustandsdatenbank überspringt dabei
+    # alles, was schon erfolgreich gesendet wurde
+    retry = {path for path in changed if failed_steps & set(affected_steps([path], files, modules))}
+    if failed_steps:
+        logging.error("Schritte mit Fehler-Exit-Code: %s; %d Datei(en) werden bei der nächsten Prüfung erneut "
+                      "verarbeitet: %s", ", ".join(sorted(failed_steps)), len(retry), ", ".join(sorted(retry)))
+    manifest.update({path: entry for path, entry in changed.items() if path not in retry})
+    save_manifest(manifest)
+    return summary
+
+def main():
+    """
+    Überwacht _data/ und verarbeitet neue oder geänderte Exporte, bis der Prozess beendet wird.
+    """
+    parser = argparse.ArgumentParser(description="Exporte in _data/ laufend inkrementell verarbeiten")
+    parser.add_argument("--interval", type=float, default=POLL_INTERVAL, help="Sekunden zwischen zwei Prüfungen")
+    parser.add_argument("--fused", action="store_true",
+                        help="Benutzer in einem Durchlauf erstellen, Passwort setzen und ändern")
+    parser.add_argument("--max-parallel", type=int, default=MAX_PARALLEL_STEPS,
+                        help="Höchstens so viele unabhängige Schritte gleichzeitig ausführen (1 = nacheinander)")
+    parser.add_argument("--once", action="store_true", help="Nur einmal prüfen und verarbeiten, dann beenden")
+    parser.add_argument("--baseline", action="store_true",
+                        help="Aktuellen Stand als verarbeitet markieren, ohne etwas zu senden")
+    args = parser.parse_args()
+    modules = select_modules(args.fused)
+    files = watched_files(modules)
+    manifest = load_manifest()
+    if args.baseline:
+        manifest.update(scan(files, manifest, settle=0))
+        save_manifest(manifest)
+        logging.info("Stand von %d Eingabedateien als verarbeitet markiert.", len(manifest))
+        return
+    tokens = TokenKeeper()
+    share_rate_budget(args.max_parallel)
+    logging.info("Überwache %d Eingabedateien in '%s' alle %.0f s.", len(files), DATA_DIR, args.interval)
+    try:
+        while True:
+            process_changes(files, modules, manifest, tokens, args.max_parallel)
+            if args.once:
+                return
+            time.sleep(args.interval)
+    except KeyboardInterrupt:
+        logging.info("Überwachung beendet.")
+
+if __name__ == "__main__":
+    main()